@@ -18,21 +18,16 @@ if (major != 3 and major != 2) or (major == 2 and minor < 7):
     errors.append('  {0} provides {1}.{2}.{3}'.format(
         sys.executable, major, minor, micro))
 
-try:
-    from traits.etsconfig.api import ETSConfig
-    toolkit = os.getenv('ETS_TOOLKIT', 'qt4')
-    ETSConfig.toolkit = toolkit
-    os.environ['ETS_TOOLKIT'] = toolkit
-except ImportError:
-    pass
+# traits reads the toolkit from the environment when it is first imported
+os.environ.setdefault('ETS_TOOLKIT', 'qt4')
 
 # --- numpy
 try: import numpy as np
 except ImportError: errors.append('numpy not found')
 
-# --- scipy
-try: import scipy
-except ImportError: errors.append('scipy not found')
+# --- scipy (imported on first use)
+from .utils.lazy import importable
+if not importable('scipy'): errors.append('scipy not found')
 
 # check prerequisites
 if errors:
@@ -45,6 +40,7 @@ sys.path.insert(0, os.getcwd())
 # ------------------------ FACTORY METHODS TO SET UP AND RUN A SIMULATION --- #
 from numpy import array, float64
 from .mmd.simulator import *
+from .mmd.batch import BatchMaterialPointSimulator
 from .mml_siteenv import environ
 from .mmd.material import build_material
 from .mmd.permutator import Permutator, PermutateVariable
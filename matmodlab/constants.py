@@ -52,9 +52,10 @@ XX, YY, ZZ, XY, YZ, XZ = range(6)
 
 # --- These are the standard outputs, any other requests are handled by tabfileio
 REC = 'rpk'
+NPY = 'npy'
 TXT = 'out'
 CSV = 'csv'
-DB_FMTS = (REC, TXT, CSV)
+DB_FMTS = (REC, NPY, TXT, CSV)
 
 # --- Permutate symbolic constants
 ZIP = 'Zip'
@@ -74,6 +75,14 @@ SIMPLEX = 'Simplex'
 POWELL = 'Powell'
 COBYLA = 'Cobyla'
 BRUTE = 'Brute'
+DIFFEVOL = 'Differential evolution'
+LBFGSB = 'L-BFGS-B'
+
+# --- Numerical Jacobian schemes
+CENTERED = 'Centered'
+FORWARD = 'Forward'
+BATCHED = 'Batched'
+COMPLEX_STEP = 'Complex step'
 
 # --- Warning levels
 IGNORE = 'Ignore'
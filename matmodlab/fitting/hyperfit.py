@@ -1,10 +1,7 @@
 from numpy import *
 from numpy.linalg import inv
-try:
-    import sympy
-    from sympy import symbols, Symbol, sqrt as Sqrt, Rational, lambdify
-except ImportError:
-    sympy = None
+from ..utils.lazy import lazy_import
+sympy = lazy_import('sympy')
 
 __all__ = ['POLYNOMIAL', 'MOONEY_RIVLIN', 'NEO_HOOKE',
            'UNIAXIAL', 'BIAXIAL', 'SHEAR', 'HyperFit']
@@ -18,7 +15,7 @@ SHEAR = 'Shear'
 
 def HyperFit(model=POLYNOMIAL, **kwargs):
     """Factory method that returns a fitter object"""
-    if sympy is None:
+    if not sympy:
         raise RuntimeError('HyperFit requires sympy')
     if model == POLYNOMIAL:
         return PolynomialHyperFit(**kwargs)
@@ -69,13 +66,13 @@ class PolynomialHyperFit:
         self.x = None
 
         # expanded hyperelastic model
-        lam, l1, l2, l3 = symbols('lambda lambda_1 lambda_2 lambda_3')
+        lam, l1, l2, l3 = sympy.symbols('lambda lambda_1 lambda_2 lambda_3')
         I1 = l1 ** 2 + l2 ** 2 + l3 ** 2
         I2 = (l1 * l2) ** 2 + (l2 * l3) ** 2 + (l3 * l1) ** 2
         J = l1 * l2 * l3
 
-        I1b = I1 / (J ** Rational(2,3))
-        I2b = I2 / (J ** Rational(4,3))
+        I1b = I1 / (J ** sympy.Rational(2,3))
+        I2b = I2 / (J ** sympy.Rational(4,3))
 
         # energy function and coefficients
         W, C = [], []
@@ -85,7 +82,7 @@ class PolynomialHyperFit:
             m += 1
             if not i2_dep and j:
                 continue
-            C.append(Symbol('C_{{{0}{1}}}'.format(i,j)))
+            C.append(sympy.Symbol('C_{{{0}{1}}}'.format(i,j)))
             W.append((I1b - 3) ** i * (I2b - 3) ** j)
             k += 1
 
@@ -103,10 +100,10 @@ class PolynomialHyperFit:
         """
         xy = asarray(xy)
 
-        lam, l1, l2, l3 = symbols('lambda lambda_1 lambda_2 lambda_3')
+        lam, l1, l2, l3 = sympy.symbols('lambda lambda_1 lambda_2 lambda_3')
         if type == UNIAXIAL:
             # uniaxial tension, incompressible.
-            c = {l1: lam, l2: 1/Sqrt(lam), l3: 1/Sqrt(lam)}
+            c = {l1: lam, l2: 1/sympy.sqrt(lam), l3: 1/sympy.sqrt(lam)}
 
         elif type == BIAXIAL:
             # biaxial tension, incompressible.
@@ -121,7 +118,7 @@ class PolynomialHyperFit:
 
         # The /lam term converts stress to engineering stress
         S1 = [s.subs(c) / lam for s in self.stress_diff]
-        self.fun = [lambdify(lam, s) for s in S1]
+        self.fun = [sympy.lambdify(lam, s) for s in S1]
 
         A = []
         u = xy[:,0] + 1
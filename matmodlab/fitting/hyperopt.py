@@ -1,7 +1,8 @@
 from numpy import *
 import warnings
 from itertools import permutations
-from scipy.optimize import leastsq
+from ..utils.lazy import lazy_import
+sciopt = lazy_import('scipy.optimize')
 
 UNIAXIAL_DATA = 'Uniaxial Data'
 BIAXIAL_DATA = 'Biaxial Data'
@@ -54,7 +55,7 @@ class HyperelasticOptimizer:
         p0 = ones(len(self.IJ))
         kw = {'order': order, 'i2dep': i2dep}
         args = (kw, xdata, ydata, f)
-        res = leastsq(func, p0, args=args, full_output=1)
+        res = sciopt.leastsq(func, p0, args=args, full_output=1)
         (popt, pcov, infodict, errmsg, ier) = res
 
         if ier not in [1, 2, 3, 4]:
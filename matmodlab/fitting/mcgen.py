@@ -5,14 +5,12 @@ import logging
 import numpy as np
 from itertools import cycle
 
-try: import pandas
-except ImportError: pandas = None
-try: import scipy.optimize as sciopt
-except ImportError: sciopt = None
-try: import matplotlib.pyplot as plt
-except ImportError: plt = None
-try: import bokeh.plotting as bp
-except ImportError: bp = None
+from ..utils.lazy import lazy_import
+from ..utils.evalcache import EvalCache
+pandas = lazy_import('pandas')
+sciopt = lazy_import('scipy.optimize')
+plt = lazy_import('matplotlib.pyplot')
+bp = lazy_import('bokeh.plotting')
 
 __all__ = ['MasterCurve', 'CurveFitter', 'mc_init_notebook',
            'MODIFIED_POWER', 'POWER', 'PRONY', 'POLYNOMIAL',
@@ -199,10 +197,11 @@ def aslist(item):
 
 class MasterCurve(object):
     fiterr = None
+    wlf_cache = None
     def __init__(self, txy, ref_temp=75., apply_log=False, xfac=1., yfac=1.,
                  skip_temps=None, wlf_coeffs=None,
                  xvar='Time', xunits='min', yvar='Er', yunits='psi',
-                 optimizer=FMIN, fitter=PRONY, optwlf=sciopt is not None,
+                 optimizer=FMIN, fitter=PRONY, optwlf=None,
                  **kwargs):
         """Initialize the master curve object
 
@@ -227,7 +226,7 @@ class MasterCurve(object):
             keywords [optional] to pass to fitter
 
         """
-        if pandas is None:
+        if not pandas:
             raise RuntimeError('master curve fitting requires pandas')
 
         columns = ('Temp', 'X', 'Log[X]', 'Y')
@@ -248,7 +247,7 @@ class MasterCurve(object):
         self.df = pandas.DataFrame(txy, columns=columns)
 
         self.wlf_coeffs = wlf_coeffs
-        self.optwlf = optwlf
+        self.optwlf = bool(sciopt) if optwlf is None else optwlf
         self.optimizer = optimizer
         self.kwds = dict(**kwargs)
         cf = CurveFitter(fitter)
@@ -315,30 +314,37 @@ class MasterCurve(object):
         if not opt:
             return wlf_coeffs
 
+        # the optimizers revisit points, cache the (costly) fits
+        cache = EvalCache()
+        self.wlf_cache = cache
+
+        # the data as arrays, the objective does not touch the data frame
+        problem = _MasterCurveProblem(df, ref_temp)
+
         def func(xopt, *args):
             """Objective function returning the area between the fitted curve
             and shifted data
 
             """
-            if np.any(np.abs(xopt[1] + temps - ref_temp) < EPS):
+            if cache is not None:
+                error = cache.get(xopt)
+                if error is not None:
+                    self.fiterr = error
+                    return self.fiterr
+
+            if np.any(np.abs(xopt[1] + problem.dt) < EPS):
                 self.fiterr = 1000.
                 return self.fiterr
 
-            df1 = self.shift_data(df.copy(), ref_temp, xopt)
-            fit = self.fit_shifted_data(df1)
-
             # determine error between fitted curve and master curve
-            yvals = []
-            for logx in df1['Log[X/aT]']:
-                yvals.append(self.cf.eval(fit, logx))
-            yvals = np.asarray(yvals)
-            error = np.sqrt(np.mean((yvals - df1['Y']) ** 2))
-            self.fiterr = error  # / area(data[:,0],data[:,1])
+            self.fiterr = problem.error(self.cf, xopt)
+            if cache is not None:
+                cache.set(xopt, self.fiterr)
             return self.fiterr
 
         if self.optimizer == COBYLA:
-            cons = [lambda x: 1 if abs(x[1]+temp-ref_temp) > EPS else -1
-                    for temp in temps]
+            cons = [lambda x, dt=dt: 1 if abs(x[1]+dt) > EPS else -1
+                    for dt in problem.dt]
             wlf_coeffs = sciopt.fmin_cobyla(func, wlf_coeffs, cons, disp=0)
         elif self.optimizer == POWELL:
             wlf_coeffs = sciopt.fmin_powell(func, wlf_coeffs, disp=0)
@@ -349,13 +355,7 @@ class MasterCurve(object):
 
     def shift_data(self, df, ref_temp, wlf):
         """Compute the master curve for data series"""
-        # reference temperature curve
-        def f(x):
-            temp = np.asarray(x['Temp'])[0]
-            shift = -wlf[0] * (temp - ref_temp) / (wlf[1] + temp - ref_temp)
-            x['Log[X/aT]'] = np.asarray(x['Log[X]']) - shift
-            return x
-        df = df.groupby('Temp').apply(f)
+        df['Log[X/aT]'] = _MasterCurveProblem(df, ref_temp).shift(wlf)
         return df
 
     def fit_shifted_data(self, df):
@@ -474,7 +474,7 @@ class MasterCurve(object):
         return self._mp_plot(**kwargs)
 
     def _bp_plot(self, raw=False, show_fit=False):
-        if bp is None:
+        if not bp:
             raise ImportError('bokeh')
 
         if raw:
@@ -510,7 +510,7 @@ class MasterCurve(object):
     def _mp_plot(self, raw=False, show_fit=False, filename=None,
                  legend_loc='best', legend_ncol=1):
         """Plot the given data or shifted data and/or the fit """
-        if plt is None:
+        if not plt:
             raise ImportError('matplotlib')
 
         plt.clf()
@@ -636,7 +636,7 @@ class MasterCurve(object):
         xmin = np.amin(self.dfm['Log[X/aT]'])
         xmax = np.amax(self.dfm['Log[X/aT]'])
         xvals = np.linspace(xmin, xmax, n)
-        yvals = np.array([self.cf.eval(self.mc_fit, x) for x in xvals])
+        yvals = np.asarray(self.cf.eval(self.mc_fit, xvals))
         return xvals, yvals
 
     @classmethod
@@ -677,6 +677,38 @@ class MasterCurve(object):
         #fh.write('Data\n')
         #self.dfm.to_csv(fh, float_format='%.18f', index=False)
 
+class _MasterCurveProblem(object):
+    """The data of a master curve, compiled to arrays for the optimization of
+    the WLF coefficients
+
+    The temperatures of the data sets are found once, and each point holds
+    the index of its data set, so that shifting the data is a single array
+    expression.
+
+    """
+    def __init__(self, df, ref_temp):
+        self.logx = np.asarray(df['Log[X]'], dtype=np.float64)
+        self.y = np.asarray(df['Y'], dtype=np.float64)
+        temps, self.index = np.unique(np.asarray(df['Temp']),
+                                      return_inverse=True)
+        self.dt = temps - ref_temp
+
+    def shift(self, wlf):
+        """Return log(x / aT) of each point, where
+
+            log(aT) = -C1 (T - Tref) / (C2 + T - Tref)
+
+        """
+        log_at = -wlf[0] * self.dt / (wlf[1] + self.dt)
+        return self.logx - log_at[self.index]
+
+    def error(self, cf, wlf):
+        """The root mean square error of the curve cf fit to the data shifted
+        by wlf"""
+        x = self.shift(wlf)
+        fit = cf.fit_points(x, self.y)
+        return np.sqrt(np.mean((cf.eval(fit, x) - self.y) ** 2))
+
 class _CurveFitter(object):
     """CurveFitter base class"""
     name = None
@@ -696,7 +728,8 @@ class PronyFit(_CurveFitter):
     plot_label = r'$\sum_{i=1}^{n} y_i e^{\frac{t/a_T}{\tau_i}}$'
     def __init__(self, *args, **kwargs):
         optprony = kwargs.pop('optprony', False)
-        self.optprony = optprony and sciopt is not None
+        self.optprony = optprony and bool(sciopt)
+        self.positive = kwargs.pop('positive', False)
 
     def fit_points(self, xp, yp):
         """Retuns the best fits for a Prony series
@@ -726,7 +759,6 @@ class PronyFit(_CurveFitter):
         xp should be given in ascending order.
 
         """
-        n = len(xp)
         mn = np.amin(xp)
         mx = np.amax(xp)
 
@@ -735,38 +767,85 @@ class PronyFit(_CurveFitter):
 
         # decades
         nn = ndp + 1
-        tau = np.empty(nn)
-        tau[:-1] = [BASE ** (round(mn) + i) for i in range(ndp)]
+        tau = np.zeros(nn)
+        tau[:-1] = BASE ** (round(mn) + np.arange(ndp))
 
-        d = np.zeros((n, nn))
-        d[:, -1] = 1.
-        for i in range(n):
-            d[i, :ndp] = np.exp(-BASE ** xp[i] / tau[:ndp])
-        try:
-            dtdi = np.linalg.inv(np.dot(d.T, d))
-        except np.linalg.LinAlgError:
-            raise ValueError('adjust initial WLF coefficients')
-        ddd = np.dot(dtdi, d.T)
-        coeffs = np.dot(ddd, yp)
+        t = BASE ** np.asarray(xp, dtype=np.float64)
+        d = np.ones((len(t), nn))
+        d[:, :ndp] = np.exp(-t[:, np.newaxis] / tau[:ndp])
+        coeffs = self._solve(d, yp)
         if self.optprony:
             # finish off the optimization.  The following optimizes both
             # tau and coeffs
-            def func(xarg, *args):
-                ni, xp, yp = args
-                ci = xarg[:ni]
-                ti = xarg[ni:]
-                y = [self._eval(ti, ci, x) for x in xp]
-                err = np.sqrt(np.mean((yp - y) ** 2))
-                return err
-            xarg = np.append(coeffs, tau)
-            xopt = sciopt.fmin(func, xarg, args=(nn, xp, yp), disp=0)
-            coeffs = xopt[:nn]
-            tau = xopt[nn:]
+            coeffs, tau[:-1] = self._refine(t, yp, coeffs, tau[:-1])
 
         return np.column_stack((tau, coeffs))
 
+    def _solve(self, d, yp):
+        """Least squares solution of d c = yp, with the Prony coefficients
+        (all but the last) bounded below by 0 if self.positive"""
+        if self.positive and sciopt:
+            # nnls bounds every unknown, so the unbounded y_inf is split
+            # into the difference of two non-negative parts
+            a = np.column_stack((d, -d[:, -1]))
+            c = sciopt.nnls(a, np.asarray(yp, dtype=np.float64))[0]
+            c[-2] -= c[-1]
+            return c[:-1]
+        try:
+            return np.linalg.lstsq(d, yp)[0]
+        except np.linalg.LinAlgError:
+            raise ValueError('adjust initial WLF coefficients')
+
+    def _refine(self, t, yp, coeffs, tau):
+        """Optimize the coefficients and relaxation times of the Prony series
+
+        The relaxation times are optimized through their logarithm, each
+        within a decade of its initial value, and the residuals have the
+        analytic jacobian
+
+            dy/dy_i = e_i,  dy/dy_inf = 1,  dy/dln(tau_i) = y_i e_i t / tau_i
+
+        with e_i = exp(-t / tau_i)
+
+        """
+        n = len(tau)
+        r = t[:, np.newaxis]
+
+        def split(p):
+            return p[:n], p[n], np.exp(p[n+1:])
+
+        def func(p):
+            ci, cinf, ti = split(p)
+            return cinf + np.dot(np.exp(-r / ti), ci) - yp
+
+        def jac(p):
+            ci, cinf, ti = split(p)
+            rt = r / ti
+            e = np.exp(-rt)
+            return np.column_stack((e, np.ones(len(t)), e * ci * rt))
+
+        x0 = np.append(coeffs, np.log(tau))
+        lb = np.empty_like(x0)
+        lb.fill(-np.inf)
+        ub = np.empty_like(x0)
+        ub.fill(np.inf)
+        if self.positive:
+            lb[:n] = 0.
+            x0[:n] = np.maximum(x0[:n], 0.)
+        lb[n+1:] = x0[n+1:] - np.log(BASE)
+        ub[n+1:] = x0[n+1:] + np.log(BASE)
+        if hasattr(sciopt, 'least_squares'):
+            x = sciopt.least_squares(func, x0, jac=jac, bounds=(lb, ub)).x
+        else:
+            # scipy < 0.17: unbounded solve, projected back on to the bounds
+            x = sciopt.leastsq(func, x0, Dfun=jac)[0]
+            x = np.minimum(np.maximum(x, lb), ub)
+        ci, cinf, ti = split(x)
+        return np.append(ci, cinf), ti
+
     def _eval(self, ti, ci, z):
-        s = np.sum(ci[:-1] * np.exp(-z / ti[:-1]))
+        z = np.asarray(z, dtype=np.float64)
+        s = np.dot(np.exp(-z[..., np.newaxis] / ti[:-1]), ci[:-1])
         return ci[-1] + s
 
     def eval(self, fit, z):
@@ -776,10 +855,12 @@ class PronyFit(_CurveFitter):
         ----------
         fit : ndarray
             Array returned by fit_points
+        z : real or ndarray
+            Point(s) at which to evaluate the series
 
         Returns
         -------
-        val : real
+        val : real or ndarray
             The value of the Prony series at z
 
         """
@@ -830,7 +911,14 @@ class ModifiedPowerFit(_CurveFitter):
         """
         def func(p, x, y):
             return y - self._eval(p[0], p[1], p[2], x)
-        out, success = sciopt.leastsq(func, [200., 100., -.1], args=(xp, yp))
+        def jac(p, x, y):
+            # derivatives of the residuals with respect to Ee, E1, a
+            xa = BASE ** (p[2] * x)
+            return -np.column_stack((np.ones_like(x), xa,
+                                     p[1] * xa * x * np.log(BASE)))
+        xp = np.asarray(xp, dtype=np.float64)
+        out, success = sciopt.leastsq(func, [200., 100., -.1], args=(xp, yp),
+                                      Dfun=jac)
         return out[:3]
 
     def eval(self, fit, x):
@@ -880,7 +968,13 @@ class PowerFit(_CurveFitter):
         """
         def func(p, x, y):
             return y - self._eval(p[0], p[1], x)
-        out, success = sciopt.leastsq(func, [100., -.1], args=(xp, yp))
+        def jac(p, x, y):
+            # derivatives of the residuals with respect to E0, a
+            xa = BASE ** (p[1] * x)
+            return -np.column_stack((xa, p[0] * xa * x * np.log(BASE)))
+        xp = np.asarray(xp, dtype=np.float64)
+        out, success = sciopt.leastsq(func, [100., -.1], args=(xp, yp),
+                                      Dfun=jac)
         return out[:2]
 
     def eval(self, fit, x):
@@ -1015,14 +1109,14 @@ def ReadCSV(filename, apply_log=True, ref_temp=75., cols=[0,1,2],
 def mc_init_notebook(plot_lib='bokeh', i=1):
     lib = plot_lib.lower()
     if lib == 'bokeh':
-        if bp is None:
+        if not bp:
             raise ImportError('bokeh')
         if i:
             from bokeh.io import output_notebook
             output_notebook()
         environ.notebook = 2
     elif lib == 'matplotlib':
-        if plt is None:
+        if not plt:
             raise ImportError('matplotlib')
         plt.rcParams['figure.figsize'] = (15, 12)
         plt.rcParams['font.family'] = 'serif'
@@ -1,6 +1,6 @@
 import logging
 from numpy.linalg import inv, det
-from numpy import reshape, dot, zeros, array, exp
+from numpy import reshape, dot, zeros, array, exp, newaxis
 from matmodlab.materials.product import PRONY
 from matmodlab.utils.mmlabpack import dev, asmat, asarray
 
@@ -14,27 +14,13 @@ class Viscoelastic(object):
     WC2=2  ! WLF C2
     WTR=3  ! WLF TREF
     GOO=4  ! PRONY SHEAR INFINITY
-    G01=IPGOO+1  ! PRONY SHEAR COEFFICIENTS (10)
-    G02=IPGOO+2
-    G03=IPGOO+3
-    G04=IPGOO+4
-    G05=IPGOO+5
-    G06=IPGOO+6
-    G07=IPGOO+7
-    G08=IPGOO+8
-    G09=IPGOO+9
-    G10=IPGOO+10
-    T=IPG10 ! SHEAR RELAX TIME (10)
+    G01=IPGOO+1  ! PRONY SHEAR COEFFICIENTS (NPRONY)
+    ...
+    GN=IPGOO+NPRONY
+    T=IPGN ! SHEAR RELAX TIME (NPRONY)
     T01=IPT+1
-    T02=IPT+2
-    T03=IPT+3
-    T04=IPT+4
-    T05=IPT+5
-    T06=IPT+6
-    T07=IPT+7
-    T08=IPT+8
-    T09=IPT+9
-    T10=IPT+10
+    ...
+    TN=IPT+NPRONY
 
     State Dependent Variables
     -------------------------
@@ -47,14 +33,10 @@ class Viscoelastic(object):
                PIOLA KIRCHHOFF (PK2) STRESS FOR 1ST PRONY TERM USING THE
                INITIAL CONFIGURATION AS THE REFERENCE STATE
      (15:20) : VISCO DEV PK2 STRESS FOR 2ND PRONY TERM
-     (21:26) : VISCO DEV PK2 STRESS FOR 3RD PRONY TERM
-     (27:32) : VISCO DEV PK2 STRESS FOR 4TH PRONY TERM
-     (33:38) : VISCO DEV PK2 STRESS FOR 5TH PRONY TERM
-     (39:44) : VISCO DEV PK2 STRESS FOR 6TH PRONY TERM
-     (45:50) : VISCO DEV PK2 STRESS FOR 7TH PRONY TERM
-     (51:56) : VISCO DEV PK2 STRESS FOR 8TH PRONY TERM
-     (57:62) : VISCO DEV PK2 STRESS FOR 9TH PRONY TERM
-     (63:68) : VISCO DEV PK2 STRESS FOR 10TH PRONY TERM
+         ... : AND SO ON, FOR EACH OF THE NPRONY TERMS
+
+    The history of the Prony terms is updated as a (NPRONY, 6) array, any
+    number of terms are supported.
 
     """
     def __init__(self, time, data):
@@ -76,14 +58,19 @@ class Viscoelastic(object):
     def setup(self, trs_model=None):
 
         # setup viscoelastic params
-        self.params = zeros(24)
+        n = self.nprony
+        self.params = zeros(4 + 2 * n)
 
         # starting location of G and T Prony terms
-        n = self.nprony
-        I, J = (4, 14)
+        I, J = (4, 4 + n)
         self.params[I:I+n] = self.data[:, 0]
         self.params[J:J+n] = self.data[:, 1]
 
+        # views of the Prony coefficients and relaxation times
+        self.g = self.params[I:I+n]
+        self.tau = self.params[J:J+n]
+        self._shift = None
+
         # Ginf
         self.params[3] = self.Ginf
 
@@ -97,10 +84,8 @@ class Viscoelastic(object):
         m = {0: "XX", 1: "YY", 2: "ZZ", 3: "XY", 4: "YZ", 5: "XZ"}
         keys.extend(["TE_{0}".format(m[i]) for i in range(6)])
 
-        # Visco elastic model supports up to 10 Prony series terms,
-        # allocate storage for stress corresponding to each
-        nprony = 10
-        for l in range(nprony):
+        # allocate storage for stress corresponding to each Prony term
+        for l in range(n):
             for i in range(6):
                 keys.append("H{0}_{1}".format(l+1, m[i]))
 
@@ -139,10 +124,9 @@ class Viscoelastic(object):
                 raise ValueError(message)
 
         # Verify that all relaxation times are positive
-        for (i, param) in enumerate(self.params[J:], start=J):
-            if param <= 0.:
-                log.warn('Shear relaxation time term <=0, SETTING TO 1')
-                self.params[i] = 1.
+        if any(self.tau <= 0.):
+            log.warn('Shear relaxation time term <=0, SETTING TO 1')
+            self.tau[self.tau <= 0.] = 1.
 
         return keys, idata
 
@@ -172,34 +156,28 @@ class Viscoelastic(object):
         # reduced time step
         dtred = dtime / statev[1] / statev[0]
 
-        # loop over the prony terms
-        I, J = (4, 14)
-        for k in range(10):
-            j = k * 6
-            # compute needed viscoelastic factors
-            ratio = dtred / self.params[J+k]
-            e = exp(-ratio)
-
-            if ratio > 1e-3:
-              # explicit calculation of (1-exp(-ratio))/ratio
-                s = (1. - e) / ratio
-            else:
-               # taylor series calculation of (1 - exp(-ratio))/ratio
-                s = 1. - .5 * ratio + 1. / 6. * ratio ** 2
+        # compute needed viscoelastic factors of all prony terms
+        g = self.g
+        ratio = dtred / self.tau
+        e = exp(-ratio)
 
-           # update the viscoelastic state variable history for kth prony term
-            for l in range(6):
-                statev[8+j+l] = (e * statev[8+j+l] +
-                                 self.params[4+k] * (s - e) * statev[2+l] +
-                                 self.params[4+k] * (1 - s) * pk2odev[l])
-            cfac[0] += (1 - s) * self.params[4+k]
+        # taylor series calculation of (1 - exp(-ratio))/ratio, replaced by
+        # the explicit calculation where ratio is not small
+        s = 1. - .5 * ratio + 1. / 6. * ratio ** 2
+        big = ratio > 1e-3
+        s[big] = (1. - e[big]) / ratio[big]
+
+        # update the viscoelastic state variable history, row k of H is the
+        # history of the kth prony term
+        n = self.nprony
+        H = statev[8:8+6*n].reshape((n, 6))
+        H *= e[:, newaxis]
+        H += (g * (s - e))[:, newaxis] * statev[2:8]
+        H += (g * (1. - s))[:, newaxis] * pk2odev
+        cfac[0] = dot(1. - s, g)
 
         # compute decaying deviatoric stress
-        pk2dev = zeros(6)
-        for l in range(6):
-            for k in range(10):
-                j = k * 6
-                pk2dev[l] += statev[8+j+l]
+        pk2dev = H.sum(axis=0)
 
         # change reference state on decaying portion of deviatoric stress from
         # initial configuration to configuration at end of current time step
@@ -232,6 +210,16 @@ class Viscoelastic(object):
 
         # retrieve the WLF parameters - thermal analysis
         C1, C2, Tref   = self.params[:3]
+
+        # the shift factor depends only on the temperature of the step, reuse
+        # the last one computed if it is unchanged (as it is for each of the
+        # perturbed calls made by the numerical jacobian)
+        key = (temp, dtemp, C1, C2, Tref)
+        if self._shift is not None and self._shift[0] == key:
+            statev[0] = self._shift[1]
+            statev[1] = 1.
+            return
+
         temp_new = temp + dtemp
 
         # Evaluate the WLF shift factor at the average temp of the step
@@ -254,6 +242,7 @@ class Viscoelastic(object):
                     at = 10. ** log_at
 
         # Store the numerical shift factor for WLF
+        self._shift = (key, 1. / at)
         statev[0] = 1. / at
         statev[1] = 1.
 
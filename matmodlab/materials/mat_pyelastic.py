@@ -1,9 +1,10 @@
 import logging
-from numpy import dot, ix_, zeros
+from numpy import dot, einsum, ix_, zeros
 from matmodlab.mmd.material import MaterialModel
 
 class PyElastic(MaterialModel):
     name = "pyelastic"
+    complex_step = True
 
     @classmethod
     def param_names(cls, n):
@@ -73,3 +74,27 @@ class PyElastic(MaterialModel):
         stress += dot(ddsdde, d * dtime)
 
         return stress, statev, ddsdde
+
+    def update_state_batch(self, time, dtime, temp, dtemp, energy, rho, F0, F,
+        stran, d, elec_field, stress, statev, params, **kwargs):
+        """Compute updated stress of N points given strain increments"""
+
+        # elastic properties
+        P = self.param_layout
+        K = params[:, P.K]
+        G = params[:, P.G]
+
+        K3 = 3. * K
+        G2 = 2. * G
+        Lam = (K3 - G2) / 3.
+
+        # elastic stiffness
+        ddsdde = zeros((len(K), 6, 6))
+        ddsdde[:, :3, :3] = Lam[:, None, None]
+        ddsdde[:, range(3), range(3)] += G2[:, None]
+        ddsdde[:, range(3,6), range(3,6)] = G[:, None]
+
+        # stress update
+        stress = stress + einsum('nij,nj->ni', ddsdde, d * dtime)
+
+        return stress, statev, ddsdde
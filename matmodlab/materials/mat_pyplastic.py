@@ -6,6 +6,7 @@ from matmodlab.constants import ROOT2, ROOT3, TOOR2, TOOR3, I6, VOIGT
 
 class PyPlastic(MaterialModel):
     name = 'pyplastic'
+    complex_step = True
 
     @classmethod
     def param_names(cls, n):
@@ -110,19 +111,19 @@ class PyPlastic(MaterialModel):
         '''
         sigsave = np.copy(stress)
         # Define helper functions and unload params/state vars
-        A1 = self.params['A1']
-        A4 = self.params['A4']
-        idx = lambda x: self.sdv_keys.index(x.upper())
-        ep = statev[idx('EP_XX'):idx('EP_YZ')+1]
+        L, S = self.param_layout, self.sdv_layout
+        params = self.params.view(np.ndarray)
+        A1, A4 = params[L.A1], params[L.A4]
+        ep = statev[S.EP_XX:S.EP_YZ+1]
 
         # Compute the trial stress and invariants
         stress = stress + self.dot_with_elastic_stiffness(d / VOIGT * dtime)
         i1 = self.i1(stress)
         rootj2 = self.rootj2(stress)
-        if rootj2 - (A1 - A4 * i1) <= 0.0:
-            statev[idx('ISPLASTIC')] = 0.0
+        if np.real(rootj2 - (A1 - A4 * i1)) <= 0.0:
+            statev[S.ISPLASTIC] = 0.0
         else:
-            statev[idx('ISPLASTIC')] = 1.0
+            statev[S.ISPLASTIC] = 1.0
 
             s = self.dev(stress)
             N = ROOT2 * A4 * I6 + s / self.tensor_mag(s)
@@ -133,12 +134,13 @@ class PyPlastic(MaterialModel):
             # 2) Check if trial stress is beyond the vertex
             # 3) Check if trial stress is in the vertex
             if (A4 != 0.0 and
-                    i1 > A1 / A4 and
-                    rootj2 / (i1 - A1 / A4) < self.rootj2(P) / self.i1(P)):
+                    np.real(i1) > A1 / A4 and
+                    np.real(rootj2 / (i1 - A1 / A4)) <
+                    np.real(self.rootj2(P) / self.i1(P))):
                 dstress = stress - A1 / A4 / 3.0 * I6
                 # convert all of the extra strain into plastic strain
-                ep += self.iso(dstress) / (3.0 * self.params['K'])
-                ep += self.dev(dstress) / (2.0 * self.params['G'])
+                ep += self.iso(dstress) / (3.0 * params[L.K])
+                ep += self.dev(dstress) / (2.0 * params[L.G])
                 stress = A1 / A4 / 3.0 * I6
             else:
                 # not in vertex; do regular return
@@ -148,17 +150,87 @@ class PyPlastic(MaterialModel):
                 ep += lamb * N
 
             # Save the updated plastic strain
-            statev[idx('EP_XX'):idx('EP_YZ')+1] = ep
+            statev[S.EP_XX:S.EP_YZ+1] = ep
 
-        statev[idx('I1')] = self.i1(stress)
-        statev[idx('ROOTJ2')] = self.rootj2(stress)
-        statev[idx('YROOTJ2')] = A1 - A4 * self.i1(stress)
+        statev[S.I1] = self.i1(stress)
+        statev[S.ROOTJ2] = self.rootj2(stress)
+        statev[S.YROOTJ2] = A1 - A4 * self.i1(stress)
+
+        return stress, statev, None
+
+    def update_state_batch(self, time, dtime, temp, dtemp, energy, rho, F0, F,
+        stran, d, elec_field, stress, statev, params, **kwargs):
+        '''Compute updated stress of N points given strain increments
+
+        Each row of the arguments is one material point.  The return mapping
+        is that of update_state, with the elastic, vertex, and regular return
+        branches evaluated on the masks of points following them.
+
+        '''
+        L, S = self.param_layout, self.sdv_layout
+        K = params[:, L.K][:, None]
+        G = params[:, L.G][:, None]
+        A1 = params[:, L.A1]
+        A4 = params[:, L.A4]
+        ep = slice(S.EP_XX, S.EP_YZ+1)
+
+        iso = lambda A: A[:, :3].sum(axis=1)[:, None] / 3.0 * I6
+        dev = lambda A: A - iso(A)
+        mag = lambda A: np.sqrt(np.sum(A[:, :3] * A[:, :3], axis=1) +
+                                2.0 * np.sum(A[:, 3:] * A[:, 3:], axis=1))
+        i1 = lambda A: np.sum(A[:, :3], axis=1)
+        rootj2 = lambda A: mag(dev(A)) * TOOR2
+        stiff = lambda A, k, g: 3.0 * k * iso(A) + 2.0 * g * dev(A)
+
+        # Compute the trial stress and invariants
+        stress = stress + stiff(d / VOIGT * dtime, K, G)
+        plastic = rootj2(stress) - (A1 - A4 * i1(stress)) > 0.0
+        statev[:, S.ISPLASTIC] = np.where(plastic, 1.0, 0.0)
+
+        if np.any(plastic):
+            p = np.flatnonzero(plastic)
+            sig, k, g, a1, a4 = stress[p], K[p], G[p], A1[p], A4[p]
+            I1, RJ2 = i1(sig), rootj2(sig)
+
+            s = dev(sig)
+            N = ROOT2 * a4[:, None] * I6 + s / mag(s)[:, None]
+            N = N / np.sqrt(6.0 * a4 ** 2 + 1.0)[:, None]
+            P = stiff(N, k, g)
+
+            # 1) Check if linear drucker-prager
+            # 2) Check if trial stress is beyond the vertex
+            # 3) Check if trial stress is in the vertex
+            with np.errstate(divide='ignore', invalid='ignore'):
+                vertex = ((a4 != 0.0) & (I1 > a1 / a4) &
+                          (RJ2 / (I1 - a1 / a4) < rootj2(P) / i1(P)))
+
+            # convert all of the extra strain into plastic strain
+            v = vertex
+            apex = (a1[v] / a4[v] / 3.0)[:, None] * I6
+            dstress = sig[v] - apex
+            statev[p[v], ep] += (iso(dstress) / (3.0 * k[v]) +
+                                 dev(dstress) / (2.0 * g[v]))
+            sig[v] = apex
+
+            # not in vertex; do regular return
+            r = ~vertex
+            lamb = ((RJ2[r] - a1[r] + a4[r] * I1[r]) /
+                    (a4[r] * i1(P[r]) + rootj2(P[r])))[:, None]
+            sig[r] = sig[r] - lamb * P[r]
+            statev[p[r], ep] += lamb * N[r]
+
+            stress[p] = sig
+
+        statev[:, S.I1] = i1(stress)
+        statev[:, S.ROOTJ2] = rootj2(stress)
+        statev[:, S.YROOTJ2] = A1 - A4 * i1(stress)
 
         return stress, statev, None
 
     def dot_with_elastic_stiffness(self, A):
-        return (3.0 * self.params['K'] * self.iso(A) +
-                2.0 * self.params['G'] * self.dev(A))
+        L, params = self.param_layout, self.params.view(np.ndarray)
+        return (3.0 * params[L.K] * self.iso(A) +
+                2.0 * params[L.G] * self.dev(A))
 
     def tensor_mag(self, A):
         return np.sqrt(np.dot(A[:3], A[:3]) + 2.0 * np.dot(A[3:], A[3:]))
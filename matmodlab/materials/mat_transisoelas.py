@@ -19,7 +19,7 @@ class TransIsoElas(MaterialModel):
         # Check inputs
         # If the user wants a linear elastic primitive:
         if self.params["K"] > 0.0 and self.params["G"] > 0.0:
-            for key in self.params.keys():
+            for key in self.param_layout.names:
                 if key in ['K', 'G']:
                     continue
                 self.params[key] = 0.0
@@ -74,10 +74,11 @@ class TransIsoElas(MaterialModel):
         # Calculate some helper functions
         trD = np.trace(D)
         trMD = np.trace(np.dot(self.M, D))
-        alpha0 = self.params["A0"] + self.params["B0"] * trD + self.params["C0"] * trMD
-        alpha1 = self.params["A1"] + self.params["B1"] * trD + self.params["C1"] * trMD
-        alpha2 = self.params["A2"]
-        alpha3 = self.params["A3"]
+        P, params = self.param_layout, self.params.view(np.ndarray)
+        alpha0 = params[P.A0] + params[P.B0] * trD + params[P.C0] * trMD
+        alpha1 = params[P.A1] + params[P.B1] * trD + params[P.C1] * trMD
+        alpha2 = params[P.A2]
+        alpha3 = params[P.A3]
 
         # Actually calculate the stress
         stress = (alpha0 * np.eye(3, 3) + alpha1 * self.M + alpha2 * D
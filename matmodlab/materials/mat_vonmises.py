@@ -6,6 +6,7 @@ from matmodlab.constants import ROOT2, ROOT23, VOIGT
 
 class VonMises(MaterialModel):
     name = 'vonmises'
+    complex_step = True
 
     @classmethod
     def param_names(cls, n):
@@ -72,7 +73,7 @@ class VonMises(MaterialModel):
 
         # Register State Variables
         sdv_keys = ['EQPS', 'Y',
-                    'BS_XX', 'BS_YY', 'BS_ZZ', 'BS_XY', 'BS_XZ', 'BS_YZ',
+                    'BS_XX', 'BS_YY', 'BS_ZZ', 'BS_XY', 'BS_YZ', 'BS_XZ',
                     'SIGE']
         sdv_vals = [0.0, Y0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]
         return sdv_keys, sdv_vals
@@ -104,51 +105,90 @@ class VonMises(MaterialModel):
             State dependent variables
 
         '''
-        idx = lambda x: self.sdv_keys.index(x.upper())
-        bs = np.array([statev[idx('BS_XX')],
-                       statev[idx('BS_YY')],
-                       statev[idx('BS_ZZ')],
-                       statev[idx('BS_XY')],
-                       statev[idx('BS_YZ')],
-                       statev[idx('BS_XZ')]])
-        yn = statev[idx('Y')]
+        P, S = self.param_layout, self.sdv_layout
+        params = self.params.view(np.ndarray)
+        K, G, H, BETA = params[P.K], params[P.G], params[P.H], params[P.BETA]
+        bs = np.array(statev[S.BS])
+        yn = statev[S.Y]
 
         de = d / VOIGT * dtime
 
         iso = de[:3].sum() / 3.0 * np.array([1.0, 1.0, 1.0, 0.0, 0.0, 0.0])
         dev = de - iso
 
-        stress_trial = stress + 3.0 * self.params['K'] * iso + 2.0 * self.params['G'] * dev
+        stress_trial = stress + 3.0 * K * iso + 2.0 * G * dev
 
         xi_trial = stress_trial - bs
         xi_trial_eqv = self.eqv(xi_trial)
 
-        if xi_trial_eqv <= yn:
-            statev[idx('SIGE')] = xi_trial_eqv
+        if np.real(xi_trial_eqv) <= np.real(yn):
+            statev[S.SIGE] = xi_trial_eqv
             return stress_trial, statev, None
         else:
             N = xi_trial - xi_trial[:3].sum() / 3.0 * np.array([1.0, 1.0, 1.0, 0.0, 0.0, 0.0])
             N = N / (ROOT23 * xi_trial_eqv)
-            deqps = (xi_trial_eqv - yn) / (3.0 * self.params['G'] + self.params['H'])
+            deqps = (xi_trial_eqv - yn) / (3.0 * G + H)
             dps = 1. / ROOT23 * deqps * N
 
-            stress_final = stress_trial - 2.0 * self.params['G'] / ROOT23 * deqps * N
+            stress_final = stress_trial - 2.0 * G / ROOT23 * deqps * N
 
-            bs = bs + 2.0 / 3.0 * self.params['H'] * self.params['BETA'] * dps
+            bs = bs + 2.0 / 3.0 * H * BETA * dps
 
-            statev[idx('EQPS')] += deqps
-            statev[idx('Y')] += self.params['H'] * (1.0 - self.params['BETA']) * deqps
-            statev[idx('BS_XX')] = bs[0]
-            statev[idx('BS_YY')] = bs[1]
-            statev[idx('BS_ZZ')] = bs[2]
-            statev[idx('BS_XY')] = bs[3]
-            statev[idx('BS_YZ')] = bs[4]
-            statev[idx('BS_XZ')] = bs[5]
-            statev[idx('SIGE')] = self.eqv(stress_final - bs)
+            statev[S.EQPS] += deqps
+            statev[S.Y] += H * (1.0 - BETA) * deqps
+            statev[S.BS] = bs
+            statev[S.SIGE] = self.eqv(stress_final - bs)
             return stress_final, statev, None
 
+    def update_state_batch(self, time, dtime, temp, dtemp, energy, rho, F0, F,
+        stran, d, elec_field, stress, statev, params, **kwargs):
+        '''Compute updated stress of N points given strain increments
+
+        Each row of the arguments is one material point, the radial return
+        is that of update_state applied to the points that yield.
+
+        '''
+        P, S = self.param_layout, self.sdv_layout
+        K, G, H, BETA = params[:, P.K], params[:, P.G], params[:, P.H], \
+                        params[:, P.BETA]
+        bs = np.array(statev[:, S.BS])
+        yn = statev[:, S.Y]
+
+        I = np.array([1.0, 1.0, 1.0, 0.0, 0.0, 0.0])
+        de = d / VOIGT * dtime
+        iso = de[:, :3].sum(axis=1)[:, None] / 3.0 * I
+        dev = de - iso
+
+        stress = stress + 3.0 * K[:, None] * iso + 2.0 * G[:, None] * dev
+
+        xi_trial = stress - bs
+        xi_trial_eqv = self.eqv_batch(xi_trial)
+        statev[:, S.SIGE] = xi_trial_eqv
+
+        p = np.flatnonzero(xi_trial_eqv > yn)
+        if not len(p):
+            return stress, statev, None
+
+        N = xi_trial[p] - xi_trial[p, :3].sum(axis=1)[:, None] / 3.0 * I
+        N = N / (ROOT23 * xi_trial_eqv[p])[:, None]
+        deqps = (xi_trial_eqv[p] - yn[p]) / (3.0 * G[p] + H[p])
+        dps = 1. / ROOT23 * deqps[:, None] * N
+
+        stress[p] -= (2.0 * G[p] / ROOT23 * deqps)[:, None] * N
+        bs[p] += (2.0 / 3.0 * H[p] * BETA[p])[:, None] * dps
+
+        statev[p, S.EQPS] += deqps
+        statev[p, S.Y] += H[p] * (1.0 - BETA[p]) * deqps
+        statev[:, S.BS] = bs
+        statev[p, S.SIGE] = self.eqv_batch(stress[p] - bs[p])
+        return stress, statev, None
 
     def eqv(self, sig):
         # Returns sqrt(3 * rootj2) = sig_eqv = q
         s = sig - sig[:3].sum() / 3.0 * np.array([1.0, 1.0, 1.0, 0.0, 0.0, 0.0])
         return 1. / ROOT23 * np.sqrt(np.dot(s[:3], s[:3]) + 2 * np.dot(s[3:], s[3:]))
+
+    def eqv_batch(self, sig):
+        # Returns sig_eqv of each row of sig
+        s = sig - sig[:, :3].sum(axis=1)[:, None] / 3.0 * np.array([1.0, 1.0, 1.0, 0.0, 0.0, 0.0])
+        return 1. / ROOT23 * np.sqrt(np.sum(s[:, :3] ** 2, axis=1) + 2 * np.sum(s[:, 3:] ** 2, axis=1))
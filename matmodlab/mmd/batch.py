@@ -0,0 +1,510 @@
+import os
+import logging
+from math import sqrt
+import numpy as np
+from time import time as tt
+from numpy.linalg import LinAlgError
+
+from ..constants import *
+from ..utils import mmlabpack as mml
+from ..utils.errors import MatmodlabError
+from ..utils.fileio import savefile
+from .material import Material, MaterialModel
+from .simulator import MaterialPointSimulator, Records, StateDB, StopSteps, \
+    sig2d, EPS
+
+__all__ = ['BatchMaterialPointSimulator']
+
+def solve_stack(J, b):
+    '''Solve each of the (n, k, k) systems J[i] x[i] = b[i]
+
+    The stack is solved at once, falling back to a least squares solution
+    of each singular block.
+
+    '''
+    try:
+        return np.linalg.solve(J, b[:, :, None])[:, :, 0]
+    except LinAlgError:
+        pass
+    x = np.empty_like(b)
+    for (i, Ji) in enumerate(J):
+        try:
+            x[i] = np.linalg.solve(Ji, b[i])
+        except LinAlgError:
+            x[i] = np.linalg.lstsq(Ji, b[i])[0]
+    return x
+
+class BatchMaterialPointSimulator(MaterialPointSimulator):
+    '''Drive N material points of one model through the same steps
+
+    The steps are defined exactly as for the MaterialPointSimulator.  Each
+    material point has its own parameters (a row of the (N, nprop) parameter
+    array given to Material) and all points are advanced together with
+    (N, 6) and (N, 9) state arrays.  Models that implement update_state_batch
+    are called once per frame for all points, other models are called point
+    by point.
+
+    '''
+    def __init__(self, job, verbosity=None, d=None,
+                 initial_temperature=DEFAULT_TEMP, termination_time=None,
+                 output_format=None, no_cutback=False, broyden=False):
+        super(BatchMaterialPointSimulator, self).__init__(
+            job, verbosity=verbosity, d=d,
+            initial_temperature=initial_temperature,
+            termination_time=termination_time, output_format=output_format,
+            no_cutback=no_cutback, broyden=broyden)
+        self.materials = None
+
+    def Material(self, model, parameters, **kwargs):
+        '''Instantiate the material model for each point
+
+        Parameters
+        ----------
+        model : str
+            Material model name
+        parameters : ndarray
+            Parameter array of shape (N, nprop), row i holds the parameters
+            of point i in the order expected by the model.
+
+        Returns
+        -------
+        materials : list of MaterialModel instances
+
+        '''
+        parameters = np.asarray(parameters, dtype=np.float64)
+        if parameters.ndim != 2:
+            raise MatmodlabError('expected parameters of shape (N, nprop)')
+        kwargs['initial_temp'] = self.initial_temperature
+        self.materials = [Material(model, row, **kwargs) for row in parameters]
+        self.material = self.materials[0]
+        return self.materials
+
+    @property
+    def num_points(self):
+        return len(self.materials)
+
+    @property
+    def batched(self):
+        '''Can the material points be updated in a single call?'''
+        for m in self.materials:
+            if m.visco_model is not None or m.xpan is not None:
+                return False
+        return self._batched
+
+    def initialize_simulation(self):
+        '''initialize everything for running the steps
+
+        '''
+        logger = logging.getLogger('matmodlab.mmd.simulator')
+        logger.info('Setting up calculations...')
+
+        if self.material is None:
+            raise MatmodlabError('The material must be set before '
+                                 'any analysis steps are created')
+
+        if len(set([m.num_sdv for m in self.materials])) != 1:
+            raise MatmodlabError('all material points must have the same '
+                                 'number of state dependent variables')
+
+        N = self.num_points
+        self.params = np.array([m.params for m in self.materials])
+        sdv = np.array([m.initial_sdv for m in self.materials])
+        sdv = sdv.reshape(N, -1)
+
+        # models that update several points at once override
+        # MaterialModel.update_state_batch
+        self._batched = (type(self.material).update_state_batch.__func__ is
+                         not MaterialModel.update_state_batch.__func__)
+
+        # register variables
+        self._time = 0.
+        self.records = Records()
+        self.records.add('Step', SCALAR, dtype='i4')
+        self.records.add('Frame', SCALAR, dtype='i4')
+        self.records.add('Time', SCALAR)
+        self.records.add('DTime', SCALAR)
+        self.records.add('S', TENSOR_3D, points=N)
+        self.records.add('E', TENSOR_3D, points=N)
+        self.records.add('F', TENSOR_3D_FULL, points=N)
+        self.records.add('D', TENSOR_3D, points=N)
+        self.records.add('DS', TENSOR_3D, points=N)
+        self.records.add('EF', VECTOR)
+        self.records.add('T', SCALAR)
+
+        # Adding SDVs **MUST** be last
+        if self.material.sdv_keys:
+            self.records.add('SDV', SDV, keys=self.material.sdv_keys, points=N)
+
+        self.write_summary()
+        logger.info('Number of material points: {0}\n'.format(N))
+
+        step = self.steps.values()[0]
+        frame = step.frames[0]
+        S0 = np.tile(self.initial_stress, (N, 1))
+        F0 = np.tile(I9, (N, 1))
+        E0 = np.zeros((N, 6))
+
+        self.state_db = StateDB(F=F0, temp=step.temperature, stress=S0,
+                                strain=E0, efield=step.elec_field, statev=sdv)
+
+        self.records.init(Step=step.number, Frame=frame.number,
+                 Time=frame.value, DTime=frame.increment,
+                 E=E0, F=F0, D=E0, DS=E0, S=S0,
+                 SDV=sdv, T=step.temperature, EF=step.elec_field)
+
+        self.initialized = True
+
+    def finish(self):
+        '''Finish the simulation.  Output files are only written on request
+        (see dump) since there is one per material point'''
+        logger = logging.getLogger('matmodlab.mmd.simulator')
+        logger.info('\n...calculations completed ({0:.4f}s)\n'.format(self._time))
+        self.ran = True
+
+    def dump(self, format=None, ffmt='%.18e', abaqus_kwds=0):
+        """Dump the results of each material point to its own file,
+        job.<i>.<ext>, with the layout of the MaterialPointSimulator's
+        output"""
+        if abaqus_kwds:
+            raise MatmodlabError('abaqus keywords not supported by batches')
+        output_format = format or self.output_format
+        ext = '.' + output_format
+        self.filename = []
+        for i in range(self.num_points):
+            filename = os.path.join(self.directory,
+                                    '{0}.{1}{2}'.format(self.job, i, ext))
+            if output_format == REC:
+                self.point_data(i).dump(filename)
+            elif output_format == NPY:
+                np.save(filename, self.point_data(i))
+            elif output_format in (TXT, CSV):
+                if output_format == CSV:
+                    sep, comments = ',', ''
+                else:
+                    sep, comments = ' ', '#'
+                names, data = self.get(point=i, disp=1)
+                np.savetxt(filename, data, header=sep.join(names),
+                           delimiter=sep, comments=comments, fmt=ffmt)
+            else:
+                savefile(filename, *self.get(point=i, disp=1))
+            self.filename.append(filename)
+        return self.filename
+
+    def point_data(self, i):
+        """Record array of point i, laid out as the records of a
+        MaterialPointSimulator"""
+        dtype = []
+        for (name, record) in self.records.items():
+            shape = record.shape
+            if record.points is not None:
+                shape = record.shape[1:] or 1
+            dtype.append((name, np.float64, shape))
+        data = self.records.data
+        a = np.empty(data.shape, dtype=dtype)
+        for (name, record) in self.records.items():
+            if record.points is None:
+                a[name] = data[name]
+            else:
+                a[name] = data[name][:, i]
+        return a
+
+    def _get_var_time(self, var):
+        return self.records.data[var]
+
+    def get(self, *variables, **kwargs):
+        '''Get variables from the records
+
+        Per point variables are returned with shape (nframes, N), or
+        (nframes,) if the keyword point=i is given.  With no variables, all
+        records of one point (keyword point, default 0) are returned as for
+        the MaterialPointSimulator.
+
+        '''
+        disp = kwargs.pop('disp', 0)
+        point = kwargs.pop('point', None)
+
+        if not variables:
+            data = self.point_data(point or 0)
+            names = self.records.keys(expand=1)
+            a = np.column_stack([data[name].reshape(data.shape[0], -1)
+                                 for name in data.dtype.names])
+            if disp:
+                return names, a
+            return a
+
+        data = self.records.data
+        arrays = []
+        for variable in variables:
+            item = variable.split('.', 1) if not variable.startswith('SDV_') \
+                   else [variable]
+            a = np.array(data[item[0]])
+            if point is not None and self.records[item[0]].points is not None:
+                a = a[:, point]
+            if len(item) == 2:
+                a = a[..., COMPONENT(item[1], a.shape[-1])]
+            arrays.append(a)
+
+        if len(arrays) == 1:
+            arrays = arrays[0]
+
+        if disp:
+            return variables, arrays
+        return arrays
+
+    def compute_updated_state(self, time, dtime, temp, dtemp, kappa, F0, F,
+                              stran, d, efield, stress, statev, jac=False,
+                              v=None):
+        '''Update the state of all material points
+
+        If jac is True, the (N, nv, nv) Jacobian of the stress with respect
+        to the strain components in v is returned as well.
+
+        '''
+        sig, sdv = np.array(stress), np.array(statev)
+        if self.batched:
+            sig, sdv, ddsdde = self.material.update_state_batch(time, dtime,
+                temp, dtemp, 1., 1., F0, F, stran, d, efield, sig, sdv,
+                self.params, last=True, mode=0)
+            if not jac:
+                return sig, sdv
+            if ddsdde is not None and not self.material.num_stiff:
+                return sig, sdv, ddsdde[:, v][:, :, v]
+            # forward difference Jacobian, perturbing all points at once.  As
+            # in MaterialModel.numerical_jacobian, row i holds the derivatives
+            # with respect to the strain component v[i]
+            deps = sqrt(EPS)
+            dt = 1. if dtime < 1.e-12 else dtime
+            Jsub = np.zeros((d.shape[0], len(v), len(v)))
+            for (i, j) in enumerate(v):
+                Dp = d.copy()
+                Dp[:, j] += deps / dt
+                Fp, Ep = mml.update_deformation_batch(dt, 0., F0, Dp)
+                sigp = self.material.update_state_batch(time, dt, temp,
+                    dtemp, 1., 1., F0, Fp, Ep, Dp, efield, np.array(stress),
+                    np.array(statev), self.params, last=False, mode=0)[0]
+                Jsub[:, i, :] = (sigp[:, v] - sig[:, v]) / deps
+            return sig, sdv, Jsub
+
+        # update point by point
+        J = np.zeros((sig.shape[0], 6, 6)) if jac else None
+        for (i, material) in enumerate(self.materials):
+            if jac:
+                sig[i], sdv[i], ddsdde = material.compute_updated_state(time,
+                    dtime, temp, dtemp, kappa, F0[i], F[i], stran[i], d[i],
+                    efield, stress[i], statev[i], last=True)
+                J[i] = ddsdde
+            else:
+                sig[i], sdv[i] = material.compute_updated_state(time, dtime,
+                    temp, dtemp, kappa, F0[i], F[i], stran[i], d[i], efield,
+                    stress[i], statev[i], last=True, disp=1)
+        if not jac:
+            return sig, sdv
+        return sig, sdv, J[:, v][:, :, v]
+
+    def newton(self, t, dt, temp, dtemp, kappa, f0, f, stran, darg, sig,
+               statev, efield, v, sigspec):
+        '''Newton iterations for d[:, v] of all points at once
+
+        The iteration is that of the module level newton function, applied to
+        all points simultaneously.  Returns d and a mask of the points that
+        did not converge.
+
+        '''
+        depsmag = lambda a: np.sqrt(np.sum(a[:, :3] ** 2, axis=1) +
+                                    2. * np.sum(a[:, 3:] ** 2, axis=1)) * dt
+        tol1, tol2 = EPS, sqrt(EPS)
+        maxit1, maxit2, depsmax = 20, 30, .2
+
+        d = darg.copy()
+        failed = depsmag(d) > depsmax
+        active = ~failed
+        dnom = np.maximum(np.amax(np.abs(sigspec), axis=1), 1.)
+
+        for i in range(maxit2):
+            fp, ep = mml.update_deformation_batch(dt, 0., f, d)
+            s, x, Jsub = self.compute_updated_state(t, dt, temp, dtemp,
+                kappa, f0, fp, ep, d, efield, sig, statev, jac=True, v=v)
+            sigerr = s[:, v] - sigspec
+            relerr = np.amax(np.abs(sigerr), axis=1) / dnom
+            active &= relerr >= (tol1 if i <= maxit1 else tol2)
+            if not np.any(active):
+                break
+
+            # Newton update of the points not yet converged
+            a = np.flatnonzero(active)
+            dv = solve_stack(Jsub[a], sigerr[a])
+            dd = d[a]
+            dd[:, v] -= dv / dt
+            d[a] = dd
+
+            bad = ((depsmag(d) > depsmax) |
+                   np.any(~np.isfinite(d), axis=1)) & active
+            failed |= bad
+            active &= ~bad
+
+        else:
+            failed |= active
+
+        return d, failed
+
+    def sig2d(self, t, dt, temp, dtemp, kappa, f0, f, stran, d, sig, statev,
+              efield, v, sigspec, proportional):
+        '''Determine the symmetric part of the velocity gradient of each point
+        given stress.  Points not converged by the batched Newton iterations
+        (or all points, for non batch models) are solved one at a time by
+        sig2d.
+
+        '''
+        failed = np.ones(d.shape[0], dtype=bool)
+        if self.batched and not proportional:
+            dnew, failed = self.newton(t, dt, temp, dtemp, kappa, f0, f,
+                                       stran, d, sig, statev, efield, v,
+                                       sigspec)
+            d = np.where(failed[:, None], d, dnew)
+        else:
+            d = d.copy()
+        for i in np.flatnonzero(failed):
+            d[i] = sig2d(self.materials[i], t, dt, temp, dtemp, kappa, f0[i],
+                         f[i], stran[i], d[i], sig[i], statev[i], efield, v,
+                         sigspec[i], proportional, broyden=self.broyden)
+        return d
+
+    def _run_step(self, step):
+        '''Process this step for all points'''
+
+        # Unpack the state
+        F = self.state_db.get("F")
+        stress = self.state_db.get("stress")
+        strain = self.state_db.get("strain")
+        statev = self.state_db.get("statev")
+        temp = self.state_db.get("temp")
+        efield = self.state_db.get("efield")
+
+        step_start_time = tt()
+        termination_time = self.termination_time
+
+        logger = logging.getLogger('matmodlab.mmd.simulator')
+        if step.adaptive:
+            logger.warn('{0}: adaptive frames are not supported for batches '
+                        'of points, using the requested frames'.format(
+                            step.name))
+        num_frame = len(step.frames)
+        lsn = len(str(num_frame))
+        message = '{0}, Frame {{0:{1}d}}'.format(step.name, lsn)
+
+        kappa, proportional = step.kappa, step.proportional
+
+        # the following variables have values at [begining, end, current] of
+        # step, with one row per material point
+        time = np.array([step.frames[0].time,
+                         step.frames[-1].value, step.frames[0].time])
+        temp = np.array((temp, step.temperature, temp))
+        efield = np.array((efield, step.elec_field, efield))
+        strain = np.array((strain, strain, strain))
+        stress = np.array((stress, stress, stress))
+
+        # the following variables have values at [begining, current] of step
+        statev = np.array((statev, statev))
+        F = np.array((F, F))
+
+        nv = 0
+        v = np.zeros(6, dtype=np.int)
+        for (i, cij) in enumerate(step.components):
+            if step.descriptors[i] == 1:         # -- strain rate
+                strain[1, :, i] = strain[0, :, i] + cij * VOIGT[i] * step.increment
+
+            elif step.descriptors[i] == 2:       # -- strain
+                strain[1, :, i] = cij * VOIGT[i]
+
+            elif step.descriptors[i] == 3:       # -- stress rate
+                stress[1, :, i] = stress[0, :, i] + cij * step.increment
+                v[nv] = i
+                nv += 1
+
+            elif step.descriptors[i] == 4:       # -- stress
+                stress[1, :, i] = cij
+                v[nv] = i
+                nv += 1
+
+            continue
+        v = v[:nv]
+        if step.increment < 1.e-14:
+            dedt = np.zeros_like(strain[1])
+            dtime = 1.
+        else:
+            dedt = (strain[1] - strain[0]) / step.increment
+            dtime = (time[1] - time[0]) / num_frame
+
+        dtemp = (temp[1] - temp[0]) / num_frame
+
+        # --- find current value of d: sym(velocity gradient)
+        if not nv:
+            if abs(kappa) > 1.e-14:
+                d = mml.deps2d_batch(dtime, kappa, strain[2], dedt)
+            else:
+                d = np.array(dedt)
+
+        else:
+            # Initial guess for d[v]
+            J0 = np.array([m.J0 for m in self.materials])
+            Jsub = J0[:, v][:, :, v]
+            work = (stress[1][:, v] - stress[0][:, v]) / step.increment
+            dedt[:, v] = solve_stack(Jsub, work)
+
+        # process this leg
+        for (iframe, frame) in enumerate(step.frames):
+
+            logger.info('\r' + message.format(iframe+1), extra={'continued':1})
+
+            # interpolate values to the target values for this step
+            a1 = float(num_frame - (iframe + 1)) / num_frame
+            a2 = float(iframe + 1) / num_frame
+            efield[2] = a1 * efield[0] + a2 * efield[1]
+            strain[2] = a1 * strain[0] + a2 * strain[1]
+            pstress = a1 * stress[0] + a2 * stress[1]
+
+            if nv:
+                # One or more stresses prescribed
+                d = self.sig2d(time[2], dtime, temp[2], dtemp, kappa, F[0],
+                               F[1], strain[2], dedt, stress[2], statev[0],
+                               efield[2], v, pstress[:, v], proportional)
+
+            # compute the current deformation gradient and strain from
+            # previous values and the deformation rate
+            F[1], e = mml.update_deformation_batch(dtime, kappa, F[0], d)
+            strain[2][:, v] = e[:, v]
+
+            # update material state
+            s = np.array(stress[2])
+            stress[2], statev[1] = self.compute_updated_state(time[2], dtime,
+                temp[2], dtemp, kappa, F[0], F[1], strain[2], d, efield[2],
+                stress[2], statev[0])
+            dstress = (stress[2] - s) / dtime
+
+            F[0] = F[1]
+            time[2] = a1 * time[0] + a2 * time[1]
+            temp[2] = a1 * temp[0] + a2 * temp[1]
+            statev[0] = statev[1]
+
+            # --- update the state
+            self.records.cache(Step=step.number, Frame=frame.number,
+                 Time=frame.value, DTime=frame.increment,
+                 E=strain[2]/VOIGT, F=F[1], D=d/VOIGT, DS=dstress, S=stress[2],
+                 SDV=statev[1], T=temp[2], EF=efield[2])
+
+            if termination_time is not None and time[2] >= termination_time:
+                step_duration = tt() - step_start_time
+                self._time += step_duration
+                logger.info('\r' + message.format(iframe+1) +
+                            ' ({0:.4f}s)'.format(self._time))
+                raise StopSteps
+
+            continue  # continue to next frame
+
+        step_duration = tt() - step_start_time
+        self._time += step_duration
+
+        logger.info('\r' + message.format(iframe+1) +
+                    ' ({0:.4f}s)'.format(self._time))
+
+        return time[2], temp[2], F[1], strain[2], stress[2], efield[2], statev[1]
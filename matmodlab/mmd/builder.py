@@ -7,6 +7,7 @@ import shutil
 import logging
 import argparse
 import importlib
+import multiprocessing as mp
 
 from ..constants import *
 from ..materials.product import *
@@ -14,15 +15,16 @@ from ..utils.misc import load_file, remove
 from ..product import ROOT_D, PKG_D
 from ..utils.errors import MatmodlabError
 from ..utils.fortran.extbuilder import FortranExtBuilder
+from ..utils.fortran.buildcache import CACHE_D
 from ..utils.fortran.product import *
 from ..utils.logio import setup_logger
 
 logger = setup_logger('matmodlab.mmd.builder')
 
 class Builder(object):
-    def __init__(self, name, fc=None, verbosity=1):
+    def __init__(self, name, fc=None, verbosity=1, nprocs=1):
         self.fb = FortranExtBuilder(name, fc=fc, verbosity=verbosity)
-        pass
+        self.nprocs = nprocs
 
     def build_materials(self, mats_to_build='all'):
         self.fetch_fort_libs_to_build(mats_to_fetch=mats_to_build)
@@ -38,19 +40,23 @@ class Builder(object):
         self._build_extension_modules()
 
     @staticmethod
-    def build_material(name, source_files, verbosity=0, lapack=False):
+    def build_material(name, source_files, verbosity=0, lapack=False,
+                       build_dir=None):
         '''Build a single material
 
         Parameters
         ----------
         name : str
           The name of the material to build
+        build_dir : str
+          Directory in which to build the material [default: PKG_D]
 
         '''
         cwd = os.getcwd()
-        fb = FortranExtBuilder(name, verbosity=verbosity)
+        fb = FortranExtBuilder(name, verbosity=verbosity, build_dir=build_dir)
         logger.info('building {0}'.format(name))
-        source_files.append(IO_F90)
+        if IO_F90 not in source_files:
+            source_files.append(IO_F90)
         fb.add_extension(name, source_files, lapack=lapack)
         fb.build_extension_modules(verbosity=verbosity)
         os.chdir(cwd)
@@ -174,7 +180,7 @@ class Builder(object):
         '''Build the extension modules
 
         '''
-        self.fb.build_extension_modules()
+        self.fb.build_extension_modules(nprocs=self.nprocs)
         for ext in self.fb.exts_failed:
             logger.warn('{0}: failed to build'.format(ext))
 
@@ -187,10 +193,12 @@ def wipe_built_libs():
         remove(f)
     bld_d = os.path.join(PKG_D, 'build')
     remove(bld_d)
+    remove(CACHE_D)
 
-def build(what_to_build, wipe_and_build=False, verbosity=1, user_env=0):
+def build(what_to_build, wipe_and_build=False, verbosity=1, user_env=0,
+          nprocs=1):
 
-    builder = Builder('matmodlab', verbosity=verbosity)
+    builder = Builder('matmodlab', verbosity=verbosity, nprocs=nprocs)
 
     if wipe_and_build:
         wipe_built_libs()
@@ -229,6 +237,10 @@ def main(argv=None):
        help='Build auxiliary support files only [default: all]')
     parser.add_argument('-e', nargs='?', default=0, const=1, type=int,
        help='Build materials in user environment file [default: all]')
+    parser.add_argument('-j', nargs='?', default=1, const=mp.cpu_count(),
+       type=int, help=('Number of extension modules to build simultaneously '
+                       '[default: %(default)s, or the number of cpus if '
+                       'given without a value]'))
     args = parser.parse_args(argv)
 
     if args.W:
@@ -244,7 +256,7 @@ def main(argv=None):
         what_to_build = ('material', args.m)
 
     return build(what_to_build, wipe_and_build=args.w,
-                 verbosity=args.v, user_env=args.e)
+                 verbosity=args.v, user_env=args.e, nprocs=args.j)
 
 if __name__ == '__main__':
     main()
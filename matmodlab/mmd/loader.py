@@ -1,5 +1,6 @@
 import re
 import os
+import json
 import logging
 from ..materials.product import *
 from ..utils import xpyclbr
@@ -7,7 +8,30 @@ from ..mml_siteenv import environ
 from ..utils.errors import MatmodlabError
 from ..utils.misc import load_file, rand_id
 
+class MaterialInfo(object):
+    '''Registry entry for a material model
+
+    The model's module is imported on first use of mat_class'''
+    def __init__(self, name, class_name, file, mat_class=None):
+        self.name = name
+        self.class_name = class_name
+        self.file = file
+        self._mat_class = mat_class
+
+    @property
+    def mat_class(self):
+        if self._mat_class is None:
+            module = load_file(self.file)
+            self._mat_class = getattr(module, self.class_name, None)
+        return self._mat_class
+
 class MaterialLoader:
+    # process level registry (signature, loader), the material models found
+    # in each file, and the listing of each directory in std_materials
+    registry = None
+    files = {}
+    listings = {}
+
     def __init__(self, std_libs, user_libs):
         self.std_libs = std_libs
         self.user_libs = user_libs
@@ -37,53 +61,103 @@ class MaterialLoader:
     def load_materials(cls):
         '''Find material models
 
+        The registry is built once per process and rebuilt only when the
+        std_materials directories, the material files in them (by
+        modification time), or environ.materials change.  Only changed files
+        are rescanned.  If environ.material_index names a file, the names of
+        the models in each material file are persisted to it and models found
+        through it are only imported when first used.
+
         '''
+        signature = cls.signature()
+        if cls.registry is not None and cls.registry[0] == signature:
+            return cls.registry[1]
+        loader = cls.scan()
+        cls.registry = (signature, loader)
+        return loader
+
+    @classmethod
+    def material_files(cls):
+        '''The material interface files in std_materials and their
+        modification times'''
+        rx = re.compile(r'(?:^|[\\b_\\.-])[Mm]at')
+        files = []
+        for item in environ.std_materials:
+            if os.path.isfile(item):
+                files.append(os.path.realpath(item))
+                continue
+            try:
+                mtime = os.path.getmtime(item)
+            except OSError:
+                continue
+            listing = cls.listings.get(item)
+            if listing is None or listing[0] != mtime:
+                names = [f for f in os.listdir(item)
+                         if rx.search(f) and f.endswith('.py')]
+                listing = cls.listings[item] = (mtime, sorted(names))
+            files.extend(os.path.join(item, f) for f in listing[1])
+        return [(f, os.path.getmtime(f)) for f in files]
+
+    @classmethod
+    def signature(cls):
+        return (tuple(environ.std_materials), tuple(cls.material_files()),
+                repr(sorted(environ.materials.items())),
+                environ.material_index)
+
+    @classmethod
+    def scan(cls):
+        '''Build the registry'''
         errors = []
         std_libs = {}
-        rx = re.compile(r'(?:^|[\\b_\\.-])[Mm]at')
         a = ['MaterialModel']
+        index = cls.read_index()
 
         # gather and verify all files
         # go through each item in std_materials and generate a list of material
         # interface files. if item is a directory gather all files that match rx;
         # if it's a file, add it to the list of material files
+        files = dict(cls.material_files())
         for item in environ.std_materials:
             if os.path.isfile(item):
-                d, files = os.path.split(os.path.realpath(item))
-                files = [files]
+                d = os.path.dirname(os.path.realpath(item))
+                paths = [os.path.realpath(item)]
             elif os.path.isdir(item):
                 d = item
-                files = [f for f in os.listdir(item) if rx.search(f)]
+                paths = [os.path.join(item, f) for f in cls.listings[item][1]]
             else:
                 logging.warn('{0} no such directory or file, skipping'.format(item))
                 continue
-            files = [f for f in files if f.endswith('.py')]
+            paths = [f for f in paths if f.endswith('.py')]
 
-            if not files:
+            if not paths:
                 logging.warn('{0}: no mat files found'.format(d))
 
             # go through files and determine if it's an interface file. if it is,
             # load it and add it to std_libs
-            for f in files:
-                module = f[:-3]
-                try:
-                    libs = xpyclbr.readmodule(module, [d], ancestors=a)
-                except AttributeError as e:
-                    errors.append(e.args[0])
-                    logging.error(e.args[0])
-                    continue
-                for lib in libs:
-                    if lib in std_libs:
-                        logging.error('{0}: duplicate material'.format(lib))
-                        errors.append(lib)
+            for path in paths:
+                mtime = files[path]
+                libs = cls.files.get(path)
+                if libs is not None and libs[0] == mtime:
+                    libs = libs[1]
+                elif index.get(path, [None])[0] == mtime:
+                    libs = [MaterialInfo(name, class_name, path)
+                            for (name, class_name) in index[path][1]]
+                else:
+                    try:
+                        libs = cls.read_file(path, a, reload=path in cls.files)
+                    except AttributeError as e:
+                        errors.append(e.args[0])
+                        logging.error(e.args[0])
+                        continue
+                cls.files[path] = (mtime, libs)
+                for info in libs:
+                    if info.name in std_libs:
+                        logging.error('{0}: duplicate material'.format(info.name))
+                        errors.append(info.name)
                         continue
-                    module = load_file(libs[lib].file)
-                    mat_class = getattr(module, libs[lib].class_name, None)
-                    if mat_class.name is None:
-                        raise MatmodlabError('{0}: material name attribute '
-                                             'not defined'.format(lib))
-                    libs[lib].mat_class = mat_class
-                    std_libs.update({mat_class.name: libs[lib]})
+                    std_libs[info.name] = info
+
+        cls.write_index(index)
 
         # load materials in the materials dict
         user_libs = {}
@@ -115,3 +189,49 @@ class MaterialLoader:
                                  '{0}'.format(', '.join(errors)))
 
         return cls(std_libs, user_libs)
+
+    @staticmethod
+    def read_file(path, ancestors, reload=False):
+        '''Find and import the material models in the file path'''
+        d, f = os.path.split(path)
+        libs = xpyclbr.readmodule(f[:-3], [d], ancestors=ancestors)
+        infos = []
+        for lib in libs:
+            module = load_file(libs[lib].file, reload=reload)
+            mat_class = getattr(module, libs[lib].class_name, None)
+            if mat_class.name is None:
+                raise MatmodlabError('{0}: material name attribute '
+                                     'not defined'.format(lib))
+            infos.append(MaterialInfo(mat_class.name, libs[lib].class_name,
+                                      libs[lib].file, mat_class=mat_class))
+        return infos
+
+    @classmethod
+    def read_index(cls):
+        '''Read the persisted index of material files'''
+        if not environ.material_index:
+            return {}
+        try:
+            with open(environ.material_index) as fh:
+                return json.load(fh)
+        except (IOError, ValueError):
+            return {}
+
+    @classmethod
+    def write_index(cls, index):
+        '''Persist the index of material files, if requested'''
+        if not environ.material_index:
+            return
+        new = dict((path, [mtime, [[info.name, info.class_name]
+                                   for info in libs]])
+                   for (path, (mtime, libs)) in cls.files.items())
+        if new == index:
+            return
+        tmp = environ.material_index + '.' + rand_id(6)
+        try:
+            with open(tmp, 'w') as fh:
+                json.dump(new, fh)
+            os.rename(tmp, environ.material_index)
+        except (IOError, OSError):
+            logging.warn('unable to write material index '
+                         '{0}'.format(environ.material_index))
@@ -20,6 +20,7 @@ from ..materials.addon_expansion import Expansion
 from ..materials.addon_viscoelastic import Viscoelastic
 from ..materials.product import is_user_model, USER
 from ..utils.fortran.product import SDVINI
+from ..utils.fortran.buildcache import build_material_library
 
 from ..constants import XX, YY, ZZ, XY, YZ, XZ, DEFAULT_TEMP
 
@@ -51,6 +52,7 @@ class MaterialModel(object):
     elastic_props = None
     lib = None
     libname = None
+    complex_step = False
 
     @classmethod
     def source_files(cls):
@@ -124,6 +126,12 @@ class MaterialModel(object):
         # --- set defaults
         self.sqa_stiff = kwargs.get('sqa_stiff', environ.sqa_stiff)
         self.num_stiff = kwargs.get('num_stiff', environ.num_stiff)
+        self.jacobian = kwargs.get('jacobian', environ.jacobian)
+        if self.jacobian not in (CENTERED, FORWARD, BATCHED, COMPLEX_STEP):
+            raise MatmodlabError('unknown jacobian scheme '
+                                 '{0!r}'.format(self.jacobian))
+        self.num_jac_evals = 0
+        self.num_jac_evals_saved = 0
         self.iwarn_stiff = 0
         self.visco_model = None
         self.xpan = None
@@ -133,6 +141,7 @@ class MaterialModel(object):
         # parameter arrays
         self.iparams = keyarray(self.parameter_names, self.iparray)
         self.params = keyarray(self.parameter_names, self.iparray)
+        self.param_layout = SlotLayout(self.parameter_names)
 
         # import the material library
         self._import_lib(libname=kwargs.get('libname'))
@@ -158,6 +167,7 @@ class MaterialModel(object):
         if len(sdv_vals) != len(sdv_keys):
             raise MatmodlabError('len(sdv_values) != len(sdv_keys)')
         self.sdv_keys = [s for s in sdv_keys]
+        self.sdv_layout = SlotLayout(self.sdv_keys)
         self.initial_sdv = np.array(sdv_vals, dtype=np.float64)
 
         # call model with zero strain rate to get initial jacobian
@@ -245,6 +255,7 @@ class MaterialModel(object):
         statev array.'''
         M = len(self.sdv_keys)
         self.sdv_keys.extend(keys)
+        self.sdv_layout = SlotLayout(self.sdv_keys)
         N = len(self.sdv_keys)
         if len(values) != len(keys):
             raise MatmodlabError('len(values) != len(keys)')
@@ -252,8 +263,8 @@ class MaterialModel(object):
         return slice(M, N)
 
     def numerical_jacobian(self, time, dtime, temp, dtemp, kappa, F0, F, stran, d,
-                           elec_field, stress, statev, v):
-        '''Numerically compute material Jacobian by a centered difference scheme.
+                           elec_field, stress, statev, v, method=None):
+        '''Numerically compute material Jacobian by a finite difference scheme.
 
         Returns
         -------
@@ -269,10 +280,28 @@ class MaterialModel(object):
         elements in v. Note that in the special case v = [1,2,3,4,5,6], with
         nv = 6, the matrix that is returned is the full Jacobian matrix, J.
 
-        The components of Js are computed numerically using a centered
-        differencing scheme which requires two calls to the material model
-        subroutine for each element of v. The centering is about the point eps
-        = epsold + d * dt, where d is the rate-of-strain array.
+        The components of Js are computed numerically by one of the following
+        schemes (method, defaults to the material's jacobian setting):
+
+        CENTERED
+          A centered differencing scheme which requires two calls to the
+          material model subroutine for each element of v. The centering is
+          about the point eps = epsold + d * dt, where d is the rate-of-strain
+          array.
+        FORWARD
+          Forward differences about the same point, nv + 1 calls.
+        BATCHED
+          The centered differences, with all of the perturbed states
+          evaluated in one call to update_state_batch.  Falls back to FORWARD
+          for models without update_state_batch or with add-on models.
+        COMPLEX_STEP
+          The complex step derivative, nv calls with a complex strain
+          perturbation.  Only for models declaring complex_step support
+          (without add-on models), otherwise falls back to FORWARD.
+
+        The number of material evaluations made, and the number saved with
+        respect to the centered scheme, are accumulated in num_jac_evals and
+        num_jac_evals_saved.
 
         History
         -------
@@ -290,6 +319,40 @@ class MaterialModel(object):
         deps =  np.sqrt(np.finfo(np.float64).eps)
         Jsub = np.zeros((nv, nv))
         dtime = 1 if dtime < 1.e-12 else dtime
+        method = method or self.jacobian
+        addons = self.visco_model is not None or self.xpan is not None
+        args = (time, dtime, temp, dtemp, kappa, F0, F, stran, d, elec_field,
+                stress, statev, v)
+
+        if method == BATCHED:
+            Js = None if addons else self.batched_jacobian(*args)
+            if Js is not None:
+                self.count_jacobian_evals(nv, 1)
+                return Js
+            method = FORWARD
+
+        if method == COMPLEX_STEP:
+            if self.complex_step and not addons:
+                self.count_jacobian_evals(nv, nv)
+                return self.complex_step_jacobian(*args)
+            method = FORWARD
+
+        if method == FORWARD:
+            # unperturbed state
+            Fo, Eo = mmlabpack.update_deformation(dtime, 0., F, d)
+            sigo = self.compute_updated_state(time, dtime, temp, dtemp, kappa,
+                      F0, Fo, Eo, d, elec_field, stress.copy(), statev.copy(),
+                      disp=3)
+            for i in range(nv):
+                Dp = d.copy()
+                Dp[v[i]] = d[v[i]] + deps / dtime
+                Fp, Ep = mmlabpack.update_deformation(dtime, 0., F, Dp)
+                sigp = self.compute_updated_state(time, dtime, temp, dtemp,
+                          kappa, F0, Fp, Ep, Dp, elec_field, stress.copy(),
+                          statev.copy(), disp=3)
+                Jsub[i, :] = (sigp[v] - sigo[v]) / deps
+            self.count_jacobian_evals(nv, nv + 1)
+            return Jsub
 
         for i in range(nv):
             # perturb forward
@@ -315,8 +378,65 @@ class MaterialModel(object):
 
             continue
 
+        self.count_jacobian_evals(nv, 2 * nv)
         return Jsub
 
+    def batched_jacobian(self, time, dtime, temp, dtemp, kappa, F0, F, stran,
+                         d, elec_field, stress, statev, v):
+        '''Centered difference Jacobian with all 2*nv perturbed states
+        evaluated by a single call to update_state_batch.  Returns None if the
+        model does not implement update_state_batch'''
+        nv = len(v)
+        deps = np.sqrt(np.finfo(np.float64).eps)
+        n = 2 * nv
+        Dp = np.tile(d, (n, 1))
+        for i in range(nv):
+            Dp[i, v[i]] += (deps / dtime) / 2.
+            Dp[nv+i, v[i]] -= (deps / dtime) / 2.
+        Fp, Ep = mmlabpack.update_deformation_batch(dtime, 0.,
+                                                    np.tile(F, (n, 1)), Dp)
+        N = self.num_sdv
+        item = self.update_state_batch(time, dtime, temp, dtemp, 1., 1.,
+                   np.tile(F0, (n, 1)), Fp, Ep, Dp, elec_field,
+                   np.tile(stress, (n, 1)), np.tile(statev[:N], (n, 1)),
+                   np.tile(np.asarray(self.params), (n, 1)),
+                   last=False, mode=0)
+        if item is None:
+            return None
+        sig = item[0]
+        return (sig[:nv][:, v] - sig[nv:][:, v]) / deps
+
+    def complex_step_jacobian(self, time, dtime, temp, dtemp, kappa, F0, F,
+                              stran, d, elec_field, stress, statev, v):
+        '''Complex step Jacobian, J[i, :] = Im(sig(eps + ih e_i)) / h
+
+        The strain and rate of deformation are perturbed along the imaginary
+        axis (the deformation gradient is left unperturbed), so the model must
+        be written with analytic operations on stress, strain and state.
+
+        '''
+        nv = len(v)
+        h = 1.e-20
+        Jsub = np.zeros((nv, nv))
+        Fo, Eo = mmlabpack.update_deformation(dtime, 0., F, d)
+        for i in range(nv):
+            Dp = np.array(d, dtype=np.complex128)
+            Ep = np.array(Eo, dtype=np.complex128)
+            Dp[v[i]] += 1j * h / dtime
+            Ep[v[i]] += 1j * h
+            sigp = self.compute_updated_state(time, dtime, temp, dtemp, kappa,
+                      F0, Fo, Ep, Dp, elec_field,
+                      np.array(stress, dtype=np.complex128),
+                      np.array(statev, dtype=np.complex128), disp=3)
+            Jsub[i, :] = sigp[v].imag / h
+        return Jsub
+
+    def count_jacobian_evals(self, nv, n):
+        '''Record n material evaluations for a numerical Jacobian of nv
+        components, and those saved relative to centered differences'''
+        self.num_jac_evals += n
+        self.num_jac_evals_saved += 2 * nv - n
+
     @property
     def parameters(self):
         return self.params
@@ -331,6 +451,32 @@ class MaterialModel(object):
     def update_state(self, *args, **kwargs):
         raise NotImplementedError
 
+    def update_state_batch(self, time, dtime, temp, dtemp, energy, rho, F0, F,
+            stran, d, elec_field, stress, statev, params, **kwargs):
+        '''Update the state of N material points at once
+
+        Parameters
+        ----------
+        F0, F : ndarray
+            Deformation gradients, shape (N, 9)
+        stran, d, stress : ndarray
+            Strain, rate of deformation, and stress, shape (N, 6)
+        statev : ndarray
+            State dependent variables, shape (N, num_sdv)
+        params : ndarray
+            Material parameters of each point, shape (N, num_prop)
+
+        Returns
+        -------
+        stress, statev, ddsdde : ndarray or None
+            The updated stress and state and the (N, 6, 6) stiffness (None if
+            the model has no analytic stiffness).  Models that cannot update
+            several points in one call return None (the default) and the
+            caller updates each point with update_state.
+
+        '''
+        return None
+
     def tostr(self, obj='mps'):
         p = {}
         for (i, name) in enumerate(self.parameter_names):
@@ -436,7 +582,7 @@ class MaterialModel(object):
         if last and sqa_stiff:
             # check how close stiffness returned from material is to the numeric
             c = self.numerical_jacobian(time, dtime, temp, dtemp, kappa, F0,
-                        Fm, Em, dm, elec_field, stress, sdv, V)
+                        Fm, Em, dm, elec_field, stress, sdv, V, method=CENTERED)
             err = np.amax(np.abs(ddsdde - c)) / np.amax(ddsdde)
             if err > 5.E-03: # .5 percent error
                 msg = 'error in material stiffness: {0:.4E} ({1:.2f})'.format(
@@ -580,42 +726,28 @@ def Material(model, parameters, switch=None, response=None,
     if errors:
         raise MatmodlabError('stopping due to previous errors')
 
-    # Check if model is already built (if applicable)
+    # Fetch the model library from the build cache, building it only if
+    # its sources (or the compiler and flags) have changed
     if source_files:
-        if libname is not None:
-            # need to build with new libname
-            for (i, f) in enumerate(source_files):
-                if f.endswith('.pyf'):
-                    signature = f
-                    break
-            else:
-                raise MatmodlabError('signature file not found')
-            lines = open(signature, 'r').read()
-            new_signature = os.path.join(PKG_D, libname + '.pyf')
-            libname_ = getattr(TheMaterial, 'libname', TheMaterial.name)
-            pat = r'(?is)python\s+module\s+{0}'.format(libname_)
-            repl = r'python module {0}'.format(libname)
-            lines = re.sub(pat, repl, lines)
-            with open(new_signature, 'w') as fh:
-                fh.write(lines)
-            source_files[i] = new_signature
-        else:
-            libname = getattr(TheMaterial, 'libname', TheMaterial.name)
+        libname_ = getattr(TheMaterial, 'libname', TheMaterial.name)
+        if libname is None:
+            libname = libname_
 
-        so_lib = os.path.join(PKG_D, libname + '.so')
         rebuild = rebuild or environ.rebuild_mat_lib
         if rebuild and libname not in environ.rebuild_mat_lib:
-            remove(so_lib)
             environ.rebuild_mat_lib.append(libname)
-        if not os.path.isfile(so_lib):
-            logging.getLogger('matmodlab.mmd.simulator').info(
-                '{0}: rebuilding material library'.format(libname))
-            from ..mmd import builder as bb
-            bb.Builder.build_material(libname, source_files,
-                                      lapack=TheMaterial.lapack,
-                                      verbosity=environ.verbosity)
-
-        if not os.path.isfile(so_lib):
+        else:
+            rebuild = False
+        try:
+            so_lib = build_material_library(libname, source_files,
+                                            lapack=TheMaterial.lapack,
+                                            signature_name=libname_,
+                                            rebuild=rebuild,
+                                            verbosity=environ.verbosity)
+        except ValueError as e:
+            raise MatmodlabError(e.args[0])
+
+        if so_lib is None or not os.path.isfile(so_lib):
             raise MatmodlabError('model library for {0} '
                                  'not found'.format(libname))
 
@@ -711,12 +843,11 @@ class keyarray(np.ndarray):
         return sorted(self._map.keys(), key=lambda x: self._map[x])
 
     def index(self, key):
+        if not isinstance(key, basestring):
+            # integers, slices, index arrays (eg, from a SlotLayout)
+            return key
         try:
-            # check if key is a string and in the array
             return self._map[key.upper()]
-        except AttributeError:
-            # key could have been an integer
-            return key
         except KeyError:
             # key was a string, but not in the array
             raise KeyError('{0!r} is not in keyarray'.format(key))
@@ -730,6 +861,59 @@ class keyarray(np.ndarray):
     def __array_finalize__(self, obj):
         self._map = getattr(obj, '_map', None)
 
+class SlotLayout(object):
+    """Offsets of the named slots of an array
+
+    Built once, when the material is set up, so that material models look up
+    parameters and state variables by attribute rather than by searching the
+    names on every update::
+
+        S = self.sdv_layout
+        statev[S.EQPS] += deqps   # S.EQPS is the integer offset of EQPS
+
+    The components of a tensor named <PREFIX>_<COMPONENT> (eg, BS_XX, BS_YY,
+    ..., BS_XZ) are also available under PREFIX, as a slice if they are
+    stored contiguously in the order of matmodlab's components (XX, YY, ZZ,
+    XY, YZ, XZ for symmetric tensors), otherwise as an index array ordered
+    the same way.
+
+    """
+    def __init__(self, names):
+        self.names = [s.upper() for s in names]
+        self.offsets = dict((name, i) for (i, name) in enumerate(self.names))
+        self.__dict__.update(self.offsets)
+        for (name, indices) in self.tensors().items():
+            if name in self.offsets:
+                continue
+            start = indices[0]
+            if indices == range(start, start + len(indices)):
+                indices = slice(start, start + len(indices))
+            else:
+                indices = np.array(indices)
+            setattr(self, name, indices)
+
+    def tensors(self):
+        """The offsets of the components of each tensor, keyed by its name"""
+        tensors = {}
+        for rtype in (TENSOR_3D, TENSOR_3D_FULL):
+            labels = COMPONENT_LABELS(rtype)
+            prefixes = set(name.rsplit('_', 1)[0] for name in self.names
+                           if name.endswith('_' + labels[0]))
+            for prefix in prefixes:
+                keys = ['{0}_{1}'.format(prefix, x) for x in labels]
+                if all(key in self.offsets for key in keys):
+                    tensors[prefix] = [self.offsets[key] for key in keys]
+        return tensors
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name.upper())
+        except AttributeError:
+            raise KeyError(name)
+
+    def __len__(self):
+        return len(self.names)
+
 def grouper(seq, n=8):
     """
     >>> list(grouper(3, 'ABCDEFG'))
@@ -7,6 +7,8 @@ import datetime
 import traceback
 import subprocess
 import numpy as np
+import multiprocessing as mp
+from itertools import product
 
 from ..constants import *
 from ..product import SPLASH
@@ -14,27 +16,61 @@ from ..mml_siteenv import environ
 from ..utils.logio import setup_logger
 from ..utils.errors import MatmodlabError
 from ..utils.mmltab import MMLTabularWriter
+from ..utils.evalcache import EvalCache
+from .permutator import share_steps, unshare_steps
 
-IOPT = 0
-LASTEVALD = None
 BIGNUM = 1.E+20
 MAXITER = 50
 TOL = 1.E-06
+FDSTEP = 1.E-06
 
 class Optimizer(object):
     def __init__(self, job, func, xinit, method=SIMPLEX, verbosity=None, d=None,
                  maxiter=MAXITER, tolerance=TOL, descriptors=None,
                  funcargs=[], Ns=10, dryrun=0, keep_intermediate=True,
-                 halt_on_err=False):
+                 halt_on_err=False, nprocs=1, popsize=15, seed=None,
+                 cache_size=1024, cache_file=None, share_steps=True):
+        """Optimizer constructor
+
+        func(x, xnames, evald, job, *funcargs) runs a single evaluation in the
+        directory evald and returns its error.  Evaluations are never run in
+        a changed working directory, simulations created without a directory
+        are run in evald.
+
+        The BRUTE grid, the DIFFEVOL population, and the finite difference
+        gradients of LBFGSB are evaluated in a pool of nprocs processes (func
+        must then be picklable, ie, defined at the top level of a module).
+        SIMPLEX, POWELL, and COBYLA evaluate one point at a time.
+
+        popsize and seed are the population size multiplier and random seed
+        of DIFFEVOL.
+
+        Successful evaluations are cached (at most cache_size of them, 0
+        disables the cache) and revisited parameter vectors are not rerun.
+        If cache_file is given, the cache is persisted to it so that a
+        restarted job does not repeat completed evaluations.  Remove the file
+        if func changes.
+
+        If share_steps is True, simulation steps run with the same material
+        parameters and prefix of steps by more than one evaluation (in the
+        same process) are run once (see Permutator).
+
+        """
         environ.raise_e = True
         environ.no_cutback = True
-        global IOPT
-        IOPT = 0
         self.job = job
         self.func = func
         self.ran = False
         self.dryrun = dryrun
         self.halt_on_err = halt_on_err
+        self.nprocs = nprocs
+        self.popsize = popsize
+        self.seed = seed
+        self.pool = None
+        self.share_steps = share_steps
+        self.step_cache = None
+        self.neval = 0
+        self.best = (np.inf, None)
 
         d = os.path.realpath(d or os.getcwd())
         self.directory = d
@@ -54,7 +90,7 @@ class Optimizer(object):
         self.Ns = int(round(max(Ns, 2.0)))
 
         # check method
-        if method not in (SIMPLEX, POWELL, COBYLA, BRUTE):
+        if method not in (SIMPLEX, POWELL, COBYLA, BRUTE, DIFFEVOL, LBFGSB):
             raise ValueError('unkown optimization method')
         self.method = method
 
@@ -86,6 +122,9 @@ class Optimizer(object):
                 if self.method in (SIMPLEX, POWELL):
                     logger.warn('optimization method does not support bounds')
                     x.bounds = None
+            elif self.method in (BRUTE, DIFFEVOL):
+                raise ValueError('{0}: optimization method requires '
+                                 'bounds'.format(x.name))
             self.bounds.append(x.bounds)
 
         if self.method in (SIMPLEX, POWELL):
@@ -102,6 +141,10 @@ class Optimizer(object):
         self.tolerance = tolerance
 
         self.tabular = MMLTabularWriter(self.output, job)
+        self.cache = None
+        if cache_size > 0:
+            self.cache = EvalCache(maxsize=cache_size, filename=cache_file,
+                                   names=self.names)
         self.timing = {}
 
         # write summary to the log file
@@ -146,10 +189,15 @@ Response descriptors:
         if self.bounds is not None:
             # user has specified bounds on the parameters to be optimized. Here,
             # we convert the bounds to inequality constraints (for cobyla) and
-            # normalized bounds (for brute).
+            # normalized bounds (for brute, differential evolution, and
+            # l-bfgs-b).
             lcons, ucons = [], []
             normalized_bounds = []
             for ibnd, bound in enumerate(self.bounds):
+                if bound is None:
+                    # only l-bfgs-b allows unbounded variables
+                    normalized_bounds.append((None, None))
+                    continue
                 lbnd, ubnd = bound
                 lcons.append(lambda z, idx=ibnd, bnd=lbnd: z[idx]-bnd/xfac[idx])
                 ucons.append(lambda z, idx=ibnd, bnd=ubnd: bnd/xfac[idx]-z[idx])
@@ -157,13 +205,12 @@ Response descriptors:
                 continue
             cons = lcons + ucons
 
-        args = (self.func, self.funcargs, self.rootd, self.halt_on_err,
-                self.job, self.names, self.descriptors, self.tabular, xfac)
+        self.xfac = xfac
 
         if self.dryrun:
             # do a dry run of the function
-            err = run_job(x0, *args)
-            if err == np.nan:
+            err = self.objective(x0)
+            if np.isnan(err):
                 s = 'Optimization dry run failed'
                 logger.error(s)
             else:
@@ -174,24 +221,57 @@ Response descriptors:
             self.dryrun_error = err
             return
 
-        if self.method == SIMPLEX:
-            xopt = scipy.optimize.fmin(
-                run_job, x0, xtol=self.tolerance, ftol=self.tolerance,
-                maxiter=self.maxiter, args=args, disp=0)
-
-        elif self.method == POWELL:
-            xopt = scipy.optimize.fmin_powell(
-                run_job, x0, xtol=self.tolerance, ftol=self.tolerance,
-                maxiter=self.maxiter, args=args, disp=0)
-
-        elif self.method == COBYLA:
-            xopt = scipy.optimize.fmin_cobyla(
-                run_job, x0, cons, consargs=(), args=args, disp=0)
-
-        elif self.method == BRUTE:
-            xopt = scipy.optimize.brute(
-                run_job, normalized_bounds, args=args, Ns=self.Ns, disp=0,
-                finish=None)
+        if self.share_steps:
+            self.step_cache = share_steps()
+
+        if self.method in (BRUTE, DIFFEVOL, LBFGSB):
+            nprocs = max(self.nprocs, environ.nprocs)
+            nprocs = min(mp.cpu_count(), nprocs)
+            if nprocs > 1:
+                self.pool = mp.Pool(processes=nprocs)
+
+        try:
+            if self.method == SIMPLEX:
+                xopt = scipy.optimize.fmin(
+                    self.objective, x0, xtol=self.tolerance,
+                    ftol=self.tolerance, maxiter=self.maxiter, disp=0)
+
+            elif self.method == POWELL:
+                xopt = scipy.optimize.fmin_powell(
+                    self.objective, x0, xtol=self.tolerance,
+                    ftol=self.tolerance, maxiter=self.maxiter, disp=0)
+
+            elif self.method == COBYLA:
+                xopt = scipy.optimize.fmin_cobyla(
+                    self.objective, x0, cons, consargs=(), disp=0)
+
+            elif self.method == BRUTE:
+                grid = np.array(list(product(*[np.linspace(lo, hi, self.Ns)
+                                               for (lo, hi) in normalized_bounds])))
+                errors = self.evaluate(grid)
+                xopt = grid[np.argmin(np.where(np.isnan(errors),
+                                               np.inf, errors))]
+
+            elif self.method == DIFFEVOL:
+                xopt, err = differential_evolution(
+                    self.evaluate, normalized_bounds, maxiter=self.maxiter,
+                    tol=self.tolerance, popsize=self.popsize, seed=self.seed)
+
+            elif self.method == LBFGSB:
+                bounds = normalized_bounds if self.bounds is not None else None
+                xopt, err, info = scipy.optimize.fmin_l_bfgs_b(
+                    self.func_and_grad, x0, args=(bounds,), bounds=bounds,
+                    factr=self.tolerance/np.finfo(float).eps,
+                    pgtol=self.tolerance, maxiter=self.maxiter)
+
+        finally:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+            if self.step_cache is not None:
+                unshare_steps()
+                logger.debug('Shared steps: ' + self.step_cache.summary())
 
         self.xopt = xopt * xfac
 
@@ -203,6 +283,64 @@ Response descriptors:
 
         return
 
+    def evaluate(self, xs):
+        """Evaluate the objective function at each of the normalized points xs,
+        in parallel if a pool of workers is available
+
+        """
+        xs = [xcall * self.xfac for xcall in xs]
+        errors = [None] * len(xs)
+        if self.cache is not None:
+            errors = [self.cache.get(x) for x in xs]
+
+        args = []
+        for (i, x) in enumerate(xs):
+            if errors[i] is not None:
+                continue
+            self.neval += 1
+            args.append((self.func, x, self.funcargs, self.neval, self.rootd,
+                         self.job, self.names, self.halt_on_err))
+
+        if self.pool is None or len(args) <= 1:
+            results = [run_job(arg) for arg in args]
+        else:
+            results = self.pool.map(run_job, args)
+
+        results = iter(results)
+        for (i, x) in enumerate(xs):
+            if errors[i] is not None:
+                continue
+            (n, stat, evald, parameters, err) = next(results)
+            self.tabular.write_eval_info(n, stat, evald, parameters,
+                                         ((self.descriptors[0], err),))
+            if stat == 0:
+                if self.cache is not None:
+                    self.cache.set(x, err)
+                if err < self.best[0]:
+                    self.best = (err, evald)
+            errors[i] = err
+
+        return np.array(errors)
+
+    def objective(self, xcall):
+        """Objective function of the sequential minimizers"""
+        return self.evaluate([xcall])[0]
+
+    def func_and_grad(self, xcall, bounds=None):
+        """Objective function and its forward difference gradient, with the
+        perturbed points evaluated together
+
+        """
+        n = len(xcall)
+        h = FDSTEP * np.maximum(1., np.abs(xcall))
+        if bounds is not None:
+            # step backwards at an upper bound
+            ubnd = np.array([BIGNUM if b[1] is None else b[1] for b in bounds])
+            h = np.where(xcall + h > ubnd, -h, h)
+        xs = [xcall] + [xcall + h[i] * np.eye(n)[i] for i in range(n)]
+        errors = self.evaluate(xs)
+        return errors[0], (errors[1:] - errors[0]) / h
+
     def finish(self):
         """ finish up the optimization job """
         logger = logging.getLogger('matmodlab.mmd.optimizer')
@@ -216,9 +354,12 @@ Summary of optimization results
 ------- -- ------------ -------
 {0}: calculations completed ({1:.4f}s.)
 Iterations: {2}
+Cache: {3}
 Optimized parameters
-{3}
-""".format(self.job, opt_time, IOPT, opt_pars)
+{4}
+""".format(self.job, opt_time, self.neval,
+           'disabled' if self.cache is None else self.cache.summary(),
+           opt_pars)
         logger.info(summary)
 
         # write out optimized params
@@ -227,9 +368,10 @@ Optimized parameters
                 fobj.write("{0} = {1: .18f}\n".format(name, self.xopt[i]))
         environ.parent_process = 0
 
-        # Link directory 'final' to the last evaluation directory
-        os.symlink(os.path.relpath(LASTEVALD, start=self.rootd),
-                   os.path.join(self.rootd, "final"))
+        # Link directory 'final' to the best evaluation directory
+        if self.best[1] is not None:
+            os.symlink(os.path.relpath(self.best[1], start=self.rootd),
+                       os.path.join(self.rootd, "final"))
 
         if environ.notebook:
             print '\nDone'
@@ -249,7 +391,58 @@ def catd(d, i):
     N = 3
     return os.path.join(d, "eval_{0:0{1}d}".format(i, N))
 
-def run_job(xcall, *args):
+def differential_evolution(func, bounds, maxiter=MAXITER, tol=TOL, popsize=15,
+                           mutation=(.5, 1.), recombination=.7, seed=None):
+    """Minimize func by differential evolution (best/1/bin with dithering)
+
+    Parameters
+    ----------
+    func : callable
+        func(xs) returns the objective function at each row of xs.  Each
+        generation is evaluated in a single call.
+    bounds : sequence of tuple
+        (min, max) of each variable
+
+    Returns
+    -------
+    xopt : ndarray
+        The best member of the population
+    fopt : float
+        The objective function at xopt
+
+    """
+    rs = np.random.RandomState(seed)
+    lo, hi = np.array(bounds, dtype=np.float64).T
+    n = len(lo)
+    npop = max(5, popsize * n)
+
+    def energies(xs):
+        e = np.asarray(func(xs), dtype=np.float64)
+        return np.where(np.isnan(e), np.inf, e)
+
+    pop = lo + rs.rand(npop, n) * (hi - lo)
+    e = energies(pop)
+    for it in range(maxiter):
+        finite = e[np.isfinite(e)]
+        if len(finite) == npop and np.std(e) <= tol * abs(np.mean(e)):
+            break
+        # mutate about the best member with randomly chosen differences
+        F = rs.uniform(*mutation)
+        r = np.array([rs.choice(np.delete(np.arange(npop), i), 2, replace=False)
+                      for i in range(npop)])
+        mutant = pop[np.argmin(e)] + F * (pop[r[:, 0]] - pop[r[:, 1]])
+        # binomial crossover, each trial gets at least one mutated component
+        cross = rs.rand(npop, n) < recombination
+        cross[np.arange(npop), rs.randint(n, size=npop)] = True
+        trial = np.clip(np.where(cross, mutant, pop), lo, hi)
+        et = energies(trial)
+        improved = et < e
+        pop[improved], e[improved] = trial[improved], et[improved]
+
+    i = np.argmin(e)
+    return pop[i], e[i]
+
+def run_job(args):
     """Objective function
 
     Creates a directory to run the current job, runs the job, returns the
@@ -257,36 +450,30 @@ def run_job(xcall, *args):
 
     Returns
     -------
-    error : float
-        Error in job
+    result : tuple
+        (job number, status, directory, parameters, error)
 
     """
-    global IOPT, LASTEVALD
     logger = logging.getLogger('matmodlab.mmd.optimizer')
-    func, funcargs, rootd, halt_on_err, job, xnames, desc, tabular, xfac = args
+    func, x, funcargs, n, rootd, job, xnames, halt_on_err = args
 
-    IOPT += 1
-    evald = catd(rootd, IOPT)
+    evald = catd(rootd, n)
     os.mkdir(evald)
-    LASTEVALD = evald
-
-    cwd = os.getcwd()
-    os.chdir(evald)
     environ.simulation_dir = evald
+    environ.eval_dir = evald
 
     # write the params.in for this run
-    x = xcall * xfac
     parameters = zip(xnames, x)
-    with open("params.in", "w") as fobj:
+    with open(os.path.join(evald, "params.in"), "w") as fobj:
         for name, param in parameters:
             fobj.write("{0} = {1: .18f}\n".format(name, param))
 
     logger.info("starting job {0} with {1}... ".format(
-        IOPT, ",".join("{0}={1:.2g}".format(n, p) for n, p in parameters)),
+        n, ",".join("{0}={1:.2g}".format(a, b) for a, b in parameters)),
         extra={'continued':1})
 
     if environ.notebook:
-        print '\rRunning job {0}'.format(IOPT),
+        print '\rRunning job {0}'.format(n),
 
     try:
         err = func(x, xnames, evald, job, *funcargs)
@@ -295,7 +482,7 @@ def run_job(xcall, *args):
     except BaseException:
         string = traceback.format_exc()
         logger.error("\nRun {0} failed with the following "
-                     "exception:\n{1}".format(IOPT, string))
+                     "exception:\n{1}".format(n, string))
 
         if halt_on_err:
             logger.error("\n\nHalting optimization on error at user request.\n")
@@ -304,11 +491,10 @@ def run_job(xcall, *args):
         stat = 1
         err = np.nan
 
-    tabular.write_eval_info(IOPT, stat, evald, parameters, ((desc[0], err),))
-
-    os.chdir(cwd)
+    finally:
+        environ.eval_dir = ''
 
-    return err
+    return n, stat, evald, parameters, err
 
 class OptimizeVariable(object):
 
@@ -33,7 +33,39 @@ ps.job_num = 0
 class Permutator(object):
     def __init__(self, job, func, xinit, method=ZIP, correlations=False,
                  verbosity=None, descriptors=None, nprocs=1, funcargs=[], d=None,
-                 shotgun=False, bu=0):
+                 shotgun=False, bu=0, evaldirs=True, history=None,
+                 history_frames=None, check_first=False, share_steps=True):
+        """Set up the permutation job
+
+        Each evaluation calls func(x, names, evald, job, *funcargs) and
+        returns the responses.  Evaluations are run in a pool of nprocs
+        worker processes, one pool per run.  The pool is forked after the
+        first evaluation, so its workers start with the simulator imported
+        and the material library loaded, and each runs many evaluations.
+
+        If evaldirs is True (the default), each evaluation is run in its own
+        eval_<n> directory and simulations write their output there.
+        Otherwise evald is the job's .eval directory and simulation output is
+        not dumped (func must not read it), results are sent back to this
+        process and written to the .edb file.
+
+        history is a list of output variables (eg, ['Time', 'S.XX']) to
+        return from the last simulation run by each evaluation, reduced to at
+        most history_frames rows.  The histories are kept in the histories
+        attribute, keyed by evaluation number, and saved to <job>.npz.
+
+        The first evaluation is always run in this process (so that material
+        libraries are built once).  If check_first is True and it fails, the
+        user is asked whether or not to continue.
+
+        If share_steps is True, the results of each simulation step are kept
+        in memory (see resultcache.StepCache) so that evaluations whose
+        simulations share the material parameters and a prefix of steps
+        (eg, a preload) run the prefix once and continue from its end
+        state.  The first evaluation is run before the workers are forked,
+        so its steps are shared with all of them.
+
+        """
 
         self.job = job
 
@@ -41,6 +73,14 @@ class Permutator(object):
         self.nprocs = nprocs
         self.correlations = correlations
         self.shotgun = shotgun
+        self.evaldirs = evaldirs
+        self.history = history
+        self.history_frames = history_frames
+        self.histories = {}
+        self.pool = None
+        self.check_first = check_first
+        self.share_steps = share_steps
+        self.step_cache = None
 
         d = os.path.realpath(d or os.getcwd())
         self.directory = d
@@ -137,36 +177,91 @@ Variables:
         self.timing["start"] = time.time()
         logger.info("{0}: Starting permutation jobs...".format(self.job))
         args = [(self.func, x, self.funcargs, i, self.rootd, self.job,
-                 self.names, self.descriptors, self.tabular)
+                 self.names, self.descriptors, self.evaldirs, self.history,
+                 self.history_frames)
                  for (i, x) in enumerate(self.data)]
         nprocs = max(self.nprocs, environ.nprocs)
         nprocs = min(min(mp.cpu_count(), nprocs), len(self.data)-1)
 
+        if self.share_steps:
+            self.step_cache = share_steps()
+
         # run the first job to see if it fails or not, rebuild material (if
         # requested), etc.
-        self.statuses = [run_job(args[0])]
+        self.statuses = []
+        self.write_result(run_job(args[0]))
+        cost = time.time() - self.timing["start"]
         if self.statuses[0] != 0:
-            resp = raw_input("First job failed, continue? Y/N [N]  ")
-            resp = "N" or resp.upper()
-            if resp[0] == "N":
-                self.finish()
-                return
+            if self.check_first:
+                resp = raw_input("First job failed, continue? Y/N [N]  ")
+                resp = resp.strip().upper() or "N"
+                if resp[0] == "N":
+                    self.finish()
+                    return
+            else:
+                logger.warn("first job failed, continuing")
 
         if nprocs == 1:
-            for arg in args[1:]:
-                self.statuses.append(run_job(arg))
+            results = (run_job(arg) for arg in args[1:])
         else:
-            pool = mp.Pool(processes=nprocs)
-            out = pool.map(run_job, args[1:])
-            pool.close()
-            pool.join()
-            self.statuses.extend(out)
+            chunksize = self.chunksize(len(args) - 1, nprocs, cost)
+            results = self.get_pool(nprocs).imap_unordered(run_job, args[1:],
+                                                           chunksize)
+
+        # write results as they complete
+        start, last = time.time(), 0.
+        for (i, result) in enumerate(results, start=1):
+            self.write_result(result)
+            now = time.time()
+            if now - last > 1. or i == len(args) - 1:
+                last = now
+                rate = i / max(now - start, 1.e-12)
+                eta = (len(args) - 1 - i) / rate
+                logger.info("\r{0}/{1} jobs complete ({2:.2f} jobs/s, ETA "
+                            "{3})".format(i+1, len(args), rate,
+                                          datetime.timedelta(seconds=int(eta))),
+                            extra={'continued':1})
         logger.info("\nPermutation jobs complete")
 
         self.finish()
 
         return
 
+    @staticmethod
+    def chunksize(njobs, nprocs, cost, target=.5):
+        """Number of jobs sent to a worker at a time
+
+        Jobs costing less than the target time (in seconds) are grouped so
+        that each chunk costs about the target, but never into so few chunks
+        that the workers cannot balance the load (about 4 chunks per worker).
+
+        """
+        chunksize = max(1, int(target / max(cost, 1.e-6)))
+        return max(1, min(chunksize, njobs // (4 * nprocs)))
+
+    def get_pool(self, nprocs):
+        """The worker pool, created on first use and shut down by finish"""
+        if self.pool is None or self.pool[0] != nprocs:
+            self.close()
+            self.pool = (nprocs, mp.Pool(processes=nprocs))
+        return self.pool[1]
+
+    def close(self):
+        """Shut down the worker pool"""
+        if self.pool is not None:
+            self.pool[1].close()
+            self.pool[1].join()
+            self.pool = None
+
+    def write_result(self, result):
+        """Write the result of an evaluation returned by run_job"""
+        (job_num, stat, evald, parameters, responses, history) = result
+        self.statuses.append(stat)
+        self.tabular.write_eval_info(job_num, stat, evald, parameters,
+                                     responses)
+        if history is not None:
+            self.histories[job_num] = history
+
     def finish(self):
 
         self.timing["end"] = time.time()
@@ -175,6 +270,15 @@ Variables:
 
         # write the summary
         self.tabular.close()
+        self.close()
+        if self.step_cache is not None:
+            unshare_steps()
+            logger.debug('Shared steps: ' + self.step_cache.summary())
+
+        if self.histories:
+            f = os.path.join(self.rootd, self.job + '.npz')
+            np.savez(f, **dict(('eval_{0}'.format(n), h)
+                               for (n, h) in self.histories.items()))
 
         if not [x for x in self.statuses if x == 0]:
             logger.info("All calculations failed")
@@ -273,28 +377,71 @@ def catd(d, i):
     N = max(len(str(ps.num_jobs)), 2)
     return os.path.join(d, "eval_{0:0{1}d}".format(i, N))
 
+def share_steps():
+    """Share the results of simulation steps among the simulations created
+    in this process (and processes forked from it) until unshare_steps
+
+    """
+    from .simulator import MaterialPointSimulator
+    from .resultcache import ResultCache, StepCache
+    backing = None
+    if environ.result_cache:
+        backing = ResultCache(environ.result_cache,
+                              maxsize=environ.result_cache_size)
+    MaterialPointSimulator.shared_steps = StepCache(backing=backing)
+    return MaterialPointSimulator.shared_steps
+
+def unshare_steps():
+    from .simulator import MaterialPointSimulator
+    MaterialPointSimulator.shared_steps = None
+
+def reduce_history(mps, variables, frames=None):
+    """Return the time history of variables from the simulation mps, reduced
+    to at most frames rows (the last row is always kept)
+
+    """
+    data = np.column_stack(mps.get(*variables, copy=False))
+    if frames is not None and data.shape[0] > frames:
+        rows = np.unique(np.linspace(0, data.shape[0]-1, frames).astype(int))
+        data = data[rows]
+    return data
+
 def run_job(args):
     """Run the single permutation job
 
+    Returns
+    -------
+    result : tuple
+        (job number, status, directory, parameters, responses, history)
+
     """
+    from .simulator import MaterialPointSimulator
     logger = logging.getLogger('matmodlab.mmd.permutator')
-    (func, x, funcargs, i, rootd, job, names, descriptors, tabular) = args
+    (func, x, funcargs, i, rootd, job, names, descriptors, evaldirs,
+     history, history_frames) = args
     #func = getattr(sys.modules[func[0]], func[1])
 
     job_num = i + 1
     ps.job_num = i + 1
-    evald = catd(rootd, ps.job_num)
-    os.makedirs(evald)
-    cwd = os.getcwd()
-    os.chdir(evald)
-    environ.simulation_dir = evald
     nresp = 0 if descriptors is None else len(descriptors)
-
-    # write the params.in for this run
     parameters = zip(names, x)
-    with open(os.path.join(evald, "params.in"), "w") as fobj:
-        for name, param in parameters:
-            fobj.write("{0} = {1: .18f}\n".format(name, param))
+    cwd = os.getcwd()
+    if evaldirs:
+        evald = catd(rootd, ps.job_num)
+        os.makedirs(evald)
+        os.chdir(evald)
+
+        # write the params.in for this run
+        with open(os.path.join(evald, "params.in"), "w") as fobj:
+            for name, param in parameters:
+                fobj.write("{0} = {1: .18f}\n".format(name, param))
+    else:
+        # results are returned in memory, do not dump simulation output
+        evald = rootd
+        no_dump, environ.no_dump = environ.no_dump, True
+    environ.simulation_dir = evald
+    if history:
+        MaterialPointSimulator.tracked = []
 
     s = ",".join("{0}={1:.2g}".format(n, p) for n, p in parameters)
     line = "Starting job {0}/{1} with {2}".format(ps.job_num, ps.num_jobs, s)
@@ -327,7 +474,17 @@ def run_job(args):
                          "of response descriptors".format(ps.job_num))
         else:
             responses = zip(descriptors, resp)
-    tabular.write_eval_info(ps.job_num, stat, evald, parameters, responses)
-    os.chdir(cwd)
 
-    return stat
+    data = None
+    if history:
+        if stat == 0 and MaterialPointSimulator.tracked:
+            data = reduce_history(MaterialPointSimulator.tracked[-1], history,
+                                  history_frames)
+        MaterialPointSimulator.tracked = None
+
+    if evaldirs:
+        os.chdir(cwd)
+    else:
+        environ.no_dump = no_dump
+
+    return (ps.job_num, stat, evald, parameters, responses, data)
@@ -0,0 +1,270 @@
+import os
+import types
+import inspect
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from os.path import join, isfile, isdir, splitext
+
+from ..product import PKG_D
+from ..utils.misc import rand_id
+from ..utils.fortran.buildcache import file_digest
+
+__all__ = ['ResultCache', 'StepCache', 'material_key', 'simulation_key', 'step_key',
+           'library_hash']
+
+# bump to invalidate all cached results when the driver's output changes
+CACHE_VERSION = 1
+
+# material attributes that change while a simulation runs
+VOLATILE = ('num_jac_evals', 'num_jac_evals_saved', 'iwarn_stiff', 'lib')
+
+def update(h, obj):
+    '''Update the hash h with the value of obj'''
+    if isinstance(obj, np.ndarray):
+        h.update('{0}{1}'.format(obj.dtype, obj.shape))
+        h.update(np.ascontiguousarray(obj).tostring())
+    elif isinstance(obj, dict):
+        h.update('{')
+        for key in sorted(obj):
+            update(h, key)
+            update(h, obj[key])
+        h.update('}')
+    elif isinstance(obj, (list, tuple)):
+        h.update('[')
+        for item in obj:
+            update(h, item)
+        h.update(']')
+    elif isinstance(obj, (types.ModuleType, types.FunctionType,
+                          types.MethodType, type)):
+        h.update(getattr(obj, '__name__', ''))
+    elif hasattr(obj, '__dict__'):
+        h.update(obj.__class__.__name__)
+        update(h, vars(obj))
+    else:
+        h.update(repr(obj))
+
+def material_key(material):
+    '''Hash of the material model, its parameters and initial state'''
+    h = hashlib.sha1()
+    cls = material.__class__
+    h.update('{0}.{1}'.format(cls.__module__, cls.__name__))
+    update(h, dict((k, v) for (k, v) in vars(material).items()
+                   if k not in VOLATILE))
+    return h.hexdigest()
+
+def simulation_key(material, *args):
+    '''Hash of the material and the initial state (args) of a simulation'''
+    h = hashlib.sha1(str(CACHE_VERSION))
+    h.update(material_key(material))
+    update(h, list(args))
+    return h.hexdigest()
+
+def step_key(previous, step):
+    '''Hash of the step program through step, previous is the key of the
+    program through the step before it'''
+    h = hashlib.sha1(previous)
+    update(h, [step.kind, step.number, step.increment, step.start,
+               [(f.number, f.time, f.increment) for f in step.frames],
+               np.asarray(step.components, dtype=np.float64),
+               np.asarray(step.descriptors, dtype=np.int64),
+               step.kappa, step.proportional, step.temperature,
+               np.asarray(step.elec_field, dtype=np.float64),
+               step.num_dumps, step.sqa_stiff, step.mat_stiff,
+               step.adaptive])
+    return h.hexdigest()
+
+def library_hash(material):
+    '''Hash of the files implementing the material: its python module and
+    built extension module, if any'''
+    h = hashlib.sha1()
+    try:
+        filename = inspect.getfile(material.__class__)
+    except TypeError:
+        filename = None
+    if filename is not None:
+        filename = splitext(filename)[0] + '.py'
+        if isfile(filename):
+            h.update(file_digest(filename))
+    libname = getattr(material, 'libname', None)
+    if libname:
+        so_lib = join(PKG_D, libname + '.so')
+        if isfile(so_lib):
+            h.update(file_digest(so_lib))
+    return h.hexdigest()
+
+class CacheStats(object):
+    hits = 0
+    misses = 0
+
+    def summary(self):
+        n = self.hits + self.misses
+        rate = 0. if not n else 100. * self.hits / n
+        return '{0} hits, {1} misses ({2:.1f}% hit rate)'.format(
+            self.hits, self.misses, rate)
+
+class ResultCache(CacheStats):
+    '''On disk cache of the results of simulation steps
+
+    An entry holds the frames written by a step and the state at the end of
+    the step, and is keyed on the material, its parameters, the initial state
+    and the step program up to and including the step (see step_key), so
+    that any simulation sharing a prefix of steps with a cached one reuses
+    the cached steps.  Each entry also records the hash of the material's
+    library, entries written for a different library are removed when read.
+
+    Entries are written to a private file and renamed in to place, so that
+    simulations run concurrently may share a cache.  When the entries exceed
+    maxsize bytes, the least recently used are removed.
+
+    Parameters
+    ----------
+    directory : str
+        Directory in which entries are stored
+    maxsize : int
+        Maximum size, in bytes, of the cache
+
+    '''
+    def __init__(self, directory, maxsize=2**28):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        if not isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not isdir(directory):
+                    raise
+
+    def filename(self, key):
+        return join(self.directory, key + '.npz')
+
+    def get(self, key, lib_hash, ncols):
+        '''Return the rows and state cached for key, or None'''
+        filename = self.filename(key)
+        try:
+            with open(filename, 'rb') as fh:
+                entry = np.load(fh)
+                lib, rows = str(entry['lib']), entry['rows']
+                state = dict((k[6:], entry[k]) for k in entry.files
+                             if k.startswith('state_'))
+        except (IOError, OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+        if lib != lib_hash or rows.ndim != 2 or rows.shape[1] != ncols:
+            # written for a different material library
+            self.remove(filename)
+            self.misses += 1
+            return None
+        try:
+            # mark as recently used
+            os.utime(filename, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return rows, state
+
+    def set(self, key, lib_hash, rows, state):
+        '''Cache the rows and state of key'''
+        filename = self.filename(key)
+        tmp = join(self.directory, '.{0}.{1}'.format(key, rand_id(6)))
+        arrays = dict(('state_' + k, v) for (k, v) in state.items())
+        try:
+            with open(tmp, 'wb') as fh:
+                np.savez(fh, lib=np.array(lib_hash), rows=rows, **arrays)
+            os.rename(tmp, filename)
+        except (IOError, OSError):
+            self.remove(tmp)
+            return
+        self.evict()
+
+    def evict(self):
+        '''Remove the least recently used entries in excess of maxsize'''
+        entries = []
+        for f in os.listdir(self.directory):
+            if not f.endswith('.npz'):
+                continue
+            try:
+                st = os.stat(join(self.directory, f))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, f))
+        size = sum(x[1] for x in entries)
+        for (mtime, nbytes, f) in sorted(entries):
+            if size <= self.maxsize:
+                break
+            self.remove(join(self.directory, f))
+            size -= nbytes
+
+    @staticmethod
+    def remove(filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+class StepCache(CacheStats):
+    '''In memory cache of the results of simulation steps
+
+    Holds the same entries as ResultCache in the memory of this process.
+    The simulations of a parameter study that share the material, its
+    parameters and a prefix of steps run the prefix once and start the rest
+    of their steps from its end state.  Worker processes forked after an
+    entry is set inherit it.  When the entries exceed maxsize bytes, the
+    least recently used are dropped.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum size, in bytes, of the cached arrays
+    backing : ResultCache
+        On disk cache in which entries not held in memory are looked up, and
+        to which new entries are also written
+
+    '''
+    def __init__(self, maxsize=2**26, backing=None):
+        self.maxsize = maxsize
+        self.backing = backing
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, lib_hash, ncols):
+        '''Return the rows and state cached for key, or None'''
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            lib, rows, state, nbytes = entry
+            if lib == lib_hash and rows.shape[1] == ncols:
+                # reinsert as most recently used
+                self.entries[key] = entry
+                self.hits += 1
+                return rows, state
+            self.size -= nbytes
+        if self.backing is not None:
+            entry = self.backing.get(key, lib_hash, ncols)
+            if entry is not None:
+                self.store(key, lib_hash, *entry)
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def set(self, key, lib_hash, rows, state):
+        '''Cache the rows and state of key'''
+        rows = np.array(rows)
+        state = dict((k, np.array(v)) for (k, v) in state.items())
+        self.store(key, lib_hash, rows, state)
+        if self.backing is not None:
+            self.backing.set(key, lib_hash, rows, state)
+
+    def store(self, key, lib_hash, rows, state):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old[-1]
+        nbytes = rows.nbytes + sum(v.nbytes for v in state.values())
+        self.entries[key] = (lib_hash, rows, state, nbytes)
+        self.size += nbytes
+        while self.size > self.maxsize and self.entries:
+            self.size -= self.entries.popitem(last=False)[1][-1]
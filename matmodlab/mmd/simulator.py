@@ -2,6 +2,7 @@ import os
 import sys
 import time
 import logging
+import json
 import inspect
 from math import sqrt
 import numpy as np
@@ -14,10 +15,13 @@ from ..constants import *
 from ..mml_siteenv import environ
 from ..utils import mmlabpack as mml
 from ..utils.errors import MatmodlabError
-from ..utils.fileio import loadfile, savefile
+from ..utils.fileio import loadfile, savefile, rec2arr, unique_step_index, \
+    RecordStream
 from ..utils.logio import setup_logger
+from ..utils.misc import rand_id
 from ..utils.plotting import create_figure
 from .material import MaterialModel, Material
+from .resultcache import ResultCache, simulation_key, step_key, library_hash
 
 EPS = np.finfo(np.float).eps
 
@@ -25,23 +29,57 @@ __all__ = ['MaterialPointSimulator', 'StrainStep', 'StressStep', 'MixedStep',
            'DefGradStep', 'DisplacementStep', 'piecewise_linear']
 
 class MaterialPointSimulator(object):
+    # simulators created while tracked is a list are appended to it, the
+    # permutator uses this to collect time histories of its evaluations
+    tracked = None
+
+    # simulators created while shared_steps is a StepCache (and not given a
+    # result cache) use it as their result cache, the permutator and
+    # optimizer use this to run the steps shared by their evaluations once
+    shared_steps = None
+
     def __init__(self, job, verbosity=None, d=None,
                  initial_temperature=DEFAULT_TEMP, termination_time=None,
-                 output_format=None, no_cutback=False):
-        """Initialize the MaterialPointSimulator object"""
+                 output_format=None, no_cutback=False, broyden=False,
+                 result_cache=None, checkpoint_interval=None):
+        """Initialize the MaterialPointSimulator object
+
+        If result_cache (a directory or ResultCache, environ.result_cache by
+        default) is given, the results of each step are read from the cache
+        if the same material, parameters and steps have been run before, and
+        written to it otherwise.
+
+        If checkpoint_interval (environ.checkpoint_interval by default) is
+        nonzero, a checkpoint is written to <job>.chk after every
+        checkpoint_interval steps (see checkpoint and restore).
+
+        """
         self.job = job
         self.material = None
         self.initialized = False
         self.termination_time = termination_time
         self.no_cutback = environ.no_cutback or no_cutback
+        self.broyden = environ.broyden or broyden
 
         self.output_format = output_format or environ.output_format
 
+        if result_cache is None:
+            result_cache = self.shared_steps
+        result_cache = result_cache or environ.result_cache or None
+        if isinstance(result_cache, basestring):
+            result_cache = ResultCache(result_cache,
+                                       maxsize=environ.result_cache_size)
+        self.result_cache = result_cache
+
+        if checkpoint_interval is None:
+            checkpoint_interval = environ.checkpoint_interval
+        self.checkpoint_interval = int(checkpoint_interval or 0)
+
         self.verbosity = verbosity
         self.initial_temperature = initial_temperature
 
         # setup IO
-        d = d or os.getcwd()
+        d = d or environ.eval_dir or os.getcwd()
         environ.simulation_dir = d
         self.directory = environ.simulation_dir
         self.filename = None
@@ -62,6 +100,8 @@ class MaterialPointSimulator(object):
         self.istress = Z6
 
         logger.info('Setting up simulator for job {0!r}'.format(job))
+        if MaterialPointSimulator.tracked is not None:
+            MaterialPointSimulator.tracked.append(self)
 
     def __getattr__(self, key):
         try:
@@ -76,7 +116,8 @@ class MaterialPointSimulator(object):
             step = AnalysisStep(s.kind, s.name, s.previous, s.increment,
                                 len(s.frames), s.components, s.descriptors,
                                 s.kappa, s.temperature, s.elec_field,
-                                s.num_dumps, s.start, s.sqa_stiff, s.mat_stiff)
+                                s.num_dumps, s.sqa_stiff, s.mat_stiff,
+                                start=s.start, adaptive=s.adaptive)
             step.number = n
             self.steps[s.name] = step
             try:
@@ -296,6 +337,20 @@ Material: {5}
                  E=Z6, F=I9, D=Z6, DS=Z6, S=S0,
                  SDV=sdv, T=step.temperature, EF=step.elec_field)
 
+        if self.output_format == NPY and not environ.no_dump:
+            # stream frames to the output file as steps complete
+            self.filename = os.path.join(self.directory, self.job + '.' + NPY)
+            self.records.open_stream(self.filename)
+
+        # steps are keyed on the key of the steps before them, starting from
+        # the material and initial state
+        self._simulation_key = simulation_key(self.material,
+            self.initial_temperature, S0, self.termination_time,
+            self.no_cutback, self.broyden)
+        if self.result_cache is not None:
+            self._cache_key = self._simulation_key
+            self._lib_hash = library_hash(self.material)
+
         self.initialized = True
 
     def run(self):
@@ -309,8 +364,12 @@ Material: {5}
     def finish(self):
         logger = logging.getLogger('matmodlab.mmd.simulator')
         logger.info('\n...calculations completed ({0:.4f}s)\n'.format(self._time))
-        if not environ.notebook:
+        if self.result_cache is not None:
+            logger.debug('Result cache: ' + self.result_cache.summary())
+        if not environ.notebook and not environ.no_dump:
             self.dump()
+        # the stream is open whenever output is dumped, also in notebooks
+        self.records.close_stream()
         self.ran = True
 
     def dump(self, format=None, ffmt='%.18e', abaqus_kwds=0):
@@ -321,9 +380,19 @@ Material: {5}
 
         output_format = format or self.output_format
         ext = '.' + output_format
-        self.filename = os.path.join(self.directory, self.job + ext)
+        filename = os.path.join(self.directory, self.job + ext)
+        if self.records.stream is not None and \
+           filename == self.records.stream.filename:
+            # the frames have already been written
+            self.records.close_stream()
+            return
+        self.filename = filename
         if output_format == REC:
-            self.records.data.dump(self.filename)
+            data = self.records.data.astype(self.records.file_dtype)
+            data.dump(self.filename)
+
+        elif output_format == NPY:
+            np.save(self.filename, self.records.data)
 
         elif output_format in (TXT, CSV):
             if output_format == CSV:
@@ -331,59 +400,67 @@ Material: {5}
             else:
                 sep, comments = ' ', '#'
             names = sep.join(self.records.keys(expand=1))
-            data = rec2arr(self.records.data)
+            data = self.records.array
             np.savetxt(self.filename, data, header=names, delimiter=sep,
                        comments=comments, fmt=ffmt)
 
         else:
             # let someone else deal with it
             names = self.records.keys(expand=1)
-            data = rec2arr(self.records.data)
+            data = self.records.array
             savefile(self.filename, names, data)
 
     def _get_var_time(self, var):
         if var == 'SDV':
-            # Retrieve all SDVs from the record
-            keys = [x for x in self.records.data.dtype.names
-                    if x.startswith('SDV_')]
-            a = rec2arr(self.records.data[keys])
+            # Retrieve all SDVs from the record (they are stored last)
+            keys = [x for x in self.records.keys() if x.startswith('SDV_')]
+            cols = slice(self.records.index(keys[0]),
+                         self.records.index(keys[-1]) + 1)
             names = [x.replace('SDV_', '').strip() for x in keys]
         else:
-            a = self.records.data[var]
-            if a.ndim == 1:
-                return a
-            names = COMPONENT_LABELS(a.shape[1])
+            cols = self.records.index(var)
+            names = self.records[var].keys
+        a = np.array(self.records.array[:, cols])
+        if a.ndim == 1:
+            return a
+        names = [x.split('.', 1)[-1] for x in names]
         return attrarr(a, names)
 
     def get(self, *variables, **kwargs):
+        '''Get variables from the records
+
+        Variables are (float64) copies of the records.  If copy=False they are
+        instead read only views of the records (except when at_step is given),
+        which avoids copying long simulations.
+
+        '''
         disp = kwargs.pop('disp', 0)
+        copy = kwargs.pop('copy', True)
         at_step = kwargs.get('at_step', None)
+        array = self.records.array
         if at_step:
-            at_step = unique_step_index(self.records.data['Step'])
+            at_step = unique_step_index(array[:, self.records.index('Step')])
+        view = np.array if copy else readonly
 
         if not variables:
             names = self.records.keys(expand=1)
-            data = rec2arr(self.records.data, rows=at_step)
+            data = view(array) if at_step is None else array[at_step]
             if disp:
                 return names, data
             return data
 
         # get the specific variables
-        names = [x.split('.', 1) if not x.startswith('SDV_') else [x]
-                 for x in variables]
         data = []
-        for item in names:
-            a = np.array(self.records.data[item[0]])
-            if len(item) == 2:
-                a = a[:, COMPONENT(item[1], a.shape[1])]
-            elif len(item) > 2:
+        for variable in variables:
+            if variable.count('.') > 1:
                 raise ValueError('expected at most one attribute lookup')
+            a = array[:, self.records.index(variable)]
             if at_step is not None:
                 a = a[at_step]
-            data.append(a)
+            data.append(view(a))
 
         if len(data) == 1 and data[0].ndim == 1:
-            data = data[0].flatten()
+            data = data[0]
 
         if disp < 0:
             return np.column_stack(data)
@@ -395,15 +472,15 @@ Material: {5}
 
     def plot(self, xvar, yvar, legend=None, label=None, scale=None, **kwargs):
 
-        xp, yp = self.get(xvar, yvar)
+        xp, yp = self.get(xvar, yvar, copy=False)
 
         if scale is not None:
             try:
                 xs, ys = scale
             except ValueError:
                 xs = ys = scale
-            xp *= xs
-            yp *= ys
+            xp = xp * xs
+            yp = yp * ys
 
         if environ.plotter == BOKEH:
             kwds = dict(kwargs)
@@ -446,6 +523,21 @@ Material: {5}
             raise MatmodlabError('number of cutbacks for step {0} exceeds '
                                  'the maximum allowable'.format(step.number))
 
+        key = None
+        if self.result_cache is not None:
+            key = step_key(self._cache_key, step)
+            ncols = self.records.dtype.itemsize // 8
+            entry = self.result_cache.get(key, self._lib_hash, ncols)
+            if entry is not None:
+                rows, state = entry
+                self.records.extend(rows)
+                self.records.advance()
+                self.state_db.advance(**state)
+                self._cache_key = key
+                logger.info('{0}: results read from cache'.format(step.name))
+                self.step_completed(step)
+                return
+
         try:
             while 1:
                 state = self._run_step(step)
@@ -478,15 +570,130 @@ Material: {5}
 
             # Save the state for next steps
             time, temp, F, strain, stress, efield, statev = state
+            if key is not None:
+                self.result_cache.set(key, self._lib_hash,
+                    self.records.pending, dict(F=F, time=time, temp=temp,
+                    stress=stress, strain=strain, efield=efield,
+                    statev=statev))
+                self._cache_key = key
             self.records.advance()
             self.state_db.advance(F=F, time=time, temp=temp, stress=stress,
                                   strain=strain, efield=efield, statev=statev)
+            self.step_completed(step)
 
         except StopSteps:
             self.finish()
 
         return
 
+    def step_completed(self, step):
+        '''Write the periodic checkpoint, if requested'''
+        if self.checkpoint_interval and \
+           step.number % self.checkpoint_interval == 0:
+            self.checkpoint()
+
+    def checkpoint(self, filename=None):
+        '''Write a snapshot of the simulation at the end of the last step
+
+        The snapshot holds the committed records, the end of step state, and
+        the definitions of the steps run so far, so that restore can continue
+        the simulation (or several, with different steps) from this point.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the snapshot, <job>.chk in the simulation directory by
+            default
+
+        Returns
+        -------
+        filename : str
+
+        '''
+        if not self.initialized:
+            raise MatmodlabError('no steps have been run')
+        if filename is None:
+            filename = os.path.join(self.directory, self.job + '.chk')
+        steps = [step_definition(s) for s in self.steps.values()[1:]]
+        state = dict(('state_' + k, v) for (k, v) in self.state_db.db.items())
+        d = os.path.dirname(os.path.abspath(filename))
+        tmp = os.path.join(d, '.{0}.{1}'.format(os.path.basename(filename),
+                                                rand_id(6)))
+        try:
+            with open(tmp, 'wb') as fh:
+                np.savez_compressed(fh, version=np.array(CHECKPOINT_VERSION),
+                    material=np.array(self.material.name),
+                    key=np.array(self._simulation_key),
+                    names=np.array(self.records.keys(expand=1)),
+                    rows=self.records.array, steps=np.array(json.dumps(steps)),
+                    **state)
+            os.rename(tmp, filename)
+        finally:
+            if os.path.isfile(tmp):
+                os.remove(tmp)
+        logging.getLogger('matmodlab.mmd.simulator').debug(
+            'checkpoint written to {0}'.format(filename))
+        return filename
+
+    def restore(self, filename):
+        '''Restore the simulation from a snapshot written by checkpoint
+
+        The material must be set and no steps run.  Steps created after the
+        restore continue from the end of the last step in the snapshot.  The
+        snapshot may have been written by a simulation of a material with
+        other parameters (eg, to vary parameters after a common preload), in
+        which case a warning is logged.
+
+        '''
+        logger = logging.getLogger('matmodlab.mmd.simulator')
+        if self.material is None:
+            raise MatmodlabError('The material must be set before '
+                                 'the simulation is restored')
+        if len(self.steps) > 1:
+            raise MatmodlabError('cannot restore a simulation in to one '
+                                 'that has run steps')
+        try:
+            with open(filename, 'rb') as fh:
+                snapshot = np.load(fh)
+                version = int(snapshot['version'])
+                material = str(snapshot['material'])
+                key = str(snapshot['key'])
+                names = [str(x) for x in snapshot['names']]
+                rows = snapshot['rows']
+                steps = json.loads(str(snapshot['steps']))
+                state = dict((k[6:], snapshot[k]) for k in snapshot.files
+                             if k.startswith('state_'))
+        except (IOError, OSError, KeyError, ValueError) as e:
+            raise MatmodlabError('failed to read checkpoint '
+                                 '{0}: {1}'.format(filename, e))
+        if version != CHECKPOINT_VERSION:
+            raise MatmodlabError('{0}: unsupported checkpoint '
+                                 'version {1}'.format(filename, version))
+        if material != self.material.name:
+            raise MatmodlabError('{0}: checkpoint written for material '
+                                 '{1}'.format(filename, material))
+
+        if not self.initialized:
+            self.initialize_simulation()
+        if names != self.records.keys(expand=1):
+            raise MatmodlabError('{0}: checkpoint records do not match '
+                                 'the simulation records'.format(filename))
+        if key != self._simulation_key:
+            logger.warn('{0}: checkpoint written for different material '
+                        'parameters or initial state'.format(filename))
+
+        for definition in steps:
+            step = step_from_definition(definition, self.steps.values()[-1])
+            self.steps[step.name] = step
+            if self.result_cache is not None:
+                self._cache_key = step_key(self._cache_key, step)
+
+        # the initial frame was written by initialize_simulation
+        self.records.extend(rows[1:])
+        self.records.advance()
+        self.state_db.advance(**state)
+        logger.info('restored {0} steps from {1}'.format(len(steps), filename))
+
     def _run_step(self, step):
         '''Process this step '''
 
@@ -500,6 +707,8 @@ Material: {5}
 
         step_start_time = tt()
         termination_time = self.termination_time
+        jac_evals = (self.material.num_jac_evals,
+                     self.material.num_jac_evals_saved)
 
         logger = logging.getLogger('matmodlab.mmd.simulator')
         warned = False
@@ -583,14 +792,35 @@ Material: {5}
             except:
                 dedt[v] -= lstsq(Jsub, work)[0]
 
+        # adaptive frame sizing: frames are sized as the step proceeds and
+        # step.frames is rebuilt from the frames actually taken
+        adaptive = AdaptiveFrames(step) \
+                   if step.adaptive and step.increment >= 1.e-14 else None
+        if adaptive is not None:
+            frames, step.frames = step.frames, []
+            span = (time[1] - time[0], temp[1] - temp[0])
+            CB.pnewdt_suggested = None
+
         # process this leg
-        for (iframe, frame) in enumerate(step.frames):
+        iframe, a2 = -1, 0.
+        while a2 < 1.:
+            iframe += 1
 
             logger.info('\r' + message.format(iframe+1), extra={'continued':1})
 
             # interpolate values to the target values for this step
-            a1 = float(num_frame - (iframe + 1)) / num_frame
-            a2 = float(iframe + 1) / num_frame
+            if adaptive is None:
+                frame = step.frames[iframe]
+                a1 = float(num_frame - (iframe + 1)) / num_frame
+                a2 = float(iframe + 1) / num_frame
+            else:
+                a0 = a2
+                a2 = adaptive.next_fraction(a0)
+                a1 = 1. - a2
+                dtime, dtemp = (a2 - a0) * span[0], (a2 - a0) * span[1]
+                saved = (stress[2].copy(), strain[2].copy(), efield[2].copy())
+                iterations = step.solver_stats.iterations
+                failures = step.solver_stats.failures
             efield[2] = a1 * efield[0] + a2 * efield[1]
             strain[2] = a1 * strain[0] + a2 * strain[1]
             pstress = a1 * stress[0] + a2 * stress[1]
@@ -600,7 +830,8 @@ Material: {5}
                 d = sig2d(self.material, time[2], dtime, temp[2], dtemp,
                           kappa, F[0], F[1], strain[2], dedt, stress[2],
                           statev[0], efield[2], v, pstress[v],
-                          proportional)
+                          proportional, broyden=self.broyden,
+                          stats=step.solver_stats)
 
             # compute the current deformation gradient and strain from
             # previous values and the deformation rate
@@ -619,6 +850,19 @@ Material: {5}
                 sqa_stiff=step.sqa_stiff, disp=1)
             dstress = (stress[2] - s) / dtime
 
+            if adaptive is not None:
+                pnewdt, CB.pnewdt_suggested = CB.pnewdt_suggested, None
+                stats = step.solver_stats
+                accepted = adaptive.update(a2 - a0, dtime, dstress,
+                    stress[2], stats.iterations - iterations,
+                    stats.failures > failures, pnewdt)
+                if not accepted:
+                    # reject the frame and retry with a smaller increment
+                    stress[2], strain[2], efield[2] = saved
+                    iframe, a2 = iframe - 1, a0
+                    continue
+                frame = step.Frame(time[0] + a0 * span[0], dtime)
+
             F[0] = F[1]
             time[2] = a1 * time[0] + a2 * time[1]
             temp[2] = a1 * temp[0] + a2 * temp[1]
@@ -660,6 +904,28 @@ Material: {5}
         logger.info('\r' + message.format(iframe+1) +
                     ' ({0:.4f}s)'.format(self._time))
 
+        if adaptive is not None:
+            logger.debug('{0}: {1} adaptive frames ({2} requested, {3} '
+                         'rejected)'.format(step.name, len(step.frames),
+                                            len(frames), adaptive.rejected))
+
+        if nv:
+            stats = step.solver_stats
+            logger.debug('{0}: {1} Newton iterations, {2} material calls '
+                         '({3} Jacobians, {4} Broyden updates)'.format(
+                             step.name, stats.iterations,
+                             stats.material_calls, stats.jacobians,
+                             stats.broyden_updates))
+
+        step.num_jac_evals = self.material.num_jac_evals - jac_evals[0]
+        step.num_jac_evals_saved = (self.material.num_jac_evals_saved -
+                                    jac_evals[1])
+        if step.num_jac_evals:
+            logger.debug('{0}: {1} material evaluations for numerical '
+                         'Jacobians ({2} saved by {3} scheme)'.format(
+                             step.name, step.num_jac_evals,
+                             step.num_jac_evals_saved, self.material.jacobian))
+
         return time[2], temp[2], F[1], strain[2], stress[2], efield[2], statev[1]
 
     def visualize_results(self, overlay=None):
@@ -672,12 +938,32 @@ Material: {5}
         self.visualize_results()
 
 
+class SolverStats(object):
+    '''Counters for the stress controlled solver, accumulated over the frames
+    of a step.  The Jacobian of the last converged Newton solve is carried
+    here so that Broyden iterations of the next frame can start from it.
+
+    '''
+    def __init__(self):
+        self.iterations = 0
+        self.material_calls = 0
+        self.jacobians = 0
+        self.broyden_updates = 0
+        self.failures = 0
+        self.jacobian = None
+
+
 def sig2d(material, t, dt, temp, dtemp, kappa, f0, f, stran, d, sig, statev,
-          efield, v, sigspec, proportional):
+          efield, v, sigspec, proportional, broyden=False, stats=None):
     '''Determine the symmetric part of the velocity gradient given stress
 
     Parameters
     ----------
+    broyden : bool
+        Use Broyden updates of the Jacobian in the Newton iterations
+    stats : SolverStats
+        Accumulates the iteration and material call counts.  If given, the
+        Jacobian is reused between calls when broyden is True.
 
     Returns
     -------
@@ -702,10 +988,12 @@ def sig2d(material, t, dt, temp, dtemp, kappa, f0, f, stran, d, sig, statev,
 
     '''
     dsave = d.copy()
+    stats = stats or SolverStats()
 
     if not proportional:
         d = newton(material, t, dt, temp, dtemp, kappa, f0, f, stran, d,
-                   sig, statev, efield, v, sigspec, proportional)
+                   sig, statev, efield, v, sigspec, proportional,
+                   broyden=broyden, stats=stats)
         if d is not None:
             return d
 
@@ -714,10 +1002,12 @@ def sig2d(material, t, dt, temp, dtemp, kappa, f0, f, stran, d, sig, statev,
         d = dsave.copy()
         d[v] = np.zeros(len(v))
         d = newton(material, t, dt, temp, dtemp, kappa, f0, f, stran, d,
-                   sig, statev, efield, v, sigspec, proportional)
+                   sig, statev, efield, v, sigspec, proportional,
+                   broyden=broyden, stats=stats)
         if d is not None:
             return d
 
+        stats.failures += 1
         CB.request_cutback(cutfac=-1)
 
     # --- Still didn't converge. Try downhill simplex method and accept
@@ -728,7 +1018,8 @@ def sig2d(material, t, dt, temp, dtemp, kappa, f0, f, stran, d, sig, statev,
 
 
 def newton(material, t, dt, temp, dtemp, kappa, f0, farg, stran, darg,
-           sigarg, statev_arg, efield, v, sigspec, proportional):
+           sigarg, statev_arg, efield, v, sigspec, proportional,
+           broyden=False, stats=None):
     '''Seek to determine the unknown components of the symmetric part of velocity
     gradient d[v] satisfying
 
@@ -754,6 +1045,10 @@ def newton(material, t, dt, temp, dtemp, kappa, f0, farg, stran, darg,
         stresses (or stress rates) are specified
     sigspec : ndarray
         Prescribed stress
+    broyden : bool
+        Use Broyden updates of the Jacobian
+    stats : SolverStats
+        Iteration and material call counters
 
     Returns
     -------
@@ -781,6 +1076,15 @@ def newton(material, t, dt, temp, dtemp, kappa, f0, farg, stran, darg,
     argument converged is a flag indicat- ing whether or not the procedure
     converged:
 
+    With broyden, the Jacobian of the previous solve (or, the first time, a
+    freshly computed one) is updated by the rank one secant correction
+
+                Js = Js + (dsigerr - Js.de) de^T / (de.de)
+
+    after each iteration, where de is the change in strain increment and
+    dsigerr the resulting change in stress error. A full Jacobian is
+    recomputed only if the error is not at least halved by an iteration.
+
     '''
     logger = logging.getLogger('matmodlab.mmd.simulator')
     depsmag = lambda a: sqrt(sum(a[:3] ** 2) + 2. * sum(a[3:] ** 2)) * dt
@@ -788,6 +1092,8 @@ def newton(material, t, dt, temp, dtemp, kappa, f0, farg, stran, darg,
     # Initialize
     tol1, tol2 = EPS, sqrt(EPS)
     maxit1, maxit2, depsmax = 20, 30, .2
+    stats = stats or SolverStats()
+    jac_evals = material.num_jac_evals
 
     sig = sigarg.copy()
     d = darg.copy()
@@ -801,17 +1107,37 @@ def newton(material, t, dt, temp, dtemp, kappa, f0, farg, stran, darg,
     if (depsmag(d) > depsmax):
         return None
 
+    def stress(d):
+        # update the material state, only the stress is needed
+        stats.material_calls += 1
+        fp, ep = mml.update_deformation(dt, 0., f, d)
+        return material.compute_updated_state(t, dt, temp, dtemp, kappa, f0,
+            fp, ep, d, efield, sigsave.copy(), statev_save.copy(), disp=3)
+
+    def jacobian(d):
+        stats.material_calls += 1
+        stats.jacobians += 1
+        return material.compute_updated_state(t, dt, temp, dtemp, kappa,
+            f0, f, stran, d, efield, sigsave.copy(), statev_save.copy(),
+            v=v, disp=2)
+
     # update the material state to get the first guess at the new stress
-    sig, statev, stif = material.compute_updated_state(t, dt, temp, dtemp, kappa,
-        f0, f, stran, d, efield, sig, statev)
+    stats.material_calls += 1
+    sig = material.compute_updated_state(t, dt, temp, dtemp, kappa,
+        f0, f, stran, d, efield, sig, statev, disp=3)
     sigerr = sig[v] - sigspec
+    relerr = None
+
+    Jsub, fresh = None, False
+    if broyden and stats.jacobian is not None and \
+       stats.jacobian.shape == (len(v), len(v)):
+        Jsub = stats.jacobian.copy()
 
     # --- Perform Newton iteration
     for i in range(maxit2):
-        sig = sigsave.copy()
-        statev = statev_save.copy()
-        Jsub = material.compute_updated_state(t, dt, temp, dtemp, kappa,
-            f0, f, stran, d, efield, sig, statev, v=v, disp=2)
+        stats.iterations += 1
+        if Jsub is None:
+            Jsub, fresh = jacobian(d), True
 
         if environ.sqa:
             try:
@@ -825,36 +1151,54 @@ def newton(material, t, dt, temp, dtemp, kappa, f0, farg, stran, darg,
                     logger.warn('negative eigen value[s] encountered in material '
                                 'Jacobian: {0} ({1:.2f})'.format(negevals, t))
         try:
-            d[v] -= np.linalg.solve(Jsub, sigerr) / dt
+            dv = np.linalg.solve(Jsub, sigerr) / dt
 
 
         except LinAlgError:
-            d[v] -= np.linalg.lstsq(Jsub, sigerr)[0] / dt
+            dv = np.linalg.lstsq(Jsub, sigerr)[0] / dt
             if environ.Wall:
                 logger.warn('using least squares approximation to '
                             'matrix inverse')
+        d[v] -= dv
 
         if (depsmag(d) > depsmax or  np.any(np.isnan(d)) or np.any(np.isinf(d))):
             # increment too large
+            stats.jacobian = None
             return None
 
         # with the updated rate of deformation, update stress and check
-        fp, ep = mml.update_deformation(dt, 0., f, d)
-        sig, statev, stif = material.compute_updated_state(t, dt, temp, dtemp,
-            kappa, f0, fp, ep, d, efield, sig, statev)
+        sig = stress(d)
+        sigerr_old, relerr_old = sigerr, relerr
         sigerr = sig[v] - sigspec
         dnom = max(np.amax(np.abs(sigspec)), 1.)
         relerr = np.amax(np.abs(sigerr) / dnom)
 
-        if i <= maxit1 and relerr < tol1:
+        if (i <= maxit1 and relerr < tol1) or (i > maxit1 and relerr < tol2):
+            stats.material_calls += material.num_jac_evals - jac_evals
+            stats.jacobian = Jsub if broyden else None
             return d
 
-        elif i > maxit1 and relerr < tol2:
-            return d
+        if not broyden:
+            Jsub = None
+
+        elif (relerr_old is not None and relerr > .5 * relerr_old and
+              not fresh) or not np.any(dv):
+            # convergence stalled, recompute the full Jacobian
+            Jsub = None
+
+        else:
+            # rank one secant update of the Jacobian
+            de = -dv * dt
+            Jsub = Jsub + np.outer(sigerr - sigerr_old - np.dot(Jsub, de),
+                                   de) / np.dot(de, de)
+            stats.broyden_updates += 1
+            fresh = False
 
         continue
 
     # didn't converge, restore restore data and exit
+    stats.material_calls += material.num_jac_evals - jac_evals
+    stats.jacobian = None
     return None
 
 
@@ -945,6 +1289,38 @@ def _func(x, material, t, dt, temp, dtemp, kappa, f0, farg, stran, darg,
 class StopSteps(Exception):
     pass
 
+# bump when the layout of checkpoints changes
+CHECKPOINT_VERSION = 1
+
+def step_definition(step):
+    '''Definition of the analysis step, as a json serializable dict'''
+    return dict(kind=step.kind, name=step.name, number=step.number,
+                increment=step.increment, start=step.start,
+                frames=[(f.time, f.increment) for f in step.frames],
+                components=np.asarray(step.components).tolist(),
+                descriptors=np.asarray(step.descriptors).tolist(),
+                kappa=step.kappa, proportional=step.proportional,
+                temperature=step.temperature,
+                elec_field=np.asarray(step.elec_field).tolist(),
+                num_dumps=step.num_dumps, sqa_stiff=step.sqa_stiff,
+                mat_stiff=step.mat_stiff, adaptive=step.adaptive)
+
+def step_from_definition(d, previous):
+    '''Recreate the analysis step defined by d (see step_definition)'''
+    step = AnalysisStep(str(d['kind']), str(d['name']), previous,
+                        d['increment'], 1, np.array(d['components']),
+                        np.array(d['descriptors'], dtype=np.int),
+                        d['kappa'], d['temperature'],
+                        np.array(d['elec_field']), d['num_dumps'],
+                        d['sqa_stiff'], d['mat_stiff'], start=d['start'],
+                        adaptive=d['adaptive'])
+    step.frames = []
+    for (time, increment) in d['frames']:
+        step.Frame(time, increment)
+    step.number = d['number']
+    step.proportional = d['proportional']
+    return step
+
 class StepRepository(OrderedDict):
     def Step(self, name):
         self[name] = Step(name)
@@ -953,6 +1329,9 @@ class StepRepository(OrderedDict):
 class Step(object):
     def __init__(self, name):
         self.num_cutbacks = 0
+        self.solver_stats = SolverStats()
+        self.num_jac_evals = 0
+        self.num_jac_evals_saved = 0
         self.name = name
         self.frames = []
 
@@ -985,6 +1364,103 @@ class Step(object):
         inc = (end - start) / float(nframe)
         self.frames = [Frame(i+1, start+i*inc, inc) for i in range(nframe)]
 
+class AdaptiveFrames(object):
+    '''Error controlled frame sizing for adaptive steps
+
+    Frame sizes are fractions of the step, starting from the size of the
+    frames requested for the step.  The change of the stress rate between
+    consecutive frames gives an estimate of the local error of the stress
+    increment,
+
+              err = 1/2 |dsig_n - dsig_n-1| dt_n / max(|sig_n|, tiny)
+
+    A frame is rejected and retried with a smaller increment if err > tol,
+    if the stress solve failed, or if the material suggested a time increment
+    ratio pnewdt < 1.  Otherwise the next increment is grown by
+    .9 (tol / err) ** .5 (at most doubled, limited by pnewdt, and not grown
+    after slowly converging Newton iterations).
+
+    '''
+    default_tol = 1.e-3
+    growth, shrink, safety = 2., .25, .9
+    slow_newton = 10
+    max_frames = 5000
+
+    def __init__(self, step):
+        self.tol = self.default_tol if step.adaptive is True \
+                   else float(step.adaptive)
+        self.fraction = 1. / len(step.frames)
+        self.min_fraction = 1. / self.max_frames
+        self.floor = EPS * max(step.mat_stiff, 1.)
+        self.rate = None
+        self.rejected = 0
+
+    def next_fraction(self, a):
+        '''The end of the next frame, as a fraction of the step, when the
+        current frame ends at a'''
+        if a + 1.1 * self.fraction >= 1.:
+            # do not leave a sliver at the end of the step
+            return 1.
+        return a + self.fraction
+
+    def update(self, fraction, dtime, rate, stress, iterations, failed,
+               pnewdt=None):
+        '''Accept or reject a frame and size the next one
+
+        Parameters
+        ----------
+        fraction : float
+            Size of the frame, as a fraction of the step
+        dtime : float
+            Time increment of the frame
+        rate : ndarray
+            Stress rate over the frame
+        stress : ndarray
+            Stress at the end of the frame
+        iterations : int
+            Newton iterations taken by the stress solve
+        failed : bool
+            Whether or not the Newton stress solve failed
+        pnewdt : float
+            Ratio of suggested to current time increment, from the material
+
+        Returns
+        -------
+        accepted : bool
+
+        '''
+        if pnewdt is not None and abs(pnewdt) < 1.e-12:
+            pnewdt = None
+
+        err = 0.
+        if self.rate is not None:
+            scale = max(np.sqrt(np.sum(stress ** 2)), self.floor)
+            err = .5 * np.sqrt(np.sum((rate - self.rate) ** 2)) * dtime / scale
+
+        if fraction > self.min_fraction and (
+                err > self.tol or failed or (pnewdt is not None and
+                                              pnewdt < 1.)):
+            factor = self.shrink
+            if pnewdt is not None and pnewdt < 1.:
+                factor = max(factor, pnewdt)
+            elif err > self.tol:
+                factor = max(factor, self.safety * np.sqrt(self.tol / err))
+            self.fraction = max(fraction * factor, self.min_fraction)
+            self.rejected += 1
+            return False
+
+        if self.rate is None or iterations > self.slow_newton:
+            factor = 1.
+        elif err > 0.:
+            factor = min(self.growth, self.safety * np.sqrt(self.tol / err))
+        else:
+            factor = self.growth
+        if pnewdt is not None:
+            factor = min(factor, pnewdt)
+        self.fraction = min(max(fraction * factor, self.min_fraction), 1.)
+        self.rate = np.array(rate)
+        return True
+
 class Frame:
     def __init__(self, number, time, increment):
         self.number = number
@@ -996,7 +1472,7 @@ class AnalysisStep(Step):
 
     def __init__(self, kind, name, previous, increment, frames, components,
                  descriptors, kappa, temperature, elec_field, num_dumps,
-                 sqa_stiff, mat_stiff, start=None):
+                 sqa_stiff, mat_stiff, start=None, adaptive=False):
 
         super(AnalysisStep, self).__init__(name)
         logger = logging.getLogger('matmodlab.mmd.simulator')
@@ -1005,8 +1481,10 @@ class AnalysisStep(Step):
                              components=components, descriptors=descriptors,
                              kappa=kappa, temperature=temperature,
                              elec_field=elec_field, num_dumps=num_dumps,
-                             sqa_stiff=sqa_stiff, mat_stiff=mat_stiff)
+                             sqa_stiff=sqa_stiff, mat_stiff=mat_stiff,
+                             adaptive=adaptive)
         self.kind = kind
+        self.adaptive = adaptive
         self.previous = previous
         self.components = components
         assert len(descriptors) == TENSOR_3D
@@ -1091,7 +1569,8 @@ def InitialStep(name, kappa=0., temperature=None):
 
 def StrainStep(name, previous, components=None, frames=None, scale=1.,
                  increment=1., kappa=None, temperature=None, elec_field=None,
-                 num_dumps=None, sqa_stiff=False, mat_stiff=1):
+                 num_dumps=None, sqa_stiff=False, mat_stiff=1,
+               adaptive=False):
 
     if components is None:
         components = np.zeros(TENSOR_3D)
@@ -1129,11 +1608,12 @@ def StrainStep(name, previous, components=None, frames=None, scale=1.,
 
     return AnalysisStep('StrainStep', name, previous, increment, frames,
                         components, descriptors, kappa, temperature, elec_field,
-                        num_dumps, sqa_stiff, mat_stiff)
+                        num_dumps, sqa_stiff, mat_stiff, adaptive=adaptive)
 
 def StrainRateStep(name, previous, components=None, frames=None, scale=1.,
                    increment=1., kappa=None, temperature=None, elec_field=None,
-                   num_dumps=None, sqa_stiff=False, mat_stiff=1):
+                   num_dumps=None, sqa_stiff=False, mat_stiff=1,
+                   adaptive=False):
 
     if components is None:
         components = np.zeros(TENSOR_3D)
@@ -1165,11 +1645,12 @@ def StrainRateStep(name, previous, components=None, frames=None, scale=1.,
 
     return AnalysisStep('StrainRateStep', name, previous, increment, frames,
                         components, descriptors, kappa, temperature, elec_field,
-                        num_dumps, sqa_stiff, mat_stiff)
+                        num_dumps, sqa_stiff, mat_stiff, adaptive=adaptive)
 
 def StressStep(name, previous, components=None, frames=None, scale=1.,
                increment=1., temperature=None, elec_field=None,
-               num_dumps=None, sqa_stiff=False, mat_stiff=1):
+               num_dumps=None, sqa_stiff=False, mat_stiff=1,
+               adaptive=False):
 
     kappa = 0.
 
@@ -1191,11 +1672,12 @@ def StressStep(name, previous, components=None, frames=None, scale=1.,
 
     return AnalysisStep('StressStep', name, previous, increment, frames,
                         components, descriptors, kappa, temperature, elec_field,
-                        num_dumps, sqa_stiff, mat_stiff)
+                        num_dumps, sqa_stiff, mat_stiff, adaptive=adaptive)
 
 def StressRateStep(name, previous, components=None, frames=None, scale=1.,
                    increment=1., temperature=None, elec_field=None,
-                   num_dumps=None, sqa_stiff=False, mat_stiff=1):
+                   num_dumps=None, sqa_stiff=False, mat_stiff=1,
+                   adaptive=False):
 
     kappa = 0.
     if components is None:
@@ -1217,11 +1699,12 @@ def StressRateStep(name, previous, components=None, frames=None, scale=1.,
 
     return AnalysisStep('StressRateStep', name, previous, increment, frames,
                         components, descriptors, kappa, temperature, elec_field,
-                        num_dumps, sqa_stiff, mat_stiff)
+                        num_dumps, sqa_stiff, mat_stiff, adaptive=adaptive)
 
 def DisplacementStep(name, previous, components=None, frames=None, scale=1.,
                      increment=1., kappa=None, temperature=None, elec_field=None,
-                     num_dumps=None, sqa_stiff=False, mat_stiff=1):
+                     num_dumps=None, sqa_stiff=False, mat_stiff=1,
+                     adaptive=False):
 
     if components is None:
         components = np.zeros(3)
@@ -1242,11 +1725,12 @@ def DisplacementStep(name, previous, components=None, frames=None, scale=1.,
 
     return AnalysisStep('DisplacementStep', name, previous, increment, frames,
                         components, descriptors, kappa, temperature, elec_field,
-                        num_dumps, sqa_stiff, mat_stiff)
+                        num_dumps, sqa_stiff, mat_stiff, adaptive=adaptive)
 
 def DefGradStep(name, previous, components=None, frames=None, scale=1.,
                 increment=1., kappa=None, temperature=None, elec_field=None,
-                num_dumps=None, sqa_stiff=False, mat_stiff=1):
+                num_dumps=None, sqa_stiff=False, mat_stiff=1,
+                adaptive=False):
 
     if kappa is None:
         kappa = previous.kappa
@@ -1280,11 +1764,12 @@ def DefGradStep(name, previous, components=None, frames=None, scale=1.,
 
     return AnalysisStep('DefGradStep', name, previous, increment, frames,
                         components, descriptors, kappa, temperature, elec_field,
-                        num_dumps, sqa_stiff, mat_stiff)
+                        num_dumps, sqa_stiff, mat_stiff, adaptive=adaptive)
 
 def MixedStep(name, previous, components=None, descriptors=None,
               frames=None, scale=1., increment=1., temperature=None,
-              elec_field=None, num_dumps=None, sqa_stiff=False, mat_stiff=1):
+              elec_field=None, num_dumps=None, sqa_stiff=False, mat_stiff=1,
+              adaptive=False):
 
     if components is None:
         components = np.zeros(TENSOR_3D)
@@ -1338,10 +1823,11 @@ def MixedStep(name, previous, components=None, descriptors=None,
 
     return AnalysisStep('MixedStep', name, previous, increment, frames,
                         components, descriptors, kappa, temperature, elec_field,
-                        num_dumps, sqa_stiff, mat_stiff)
+                        num_dumps, sqa_stiff, mat_stiff, adaptive=adaptive)
 
 def DataSteps(filename, previous, tc=0, descriptors=None, time_format='total',
-              scale=1., frames=None, steps=None, time_scale=1., **kw):
+              scale=1., frames=None, steps=None, time_scale=1.,
+              adaptive=False, **kw):
 
     d = {'D': 1, 'E': 2, 'R': 3, 'S': 4, 'P': 6, 'T': 7, 'X': 9}
     bad = []
@@ -1437,7 +1923,7 @@ def DataSteps(filename, previous, tc=0, descriptors=None, time_format='total',
         data_steps.append(MixedStep(name, previous, components=components,
             frames=frames, scale=scale, increment=increment,
             descriptors=descriptors, temperature=temp,
-            elec_field=elec_field))
+            elec_field=elec_field, adaptive=adaptive))
         previous = data_steps[-1]
         start = previous.frames[-1].value
         step += 1
@@ -1522,20 +2008,11 @@ def flatten(a):
         except TypeError: flat.append(x)
     return flat
 
-def unique_step_index(a):
-    d = {}
-    for (i, x) in enumerate(a):
-        d.setdefault(int(x), []).append(i)
-    return [x[-1] for x in sorted(d.values())]
-
-def rec2arr(recarr, rows=None):
-    arr = []
-    for row in recarr:
-        arr.append(flatten(row.tolist()))
-    arr = np.array(arr)
-    if rows is not None:
-        arr = arr[rows]
-    return arr
+def readonly(a):
+    '''Read only view of a'''
+    a = a.view()
+    a.flags.writeable = False
+    return a
 
 class attrarr(np.ndarray):
     """Subclass an ndarray to return attributes stored as the array columns"""
@@ -1552,16 +2029,21 @@ class attrarr(np.ndarray):
         self.names = getattr(obj, "names", None)
 
 class Record:
-    def __init__(self, name, rtype, dtype='f4', keys=None):
+    def __init__(self, name, rtype, dtype='f4', keys=None, points=None):
         self.name = name
         self.rtype = rtype
         self.dtype = dtype
+        self.points = points
         keys = keys or []
         self.shape = {SCALAR: 1,
                       SDV: (len(keys),),
                       VECTOR: (3,),
                       TENSOR_3D_FULL: (9,),
                       TENSOR_3D: (6,)}[self.rtype]
+        if points is not None:
+            # one value per material point
+            shape = () if self.shape == 1 else self.shape
+            self.shape = (points,) + shape
 
         if rtype == SCALAR:
             self.keys = [self.name]
@@ -1572,16 +2054,75 @@ class Record:
             self.keys = ['%s.%s' % (self.name, x) for x in components]
 
 class Records(OrderedDict):
+    '''Frame data for all registered records
+
+    Frames are stored in a preallocated 2D float64 array, one column per
+    component of each record, whose capacity is doubled whenever it fills,
+    so that caching a frame is an (amortized) constant time write into the
+    next free row.  The record array ``data`` is a view of the same memory
+    and ``index`` maps names (S, S.XX, SDV_EQPS, ...) to the columns of
+    ``array``.  Rows are split in to the
+    committed rows, exposed through ``data``, and the rows cached for the
+    step currently being run.  Committing (``advance``) and rolling back
+    (``clear_cache``) the cached rows only moves the row counters.
+
+    If a stream is opened, committed rows are instead appended to the
+    stream's file and dropped from memory, and ``data`` is a memory mapped
+    view of the file.
+
+    '''
     _i = 0
+    initial_capacity = 256
+    stream = None
+
     @property
     def num_rec(self):
         return len(super(Records, self).keys())
 
+    @property
+    def data(self):
+        '''View of the committed rows'''
+        if self.stream is not None:
+            return self.stream.read()
+        return self._data[:self._n]
+
+    @property
+    def array(self):
+        '''2D float64 view of the committed rows'''
+        if self.stream is not None:
+            data = self.stream.read()
+            return data.view(np.float64).reshape(data.shape[0], -1)
+        return self._flat[:self._n]
+
+    def index(self, name):
+        '''Column (or slice of columns) of array holding name'''
+        try:
+            return self._index[name]
+        except KeyError:
+            pass
+        if name.startswith('SDV_') or '.' not in name:
+            key, component = name, None
+        else:
+            key, component = name.split('.', 1)
+        if key not in self.columns:
+            raise KeyError(name)
+        cols = self.columns[key]
+        if component is not None:
+            cols = cols.start + COMPONENT(component, cols.stop - cols.start)
+        elif not self.dtype[key].shape:
+            cols = cols.start
+        self._index[name] = cols
+        return cols
+
+    @property
+    def capacity(self):
+        return self._data.shape[0]
+
     def add(self, name, rtype, **kw):
         if rtype == SDV:
-            keys = kw['keys']
+            keys = kw.pop('keys')
             for key in keys:
-                self.add('SDV_%s'%key, SCALAR)
+                self.add('SDV_%s'%key, SCALAR, **kw)
         else:
             fo = Record(name, rtype, **kw)
             self[name] = fo
@@ -1594,41 +2135,100 @@ class Records(OrderedDict):
             return super(Records, self).keys()
         return [key for f in self.values() for key in f.keys]
 
-    @staticmethod
-    def totuple(a):
-        try:
-            return tuple(a)
-        except TypeError:
-            return a
-
-    def init(self, **kw):
-        dtype = [(r.name, r.dtype, r.shape) for r in self.values()]
-        self.data = np.empty((1,), dtype=dtype)
+    def write(self, i, **kw):
+        '''Write the value of each record in to row i'''
         sdv = kw.pop('SDV', None)
-        row = [self.totuple(kw[key]) for key in self.keys(expand=-1)]
+        for key in self.keys(expand=-1):
+            self._data[key][i] = kw[key]
         if sdv is not None:
-            row.extend(sdv)
-        self.data[0] = tuple(row)
-        self._cache = None
+            sdv = np.asarray(sdv)
+            for (j, key) in enumerate(self._sdv_keys):
+                self._data[key][i] = sdv[..., j]
+
+    def init(self, **kw):
+        # all records are stored as float64 so that a row of the record array
+        # is also a row of the flat 2D array
+        self.dtype = np.dtype([(r.name, np.float64, r.shape)
+                               for r in self.values()])
+        # dtype of the records as declared, used for output files
+        self.file_dtype = np.dtype([(r.name, r.dtype, r.shape)
+                                    for r in self.values()])
+        self.columns = OrderedDict()
+        for name in self.dtype.names:
+            start = self.dtype.fields[name][1] // 8
+            size = int(np.prod(self.dtype[name].shape))
+            self.columns[name] = slice(start, start + size)
+        self._index = {}
+        self._flat = None
+        self.allocate(self.initial_capacity)
+        self._sdv_keys = [x for x in self.keys() if x.startswith('SDV_')]
+        self.write(0, **kw)
+        # number of committed rows and number of cached rows
+        self._n, self._m = 1, 0
+
+    def reserve(self, n):
+        '''Make sure there is room for at least n more rows'''
+        required = self._n + self._m + n
+        if required <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < required:
+            capacity *= 2
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        '''Allocate storage for capacity rows, keeping the rows in use'''
+        flat = np.empty((capacity, self.dtype.itemsize // 8))
+        if self._flat is not None:
+            flat[:self._n+self._m] = self._flat[:self._n+self._m]
+        self._flat = flat
+        self._data = flat.view(self.dtype).reshape(capacity)
 
     def cache(self, **kw):
-        data = np.empty((1,), dtype=self.data.dtype)
-        sdv = kw.pop('SDV', None)
-        row = [self.totuple(kw[key]) for key in self.keys(expand=-1)]
-        if sdv is not None:
-            row.extend(sdv)
-        data[0] = tuple(row)
-        if self._cache is None:
-            self._cache = data
-        else:
-            self._cache = np.append(self._cache, data)
+        '''Write a frame in to the next free row and return its index'''
+        self.reserve(1)
+        i = self._n + self._m
+        self.write(i, **kw)
+        self._m += 1
+        return i
+
+    @property
+    def pending(self):
+        '''View of the cached rows'''
+        return self._flat[self._n:self._n+self._m]
+
+    def extend(self, rows):
+        '''Cache the frames in the rows of the 2D array rows'''
+        self.reserve(len(rows))
+        i = self._n + self._m
+        self._flat[i:i+len(rows)] = rows
+        self._m += len(rows)
 
     def advance(self):
-        self.data = np.append(self.data, self._cache, axis=0)
-        self.clear_cache()
+        '''Commit the cached rows'''
+        self._n += self._m
+        self._m = 0
+        if self.stream is not None:
+            self.flush()
+
+    def open_stream(self, filename):
+        '''Stream the committed rows to filename'''
+        self.stream = RecordStream(filename, self._data.dtype)
+        self.flush()
+
+    def flush(self):
+        '''Append the committed rows to the stream and drop them'''
+        self.stream.append(self._data[:self._n])
+        self._flat[:self._m] = self._flat[self._n:self._n+self._m]
+        self._n = 0
+
+    def close_stream(self):
+        if self.stream is not None:
+            self.stream.close()
 
     def clear_cache(self):
-        self._cache = None
+        '''Roll back the cached rows'''
+        self._m = 0
 
 class StateDB:
     def __init__(self, **kwds):
@@ -1644,6 +2244,7 @@ class StateDB:
 class CutbackManager:
     def __init__(self):
         self.db = {}
+        self.pnewdt_suggested = None
 
     def __nonzero__(self):
         return bool(self.db)
@@ -1656,7 +2257,9 @@ class CutbackManager:
 
     def request_cutback(self, **kwargs):
         #self.db.update(kwargs)
-        pass
+        if kwargs.get('pnewdt') is not None:
+            # kept for adaptive steps, which size their frames from it
+            self.pnewdt_suggested = kwargs['pnewdt']
 
     def clear(self):
         self.db = {}
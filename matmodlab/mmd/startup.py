@@ -7,12 +7,13 @@ import shutil
 import warnings
 import tempfile
 from argparse import ArgumentParser
-from subprocess import Popen, STDOUT, check_output, CalledProcessError
+from subprocess import Popen, STDOUT, check_output, CalledProcessError, call
 from os.path import dirname, isfile, join, realpath, split
 
 from ..constants import *
 from ..materials.product import *
 from ..product import ROOT_D, BLD_D, PLATFORM, TEST_D, PKG_D, EXMPL_D, PYEXE, TPL_D
+from ..product import UTL_D
 from ..mml_siteenv import environ
 from ..utils.misc import load_file, which
 
@@ -28,9 +29,9 @@ errors = []
 try: import numpy
 except ImportError: errors.append('numpy not found')
 
-# --- scipy
-try: import scipy
-except ImportError: errors.append('scipy not found')
+# --- scipy (imported on first use)
+from ..utils.lazy import importable
+if not importable('scipy'): errors.append('scipy not found')
 
 # check prerequisites
 if errors:
@@ -41,7 +42,7 @@ commands = ('build', 'clean', 'fetch', 'helper', 'run',
             'test', 'ipynb', 'notebook', 'view')
 
 usage = '''\
-usage: mml [-h|help] <command> [<args>]
+usage: mml [-h|help] [--import-profile [<module>...]] <command> [<args>]
 
 The mml commands are:
            Launch the (empty) matmodlab gui
@@ -55,6 +56,10 @@ The mml commands are:
   view     Launch the tsviewer viewer
 
 See 'mml help <command>' to read about a specific subcommand.
+
+mml --import-profile reports the time taken to import matmodlab (or the
+given modules) in a fresh interpreter and exits with a nonzero status if
+plotting, pandas, sympy, traits or scipy.optimize were loaded.
 '''
 
 def envins(E, x, i=0):
@@ -76,6 +81,9 @@ def main(argv=None):
         if x in ('-h', '--help'):
             sys.exit(usage)
 
+        if x == '--import-profile':
+            sys.exit(import_profile(argv))
+
         # check for command specific help
         if x == 'help':
             if not argv:
@@ -344,6 +352,13 @@ positional arguments:
             shutil.rmtree(tempd)
             tempd = None
 
+def import_profile(argv):
+    """Profile the import of matmodlab in a fresh interpreter, the
+    current one has already imported it"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = envins('PYTHONPATH', dirname(ROOT_D))
+    return call([PYEXE, join(UTL_D, 'lazy.py')] + argv, env=env)
+
 def launch_viewer(argv):
     from ..tpl.tsviewer import __main__ as tsviewer
     tsviewer.main()
@@ -21,6 +21,12 @@ class Environment(object):
     num_stiff = False
     no_cutback = False
 
+    # --- Numerical Jacobian scheme (CENTERED, FORWARD, BATCHED, COMPLEX_STEP)
+    jacobian = CENTERED
+
+    # --- Broyden updates of the Jacobian in stress controlled steps
+    broyden = False
+
     # --- Performance
     nprocs = 1
 
@@ -45,6 +51,9 @@ class Environment(object):
         'source_files': [join(MAT_D, 'src/uhyper_poly.f90')]}
 
     std_materials = [MAT_D]
+
+    # File in which the material registry index is persisted (optional)
+    material_index = ''
     interactive_std_materials = {}
     interactive_usr_materials = {}
 
@@ -54,6 +63,10 @@ class Environment(object):
 
     simulation_dir = None
 
+    # Default simulation directory for simulations run by an evaluation of an
+    # optimization job (evaluations do not change the working directory)
+    eval_dir = ''
+
     plotter = MATPLOTLIB
     output_format = REC
 
@@ -61,6 +74,17 @@ class Environment(object):
     gui_mode = False
     do_not_fork = False
 
+    # Do not dump simulation output (set for in memory evaluations)
+    no_dump = False
+
+    # Directory of the (optional) on disk cache of simulation results and
+    # its maximum size in bytes
+    result_cache = ''
+    result_cache_size = 2 ** 28
+
+    # Write a checkpoint of each simulation every checkpoint_interval steps
+    checkpoint_interval = 0
+
     parent_process = 0
 
     # Fortran compiling
@@ -0,0 +1,106 @@
+from testconf import *
+from matmodlab.mmd.material import MaterialModel
+
+class NonSymmetricElastic(MaterialModel):
+    '''Linear elastic material with a non-symmetric stiffness (the XX stress
+    depends on the YY strain, but not the other way), without an analytic
+    Jacobian'''
+    name = 'nonsym_elastic'
+
+    @classmethod
+    def param_names(cls, n):
+        return ['K', 'G', 'A']
+
+    @staticmethod
+    def stiffness(K, G, A):
+        C = np.zeros((6, 6))
+        C[:3, :3] = K - 2. * G / 3.
+        C[range(3), range(3)] += 2. * G
+        C[range(3, 6), range(3, 6)] = G
+        C[0, 1] += A
+        return C
+
+    def update_state(self, time, dtime, temp, dtemp, energy, rho, F0, F,
+        stran, d, elec_field, stress, statev, **kwargs):
+        C = self.stiffness(*self.params)
+        return stress + np.dot(C, d * dtime), statev, None
+
+    def update_state_batch(self, time, dtime, temp, dtemp, energy, rho, F0, F,
+        stran, d, elec_field, stress, statev, params, **kwargs):
+        C = np.array([self.stiffness(*row) for row in params])
+        return stress + np.einsum('nij,nj->ni', C, d * dtime), statev, None
+
+def run_single_and_batch(model, parameters, job):
+    def steps(mps):
+        mps.StrainStep(components=(.01, 0, 0), frames=20)
+        mps.MixedStep(components=(.02, 0, 0), descriptors='ESS', frames=20)
+        mps.StressStep(components=(0, 0, 0), frames=20)
+
+    batch = BatchMaterialPointSimulator(job, verbosity=0, d=this_directory)
+    batch.Material(model, parameters)
+    steps(batch)
+    batch.run()
+
+    single = []
+    for (i, row) in enumerate(parameters):
+        mps = MaterialPointSimulator(job, verbosity=0, d=this_directory)
+        mps.Material(model, row)
+        steps(mps)
+        single.append(mps)
+    return batch, single
+
+@pytest.mark.fast
+@pytest.mark.batch
+class TestBatchSimulator(StandardMatmodlabTest):
+
+    @pytest.mark.parametrize('model,parameters', [
+        ('pyelastic', [[1e9, .5e9], [2e9, 1e9], [3e9, 1e9]]),
+        ('vonmises', [[1e9, .5e9, 2e6, 1e8, 0], [2e9, 1e9, 3e6, 0, .5],
+                      [3e9, 1e9, 1e12, 0, 0]]),
+        ('pyplastic', [[1e9, .5e9, 2e6, 0], [2e9, 1e9, 3e6, .1],
+                       [3e9, 1e9, 1e12, 0]])])
+    def test_batch_vs_single(self, model, parameters):
+        '''Test that a batch of points matches points run one at a time'''
+        job = 'batch_{0}'.format(model)
+        batch, single = run_single_and_batch(model, parameters, job)
+        variables = ['S.XX', 'S.YY', 'E.XX', 'E.YY'] + \
+                    ['SDV_' + key for key in batch.material.sdv_keys]
+        for variable in variables:
+            a = batch.get(variable)
+            assert a.shape == (61, len(parameters))
+            for (i, mps) in enumerate(single):
+                b = mps.get(variable)
+                assert allclose(a[:, i], b, atol=1e-6 * amax(abs(b)))
+                assert allclose(batch.get(variable, point=i), b,
+                                atol=1e-6 * amax(abs(b)))
+        names, data = batch.get(point=1, disp=1)
+        assert names == single[1].records.keys(expand=1)
+        assert allclose(data, single[1].get(), atol=1e-6 * amax(abs(data)))
+        self.completed_jobs.append(job)
+
+    def test_batch_jacobian(self):
+        '''Test that batched and scalar numerical Jacobians agree'''
+        load_material(std_material=NonSymmetricElastic)
+        try:
+            parameters = [[1e9, .5e9, .2e9], [2e9, 1e9, -.3e9]]
+            batch = BatchMaterialPointSimulator('batch_jacobian', verbosity=0,
+                                                d=this_directory)
+            batch.Material('nonsym_elastic', parameters)
+            batch.StrainStep(components=(.01, 0, 0), frames=1)
+            assert batch.batched
+            n, v = len(parameters), [0, 1, 2]
+            Z = np.zeros((n, 6))
+            d = np.tile([.01, -.002, .003, 0., 0., 0.], (n, 1))
+            F = np.tile(I9, (n, 1))
+            J = batch.compute_updated_state(0., 1., 298., 0., 0., F, F, Z,
+                                            d, np.zeros(3), Z,
+                                            np.zeros((n, 0)), jac=True, v=v)[2]
+            for (i, material) in enumerate(batch.materials):
+                Js = material.numerical_jacobian(0., 1., 298., 0., 0., I9,
+                    I9, Z[i], d[i], np.zeros(3), Z[i], np.zeros(0), v,
+                    method=FORWARD)
+                assert not allclose(Js, Js.T)
+                assert allclose(J[i], Js, rtol=1e-5, atol=1e-6 * amax(abs(Js)))
+            self.completed_jobs.append('batch_jacobian')
+        finally:
+            environ.interactive_std_materials.pop('nonsym_elastic', None)
@@ -0,0 +1,40 @@
+from testconf import *
+
+@pytest.mark.fast
+@pytest.mark.buildcache
+class TestBuildCache(object):
+
+    def test_build_cache(self, tmpdir):
+        '''Test that cached libraries are staged without being rebuilt'''
+        from matmodlab.utils.fortran import buildcache as bc
+        d = str(tmpdir)
+        source = join(d, 'umat_bc.f90')
+        signature = join(d, 'umat_bc.pyf')
+        with open(source, 'w') as fh:
+            fh.write('subroutine umat()\nend subroutine umat\n')
+        with open(signature, 'w') as fh:
+            fh.write('python module umat_bc\nend python module umat_bc\n')
+        files = [source, signature, bc.IO_F90]
+        key = bc.build_key('buildcache_t', files,
+                           signature=bc.rename_signature(signature, 'umat_bc',
+                                                         'buildcache_t'))
+        assert key != bc.build_key('buildcache_t', files)
+        cached = join(bc.CACHE_D, key, 'buildcache_t.so')
+        so_lib = join(LIB_D, 'buildcache_t.so')
+        os.makedirs(os.path.dirname(cached))
+        try:
+            with open(cached, 'w') as fh:
+                fh.write('not really a library')
+            # a cache hit never invokes the builder
+            x = bc.build_material_library('buildcache_t', files,
+                                          signature_name='umat_bc')
+            assert x == so_lib and os.path.samefile(x, cached)
+            assert not os.path.isfile(join(LIB_D, 'buildcache_t.pyf'))
+
+            # changing the source changes the key
+            with open(source, 'a') as fh:
+                fh.write('! modified\n')
+            assert bc.build_key('buildcache_t', files) != key
+        finally:
+            shutil.rmtree(os.path.dirname(cached))
+            remove(so_lib)
@@ -0,0 +1,44 @@
+from testconf import *
+from matmodlab.utils.errors import MatmodlabError
+
+@pytest.mark.fast
+@pytest.mark.checkpoint
+class TestCheckpoint(object):
+
+    @staticmethod
+    def simulator(job, d, **kwargs):
+        mps = MaterialPointSimulator(job, d=d, **kwargs)
+        mps.Material('pyplastic', {'K': 10., 'G': 3.75, 'A1': .1})
+        return mps
+
+    def test_checkpoint_restore(self, tmpdir):
+        '''Test continuing a simulation from a checkpoint'''
+        no_dump, environ.no_dump = environ.no_dump, True
+        d = str(tmpdir)
+        filename = join(d, 'checkpoint.chk')
+        try:
+            a = self.simulator('checkpoint', d, checkpoint_interval=2)
+            a.StrainStep(components=(.1, 0, 0, 0, 0, 0), frames=10)
+            a.MixedStep(components=(.1, 0, 0, 0, 0, 0), descriptors='ESSSSS',
+                        frames=10)
+            assert os.path.isfile(filename)
+
+            b = self.simulator('checkpoint-b', d)
+            b.restore(filename)
+            assert b.steps.keys() == a.steps.keys()
+            assert allclose(a.records.array, b.records.array)
+            for key in a.state_db.db:
+                assert allclose(a.state_db.get(key), b.state_db.get(key))
+
+            # both continue with the same step
+            for mps in (a, b):
+                mps.StrainStep(components=(0, 0, 0, 0, 0, 0), frames=10)
+            assert allclose(a.records.array, b.records.array)
+
+            # the material must match
+            c = MaterialPointSimulator('checkpoint-c', d=d)
+            c.Material('pyelastic', {'K': 10., 'G': 3.75})
+            with pytest.raises((MatmodlabError, SystemExit)):
+                c.restore(filename)
+        finally:
+            environ.no_dump = no_dump
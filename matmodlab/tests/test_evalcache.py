@@ -0,0 +1,35 @@
+from testconf import *
+
+@pytest.mark.fast
+@pytest.mark.evalcache
+class TestEvalCache(object):
+
+    def test_evalcache_lru_and_persistence(self, tmpdir):
+        '''Test the bounded evaluation cache and its persistence'''
+        from matmodlab.utils.evalcache import EvalCache
+        filename = join(str(tmpdir), 'evalcache.cache')
+        cache = EvalCache(maxsize=2, filename=filename, names=['K', 'G'])
+        cache.set([1., 2.], 3.)
+        cache.set([2., 3.], 5.)
+        assert cache.get([1. + 1e-15, 2.]) == 3.
+        cache.set([3., 4.], 7.)
+        assert cache.get([2., 3.]) is None
+        assert (cache.hits, cache.misses) == (1, 1)
+        cache = EvalCache(maxsize=2, filename=filename, names=['K', 'G'])
+        assert len(cache) == 2 and cache.get([3., 4.]) == 7.
+        cache = EvalCache(maxsize=2, filename=filename, names=['E', 'Nu'])
+        assert len(cache) == 0
+
+    def test_evalcache_compact(self, tmpdir):
+        '''Test that the evaluation cache file does not grow without bound'''
+        from matmodlab.utils.evalcache import EvalCache
+        filename = join(str(tmpdir), 'evalcache.cache')
+        cache = EvalCache(maxsize=3, filename=filename, names=['K'])
+        for i in range(20):
+            cache.set([float(i)], i + .5)
+            assert len(open(filename).readlines()) <= 1 + 2 * 3
+        cache = EvalCache(maxsize=3, filename=filename, names=['K'])
+        assert len(cache) == 3
+        assert [cache.get([float(i)]) for i in (17, 18, 19)] == \
+            [17.5, 18.5, 19.5]
+        assert cache.get([16.]) is None
@@ -0,0 +1,43 @@
+from testconf import *
+
+@pytest.mark.fast
+@pytest.mark.evaldb
+class TestEvalDB(object):
+
+    def test_evaldb(self, tmpdir):
+        '''Test writing, reading, and exporting the evaluation database'''
+        from matmodlab.utils import mmltab
+        d = str(tmpdir)
+        filename = join(d, 'evaldb_test.edb')
+        writer = mmltab.MMLTabularWriter(filename, 'evaldb_test',
+                                         buffer_size=3)
+        for n in (2, 1, 4, 3):
+            responses = None if n == 4 else [('R', float(n) ** 2)]
+            writer.write_eval_info(n, 0, d, [('K', float(n)), ('G', 1.)],
+                                   responses)
+        # a second (eg, pool worker) writer appends to the same file
+        other = mmltab.MMLTabularWriter(filename, 'evaldb_test', append=True)
+        other.write_eval_info(5, 1, d, [('K', 5.), ('G', 1.)], [('R', np.nan)])
+        other.close()
+        with pytest.raises(ValueError):
+            writer.write_eval_info(6, 0, d, [('A', 1.)])
+        writer.close()
+        assert mmltab.is_evaldb(filename)
+
+        head, data, nresp = mmltab.read_mml_evaldb_nd(filename)
+        assert head == ['K', 'G', 'R'] and nresp == 1
+        assert allclose(data, [[1, 1, 1], [2, 1, 4], [3, 1, 9]])
+
+        job, evaluations = mmltab.read_evaluations(filename)
+        assert job == 'evaldb_test'
+        assert [e[0] for e in evaluations] == [1, 2, 3, 4, 5]
+        assert evaluations[3][3] is None
+
+        # the xml export is read as before
+        xml = mmltab.export_xml(filename)
+        assert not mmltab.is_evaldb(xml)
+        xjob, xevaluations = mmltab.read_evaluations(xml)
+        assert xjob == job and xevaluations[:4] == evaluations[:4]
+        assert np.isnan(xevaluations[4][3][0][1])
+        xhead, xdata, xnresp = mmltab.read_mml_evaldb_nd(xml)
+        assert xhead == head and allclose(xdata, data)
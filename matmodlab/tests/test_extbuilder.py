@@ -0,0 +1,38 @@
+from testconf import *
+
+@pytest.mark.slow
+@pytest.mark.buildcache
+@pytest.mark.skipif(not environ.fc, reason='fortran compiler not found')
+class TestParallelBuild(object):
+
+    def test_parallel_build(self, tmpdir):
+        '''Test building extension modules simultaneously'''
+        from matmodlab.utils.fortran.extbuilder import FortranExtBuilder
+        d = str(tmpdir)
+        names = ['pbuild_a', 'pbuild_b']
+        fb = FortranExtBuilder('pbuild', build_dir=d, verbosity=0)
+        for name in names:
+            source = join(d, name + '.f90')
+            with open(source, 'w') as fh:
+                fh.write('subroutine {0}(a, b)\nreal(8), intent(in) :: '
+                         'a\nreal(8), intent(out) :: b\nb = 2 * a\n'
+                         'end subroutine {0}\n'.format(name))
+            fb.add_extension(name, [source])
+        fb.build_extension_modules(nprocs=2)
+        assert fb.exts_failed == []
+        assert sorted(fb.exts_built) == names
+        for name in names:
+            assert isfile(join(d, name + '.so'))
+        assert isfile(join(d, 'build.log'))
+
+    def test_build_nprocs_option(self, monkeypatch):
+        '''Test the number of simultaneous builds given to mml build'''
+        import multiprocessing as mp
+        from matmodlab.mmd import builder
+        calls = []
+        monkeypatch.setattr(builder, 'build',
+                            lambda *args, **kwargs: calls.append(kwargs))
+        builder.main(['-u'])
+        builder.main(['-u', '-j', '3'])
+        builder.main(['-u', '-j'])
+        assert [x['nprocs'] for x in calls] == [1, 3, mp.cpu_count()]
@@ -155,6 +155,34 @@ class TestJ2Plasticity(StandardMatmodlabTest):
         assert status == 0
         self.completed_jobs.append(mps.job)
 
+    @pytest.mark.fast
+    @pytest.mark.jacobian
+    def test_j2_jacobian_schemes(self):
+        '''Test that the numerical Jacobian schemes give the same response'''
+        NU, E, K, G, LAM, Y = copper_params()
+        parameters = {'K': K, 'G': G, 'Y0': Y, 'H': G / 10., 'BETA': .5}
+        responses = {}
+        for scheme in (CENTERED, FORWARD, BATCHED, COMPLEX_STEP):
+            job = 'j2_plast_jac_{0}'.format(scheme.split()[0].lower())
+            mps = MaterialPointSimulator(job, verbosity=0, d=this_directory)
+            mps.Material('vonmises', parameters, jacobian=scheme)
+            mps.MixedStep(components=(.01, 0, 0), descriptors='ESS',
+                          frames=25)
+            mps.MixedStep(components=(0, 0, 0), descriptors='SSS',
+                          frames=25)
+            step = mps.steps.values()[-1]
+            assert step.num_jac_evals > 0
+            if scheme == CENTERED:
+                assert step.num_jac_evals_saved == 0
+            else:
+                assert step.num_jac_evals_saved > 0
+            responses[scheme] = mps.get('S.XX', 'S.YY', 'E.XX', 'E.YY')
+            self.completed_jobs.append(job)
+        base = responses[CENTERED]
+        for scheme in responses:
+            assert allclose(responses[scheme], base,
+                            atol=1e-6 * amax(abs(base)))
+
 def gen_rand_params():
     # poisson_ratio and young's modulus
     nu = random.uniform(-1.0 + 1.0e-5, 0.5 - 1.0e-5)
@@ -0,0 +1,30 @@
+from testconf import *
+
+@pytest.mark.fast
+@pytest.mark.lazy_import
+class TestLazyImport(object):
+
+    def test_lazy_module(self):
+        '''Test deferred import of optional modules'''
+        from matmodlab.utils.lazy import LazyModule, lazy_import, importable
+        assert lazy_import('os') is os
+        assert importable('colorsys')
+        assert not importable('no_such_module_for_matmodlab')
+        mod = LazyModule('no_such_module_for_matmodlab')
+        assert not mod
+        with pytest.raises(ImportError):
+            mod.attribute
+        mod = LazyModule('colorsys')
+        assert mod and mod.rgb_to_hsv(1., 0., 0.) == (0., 1., 1.)
+
+    def test_import_matmodlab(self):
+        '''Test that heavy optional modules are not loaded at import'''
+        from subprocess import check_output
+        from matmodlab.product import PYEXE
+        from matmodlab.utils.lazy import HEAVY_MODULES
+        code = ('import sys, matmodlab; print(" ".join(m for m in {0!r} '
+                'if m in sys.modules))'.format(HEAVY_MODULES))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = dirname(dirname(this_directory))
+        loaded = check_output([PYEXE, '-c', code], env=env).split()
+        assert not loaded
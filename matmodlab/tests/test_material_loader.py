@@ -0,0 +1,45 @@
+from testconf import *
+
+@pytest.mark.fast
+@pytest.mark.loader
+class TestMaterialLoader(object):
+
+    @staticmethod
+    def write_material(d, name, mtime):
+        filename = join(d, 'mat_loader_test.py')
+        with open(filename, 'w') as fh:
+            fh.write('from matmodlab.mmd.material import MaterialModel\n'
+                     'class LoaderTest(MaterialModel):\n'
+                     '    name = {0!r}\n'.format(name))
+        os.utime(filename, (mtime, mtime))
+
+    def test_material_registry(self, tmpdir):
+        '''Test caching, invalidation, and persistence of the registry'''
+        from matmodlab.mmd.loader import MaterialLoader
+        d = str(tmpdir)
+        index = join(d, 'index.json')
+        self.write_material(d, 'loader_test_1', 1e9)
+        environ.std_materials.append(d)
+        try:
+            loader = MaterialLoader.load_materials()
+            assert 'loader_test_1' in loader.std_libs
+            assert MaterialLoader.load_materials() is loader
+
+            # modified files are rescanned
+            self.write_material(d, 'loader_test_2', 2e9)
+            loader = MaterialLoader.load_materials()
+            assert 'loader_test_1' not in loader.std_libs
+            assert loader.std_libs['loader_test_2'].mat_class.name == \
+                'loader_test_2'
+
+            # a fresh registry is built from the index without imports
+            environ.material_index = index
+            MaterialLoader.load_materials()
+            MaterialLoader.registry, MaterialLoader.files = None, {}
+            assert os.path.isfile(index)
+            info = MaterialLoader.load_materials().std_libs['loader_test_2']
+            assert info._mat_class is None
+            assert info.mat_class.name == 'loader_test_2'
+        finally:
+            environ.std_materials.remove(d)
+            environ.material_index = ''
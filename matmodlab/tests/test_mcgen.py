@@ -28,3 +28,64 @@ def test():
     mc.fit()
     assert np.allclose(mc.wlf_opt, c, rtol=1.e-3, atol=1.e-3), s1
     assert np.allclose(mc.mc_fit[:, 1], p[:, 1], rtol=1.e-2, atol=1.e-2), s2
+
+@pytest.mark.mcgen
+@pytest.mark.skipif(pandas is None, reason='pandas not imported')
+def test_prony_refinement():
+    """Prony series refined with optprony fits the data at least as well"""
+    f = os.path.join(this_directory, 'mcgen.csv')
+    error = []
+    for optprony in (False, True):
+        mc = MasterCurve.Import(f, ref_temp=75., apply_log=True, fitter=PRONY,
+                                optwlf=False, optprony=optprony, positive=True)
+        mc.fit()
+        x = np.asarray(mc.dfm['Log[X/aT]'])
+        y = mc.cf.eval(mc.mc_fit, x)
+        # evaluation of arrays agrees with evaluation of points
+        assert np.allclose(y, [mc.cf.eval(mc.mc_fit, xi) for xi in x])
+        assert np.all(mc.mc_fit[:-1, 1] >= 0.)
+        error.append(np.sqrt(np.mean((y - np.asarray(mc.dfm['Y'])) ** 2)))
+    assert error[1] <= error[0]
+
+@pytest.mark.mcgen
+@pytest.mark.skipif(pandas is None, reason='pandas not imported')
+def test_prony_positive():
+    """Prony coefficients are bounded below by 0 only if positive=True"""
+    f = os.path.join(this_directory, 'mcgen.csv')
+    fit, error = [], []
+    for positive in (False, True):
+        mc = MasterCurve.Import(f, ref_temp=75., apply_log=True, fitter=PRONY,
+                                optwlf=False, positive=positive)
+        mc.fit()
+        x = np.asarray(mc.dfm['Log[X/aT]'])
+        y = np.asarray(mc.dfm['Y'])
+        fit.append(mc.mc_fit)
+        error.append(np.sqrt(np.mean((mc.cf.eval(mc.mc_fit, x) - y) ** 2)))
+
+    # the unconstrained fit is the least squares solution
+    tau = fit[0][:-1, 0]
+    d = np.ones((len(x), len(tau) + 1))
+    d[:, :-1] = np.exp(-(10. ** x)[:, np.newaxis] / tau)
+    c = np.linalg.lstsq(d, y)[0]
+    assert np.allclose(fit[0][:, 1], c, rtol=1.e-4, atol=1.e-4)
+
+    assert np.all(fit[1][:-1, 1] >= 0.)
+    assert error[0] <= error[1] * (1. + 1.e-8)
+
+@pytest.mark.mcgen
+@pytest.mark.skipif(pandas is None, reason='pandas not imported')
+def test_wlf_shift():
+    """Data shifted by the compiled master curve problem"""
+    from matmodlab.fitting.mcgen import _MasterCurveProblem
+    f = os.path.join(this_directory, 'mcgen.csv')
+    mc = MasterCurve.Import(f, ref_temp=75., apply_log=True, fitter=PRONY,
+                            optwlf=False)
+    wlf = [3.292, 181.82]
+    problem = _MasterCurveProblem(mc.df, 75.)
+    x = problem.shift(wlf)
+    for (temp, df) in mc.df.groupby('Temp'):
+        log_at = -wlf[0] * (temp - 75.) / (wlf[1] + temp - 75.)
+        i = np.asarray(mc.df['Temp'] == temp)
+        assert np.allclose(x[i], np.asarray(df['Log[X]']) - log_at)
+    dfm = mc.shift_data(mc.df.copy(), 75., wlf)
+    assert np.allclose(dfm['Log[X/aT]'], x)
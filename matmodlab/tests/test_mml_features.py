@@ -62,6 +62,33 @@ class TestStepFactories(StandardMatmodlabTest):
         assert status == 0
         self.completed_jobs.append(mps.job)
 
+    @pytest.mark.parametrize('model,parameters', [
+        ('pyelastic', [1e9, .5e9]),
+        ('vonmises', [1e9, .5e9, 2e6, 1e8, .3])])
+    def test_adaptive_steps(self, model, parameters):
+        '''Test adaptive frame sizing against fixed frames'''
+        responses = []
+        for adaptive in (False, True):
+            job = 'adaptive_steps_{0}_{1:d}'.format(model, adaptive)
+            mps = MaterialPointSimulator(job, verbosity=0, d=this_directory)
+            mps.Material(model, parameters)
+            mps.StrainStep(components=(.01, 0, 0), frames=100,
+                           adaptive=adaptive)
+            mps.MixedStep(components=(.02, 0, 0), descriptors='ESS',
+                          frames=100, adaptive=adaptive)
+            mps.StressStep(components=(0, 0, 0), frames=100,
+                           adaptive=adaptive)
+            responses.append(np.column_stack(mps.get('Time', 'S.XX',
+                                                     'E.YY')))
+            self.completed_jobs.append(job)
+        a, b = responses
+        assert len(b) < len(a) / 5
+        assert np.all(np.diff(b[:, 0]) > 0.)
+        assert allclose(b[-1, 0], a[-1, 0])
+        for col in (1, 2):
+            assert allclose(np.interp(b[:, 0], a[:, 0], a[:, col]), b[:, col],
+                            atol=1e-5 * amax(abs(a[:, col])))
+
 @pytest.mark.slow
 @pytest.mark.permutate
 @pytest.mark.skipif(el is None, reason='elastic model not imported')
@@ -112,6 +139,77 @@ class TestPermutation(StandardMatmodlabTest):
             raise Exception('permutate_combination failed to run')
         self.completed_jobs.append('permutate_combination')
 
+    @staticmethod
+    def func_in_memory(x, xnames, d, job, *args):
+        mps = MaterialPointSimulator(job, verbosity=0, d=d)
+        mps.Material('pyelastic', dict(zip(xnames, x)))
+        mps.StrainStep(components=(.01, 0, 0), frames=10)
+        mps.StrainStep(components=(0, 0, 0), frames=10)
+        return np.amax(mps.get('S.XX'))
+
+    @pytest.mark.parametrize('nprocs', [1, 2])
+    def test_permutate_in_memory(self, nprocs):
+        '''Test the Permutator without evaluation directories'''
+        from matmodlab.utils.mmltab import read_mml_evaldb_nd
+        job = 'permutate_in_memory_{0}'.format(nprocs)
+        K = PermutateVariable('K', 125e9, b=14, N=3, method=WEIBULL)
+        G = PermutateVariable('G', 45e9, b=10, N=3, method=PERCENTAGE)
+        permutator = Permutator(job, self.func_in_memory, [K, G],
+                                method=COMBINATION, descriptors=['MAX_S'],
+                                d=this_directory, verbosity=0, nprocs=nprocs,
+                                evaldirs=False, history=['Time', 'S.XX'],
+                                history_frames=5)
+        permutator.run()
+        assert not [d for d in os.listdir(permutator.rootd)
+                    if d.startswith('eval_')]
+        assert sorted(permutator.histories) == range(1, 10)
+        for i in range(1, 10):
+            history = permutator.histories[i]
+            assert history.shape == (5, 2)
+            assert allclose(history[-1, 0], 2.)
+        head, data, nresp = read_mml_evaldb_nd(permutator.output)
+        assert head == ['K', 'G', 'MAX_S'] and nresp == 1
+        assert data.shape == (9, 3)
+        assert sorted(permutator.statuses) == [0] * 9
+        assert allclose(data[:, 2], [amax(permutator.histories[i][:, 1])
+                                     for i in range(1, 10)], rtol=1e-6)
+        self.completed_jobs.append(job)
+
+    @staticmethod
+    def func_preload(x, xnames, d, job, *args):
+        mps = MaterialPointSimulator(job, verbosity=0, d=d)
+        mps.Material('pyplastic', {'K': 10., 'G': 3.75, 'A1': .1})
+        mps.StrainStep(components=(.05, 0, 0), frames=20)
+        mps.StrainStep(components=(x[0], 0, 0), frames=10)
+        return mps.get('S.XX')[-1]
+
+    def test_permutate_shared_steps(self):
+        '''Test running the steps shared by permutations once'''
+        from matmodlab.utils.mmltab import read_mml_evaldb_nd
+        data = []
+        # all jobs are run in this process, so that the cache counts are
+        # those of every job
+        nprocs, environ.nprocs = environ.nprocs, 1
+        try:
+            for share_steps in (True, False):
+                job = 'permutate_shared_steps'
+                E = PermutateVariable('EXX', [0., .02, .04, .06], method=LIST)
+                permutator = Permutator(job, self.func_preload, [E],
+                                        descriptors=['SXX'], d=this_directory,
+                                        verbosity=0, nprocs=1, evaldirs=False,
+                                        share_steps=share_steps)
+                permutator.run()
+                assert MaterialPointSimulator.shared_steps is None
+                data.append(read_mml_evaldb_nd(permutator.output)[1])
+                if share_steps:
+                    # the preload is run by the first job only
+                    assert permutator.step_cache.hits == 3
+                    assert permutator.step_cache.misses == 5
+        finally:
+            environ.nprocs = nprocs
+        assert allclose(data[0], data[1])
+        self.completed_jobs.append(job)
+
 @pytest.mark.slow
 @pytest.mark.optimize
 @pytest.mark.skipif(el is None, reason='elastic model not imported')
@@ -131,13 +229,13 @@ class TestOptimization(StandardMatmodlabTest):
         return error
 
     @staticmethod
-    def run_method(method):
+    def run_method(method, **kwargs):
         K = OptimizeVariable("K", 148e9, bounds=(125e9, 150e9))
         G = OptimizeVariable("G", 56e9, bounds=(45e9, 57e9))
         xinit = [K, G]
         optimizer = Optimizer(method, TestOptimization.func, xinit, method=method,
                               d=this_directory, descriptors=["SIG_V_TIME"],
-                              maxiter=25, tolerance=1.e-4, verbosity=0)
+                              maxiter=25, tolerance=1.e-4, verbosity=0, **kwargs)
         optimizer.run()
         return optimizer.xopt
 
@@ -168,6 +266,24 @@ class TestOptimization(StandardMatmodlabTest):
         assert err < .02
         self.completed_jobs.append('simplex')
 
+    @pytest.mark.lbfgsb
+    def test_lbfgsb(self):
+        xopt = self.run_method(LBFGSB)
+        # check error
+        err = (xopt - self.xact) / self.xact * 100
+        err = np.sqrt(np.sum(err ** 2))
+        assert err < .05
+        self.completed_jobs.append(LBFGSB)
+
+    @pytest.mark.diffevol
+    def test_diffevol(self):
+        xopt = self.run_method(DIFFEVOL, popsize=5, seed=12)
+        # check error
+        err = (xopt - self.xact) / self.xact * 100
+        err = np.sqrt(np.sum(err ** 2))
+        assert err < .5
+        self.completed_jobs.append(DIFFEVOL)
+
 def opt_pres_v_evol(outf):
 
     vars_to_get = ('Time', 'E.XX', 'E.YY', 'E.ZZ', 'S.XX', 'S.YY', 'S.ZZ')
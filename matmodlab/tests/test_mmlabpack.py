@@ -0,0 +1,34 @@
+from testconf import *
+import scipy.linalg
+import matmodlab.utils.mmlabpack as mml
+
+@pytest.mark.fast
+@pytest.mark.mmlabpack
+class TestBatchKinematics(object):
+
+    def setup_method(self, method):
+        rs = np.random.RandomState(1)
+        self.N = 20
+        self.F = np.tile(I9, (self.N, 1)) + .1 * rs.randn(self.N, 9)
+        self.D = .2 * rs.randn(self.N, 6)
+
+    @pytest.mark.parametrize('kappa', [0., .5, 2., -1.])
+    def test_batch_vs_scalar(self, kappa):
+        '''Test the stacked kinematics against the scalar versions'''
+        F, E = mml.update_deformation_batch(.1, kappa, self.F, self.D)
+        D = mml.deps2d_batch(.1, kappa, E, self.D)
+        EF = mml.e_from_f_batch(kappa, F)
+        for i in range(self.N):
+            f, e = mml.update_deformation(.1, kappa, self.F[i], self.D[i])
+            assert allclose(f, F[i])
+            assert allclose(e, E[i])
+            assert allclose(mml.e_from_f(kappa, F[i]), EF[i])
+            assert allclose(mml.deps2d(.1, kappa, E[i], self.D[i]), D[i])
+
+    def test_polar_decomp_batch(self):
+        '''Test the stacked polar decomposition'''
+        R, U = mml.polar_decomp_batch(self.F)
+        for i in range(self.N):
+            r, u = scipy.linalg.polar(self.F[i].reshape(3, 3))
+            assert allclose(r, R[i])
+            assert allclose(u, U[i])
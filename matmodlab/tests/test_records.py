@@ -0,0 +1,121 @@
+from testconf import *
+from matmodlab.utils.fileio import loadfile
+
+@pytest.mark.fast
+@pytest.mark.records
+class TestRecords(object):
+
+    def test_records_grow_and_rollback(self):
+        '''Test that frame records grow past capacity and roll back'''
+        from matmodlab.mmd.simulator import Records
+        records = Records()
+        records.add('Step', SCALAR, dtype='i4')
+        records.add('Time', SCALAR)
+        records.add('S', TENSOR_3D)
+        records.add('SDV', SDV, keys=['EQPS'])
+        records.init(Step=0, Time=0., S=Z6, SDV=[0.])
+        n = 3 * records.initial_capacity
+        for i in range(n):
+            records.cache(Step=1, Time=i+1., S=Z6+i, SDV=[i])
+        assert records.data.shape[0] == 1
+        records.advance()
+        assert records.data.shape[0] == n + 1
+        assert records.capacity >= n + 1
+        assert allclose(records.data['Time'][1:], np.arange(n) + 1.)
+        assert allclose(records.data['SDV_EQPS'][-1], n - 1)
+        records.cache(Step=2, Time=-1., S=Z6, SDV=[0.])
+        records.clear_cache()
+        records.cache(Step=2, Time=n+1., S=Z6, SDV=[0.])
+        records.advance()
+        assert records.data.shape[0] == n + 2
+        assert records.data['Step'][-1] == 2
+        assert allclose(records.data['Time'][-1], n + 1.)
+
+    def test_records_stream(self, tmpdir):
+        '''Test streaming frames to the output file while running'''
+        responses = []
+        for output_format in (REC, NPY):
+            job = 'records_stream'
+            mps = MaterialPointSimulator(job, verbosity=0, d=str(tmpdir),
+                                         output_format=output_format)
+            mps.Material('pyelastic', [1e9, .5e9])
+            mps.StrainStep(components=(.01, 0, 0), frames=10)
+            if output_format == NPY:
+                # readable while the simulation is running
+                head, data = loadfile(mps.filename, variables=['Time', 'S.XX'])
+                assert data.shape == (11, 2) and allclose(data[-1, 0], 1.)
+                assert mps.records._n == 0
+            mps.StressStep(components=(0, 0, 0), frames=10)
+            mps.finish()
+            assert mps.filename.endswith(output_format)
+            responses.append(np.column_stack(mps.get('Time', 'S.XX', 'E.XX')))
+            head, data = loadfile(mps.filename, variables=['Time', 'S.XX'])
+            assert allclose(data, responses[-1][:, :2])
+        assert allclose(responses[0], responses[1])
+
+    def test_records_stream_notebook(self, tmpdir):
+        '''Test that the output stream is closed in notebooks'''
+        notebook, environ.notebook = environ.notebook, True
+        try:
+            mps = MaterialPointSimulator('records_stream', verbosity=0,
+                                         d=str(tmpdir), output_format=NPY)
+            mps.Material('pyelastic', [1e9, .5e9])
+            mps.StrainStep(components=(.01, 0, 0), frames=10)
+            mps.finish()
+            assert mps.records.stream.fh.closed
+            data = np.load(mps.filename)
+            assert data.shape == (11,)
+            assert allclose(data['Time'][-1], 1.)
+        finally:
+            environ.notebook = notebook
+
+    def test_records_index(self, tmpdir):
+        '''Test that variables are copies, or read only views, of records'''
+        mps = MaterialPointSimulator('records_index', verbosity=0,
+                                     d=str(tmpdir))
+        mps.Material('vonmises', [1e9, .5e9, 2e6, 1e8, .3])
+        mps.StrainStep(components=(.01, 0, 0), frames=10)
+        mps.StrainStep(components=(0, 0, 0), frames=5)
+        array = mps.records.array
+        sxx, eqps = mps.get('S.XX', 'SDV_EQPS', copy=False)
+        assert np.may_share_memory(sxx, array)
+        assert not sxx.flags.writeable
+        assert allclose(sxx, mps.records.data['S'][:, 0])
+        assert allclose(eqps, mps.records.data['SDV_EQPS'])
+        assert allclose(mps.S.XX, sxx) and allclose(mps.SDV.EQPS, eqps)
+
+        # by default, and as attributes, variables are writeable copies
+        a = mps.get('S.XX')
+        assert not np.may_share_memory(a, array)
+        a *= 2.
+        assert allclose(mps.get('S.XX'), sxx)
+        s = mps.S
+        s[:] = 0.
+        assert allclose(mps.S.XX, sxx)
+        step, time = mps.get('Step', 'Time', at_step=1)
+        assert allclose(step, [0, 1, 2]) and allclose(time, [0, 1, 2])
+        names, data = mps.get(disp=1)
+        assert names == mps.records.keys(expand=1)
+        assert allclose(data[:, names.index('S.XX')], sxx)
+
+    def test_record_file(self, tmpdir):
+        '''Test column views of results files and loading at steps'''
+        from matmodlab.utils.fileio import RecordFile, rec2arr
+        mps = MaterialPointSimulator('record_file', verbosity=0,
+                                     d=str(tmpdir), output_format=NPY)
+        mps.Material('vonmises', [1e9, .5e9, 2e6, 1e8, .3])
+        mps.StrainStep(components=(.01, 0, 0), frames=10)
+        mps.StrainStep(components=(0, 0, 0), frames=5)
+        mps.finish()
+        rf = RecordFile(mps.filename)
+        assert isinstance(rf['S.XX'].base, np.memmap) or \
+            isinstance(rf['S.XX'], np.memmap)
+        assert allclose(rf['S.XX'], mps.get('S.XX'))
+        assert allclose(rf['SDV_EQPS'], rf['SDV.EQPS'])
+        names = mps.records.keys(expand=1)
+        assert [x.replace('SDV_', 'SDV.') for x in names] == rf.names
+        assert allclose(rf.get(), rec2arr(mps.records.data))
+        head, data = loadfile(mps.filename, at_step=1,
+                              variables=['Step', 'Time', 'S.XX'])
+        assert head == ['STEP', 'TIME', 'S.XX']
+        assert allclose(data[:, :2], [[0, 0], [1, 1], [2, 2]])
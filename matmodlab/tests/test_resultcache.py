@@ -0,0 +1,51 @@
+from testconf import *
+
+@pytest.mark.fast
+@pytest.mark.resultcache
+class TestResultCache(object):
+
+    @staticmethod
+    def run(tmpdir, K=10., frames=20):
+        d = str(tmpdir)
+        mps = MaterialPointSimulator('resultcache', d=d,
+                                     result_cache=join(d, 'cache'))
+        mps.Material('pyelastic', {'K': K, 'G': 3.75})
+        mps.MixedStep(components=(.1, 0, 0, 0, 0, 0), descriptors='ESSSSS',
+                      frames=frames)
+        mps.StrainStep(components=(0, 0, 0, 0, 0, 0), frames=frames)
+        return mps
+
+    def test_result_cache(self, tmpdir):
+        '''Test reuse and invalidation of cached simulation results'''
+        from matmodlab.mmd.resultcache import ResultCache
+        d = join(str(tmpdir), 'cache')
+        no_dump, environ.no_dump = environ.no_dump, True
+        try:
+            a = self.run(tmpdir)
+            assert a.result_cache.misses == 2
+            b = self.run(tmpdir)
+            assert (b.result_cache.hits, b.result_cache.misses) == (2, 0)
+            assert allclose(a.records.array, b.records.array)
+            assert allclose(a.state_db.get('stress'),
+                            b.state_db.get('stress'))
+
+            # new parameters or steps are not found
+            c = self.run(tmpdir, K=11.)
+            assert c.result_cache.hits == 0
+            c = self.run(tmpdir, frames=10)
+            assert c.result_cache.hits == 0
+
+            # entries written for another material library are removed
+            cache = ResultCache(d)
+            key = os.listdir(d)[0][:-4]
+            ncols = a.records.array.shape[1]
+            assert cache.get(key, 'another library', ncols) is None
+            assert not os.path.isfile(join(d, key + '.npz'))
+
+            # least recently used entries are evicted
+            size = sum(os.path.getsize(join(d, f)) for f in os.listdir(d))
+            cache = ResultCache(d, maxsize=size - 1)
+            cache.evict()
+            assert 0 < len(os.listdir(d)) < 5
+        finally:
+            environ.no_dump = no_dump
@@ -0,0 +1,28 @@
+from testconf import *
+
+@pytest.mark.fast
+@pytest.mark.material
+class TestSlotLayout(object):
+
+    def test_slot_layout(self, tmpdir):
+        '''Test named slot access to material parameters and state'''
+        from matmodlab.mmd.material import SlotLayout, keyarray
+        keys = ['EQPS', 'BS_XX', 'BS_YY', 'BS_ZZ', 'BS_XY', 'BS_YZ', 'BS_XZ',
+                'A_XX', 'A_YY', 'A_ZZ', 'A_XY', 'A_XZ', 'A_YZ']
+        layout = SlotLayout(keys)
+        assert layout.EQPS == 0 and layout['bs_xy'] == 4
+        assert layout.BS == slice(1, 7)
+        # components not stored in order are gathered in order
+        assert list(layout.A) == [7, 8, 9, 10, 12, 11]
+        with pytest.raises(KeyError):
+            layout['B']
+
+        params = keyarray(['K', 'G'], [1., 2.])
+        P = SlotLayout(['K', 'G'])
+        assert params[P.G] == params['G'] == 2.
+
+        mps = MaterialPointSimulator('slot-layout', d=str(tmpdir))
+        material = mps.Material('vonmises', {'K': 1e9, 'G': .5e9, 'Y0': 2e6,
+                                             'H': 1e8, 'BETA': .3})
+        assert material.sdv_layout.BS == slice(2, 8)
+        assert material.param_layout.BETA == 4
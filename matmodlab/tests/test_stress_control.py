@@ -134,3 +134,28 @@ class TestStressControl(StandardMatmodlabTest):
         os.remove(gold_f)
         os.remove(mps_eps.filename)
         os.remove(mps_sig.filename)
+
+    @pytest.mark.fast
+    @pytest.mark.stresscontrol
+    @pytest.mark.parametrize('model,parameters', [
+        ('vonmises', {'K': 1e9, 'G': .5e9, 'Y0': 2e6, 'H': 1e8, 'BETA': .3}),
+        ('pyplastic', {'K': 1e9, 'G': .5e9, 'A1': 2e6, 'A4': .1})])
+    def test_broyden(self, model, parameters):
+        '''Test that Broyden updates reproduce the full Newton response with
+        fewer material calls'''
+        responses, calls = [], []
+        for broyden in (False, True):
+            job = 'stress_control_broyden_{0}_{1:d}'.format(model, broyden)
+            mps = MaterialPointSimulator(job, verbosity=0, d=this_directory,
+                                         broyden=broyden)
+            mps.Material(model, parameters)
+            mps.MixedStep(components=(.01, 0, 0), descriptors='ESS',
+                          frames=25)
+            mps.StressStep(components=(0, 0, 0), frames=25)
+            responses.append(mps.get('S.XX', 'E.YY', 'E.ZZ'))
+            calls.append(sum(step.solver_stats.material_calls
+                             for step in mps.steps.values()))
+            self.completed_jobs.append(job)
+        assert allclose(responses[1], responses[0],
+                        atol=1e-6 * amax(abs(responses[0])))
+        assert calls[1] < calls[0]
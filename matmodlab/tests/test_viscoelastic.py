@@ -0,0 +1,28 @@
+from testconf import *
+
+@pytest.mark.fast
+@pytest.mark.material
+class TestViscoelastic(object):
+
+    def test_prony_terms(self, tmpdir):
+        '''Test a Prony series of more than 10 terms'''
+        prony = np.array([[.35, 600.], [.15, 20.], [.25, 30.],
+                          [.05, 40.], [.05, 50.], [.15, 60.]])
+        # each term split in two equal terms with the same relaxation time
+        split = np.repeat(prony, 2, axis=0)
+        split[:, 0] /= 2.
+        stress = []
+        for (i, series) in enumerate((prony, split)):
+            mps = MaterialPointSimulator('visco-{0}'.format(i),
+                                         d=str(tmpdir), verbosity=0)
+            mat = mps.Material('pyelastic', {'K': 10., 'G': 3.75})
+            mat.Viscoelastic(PRONY, series)
+            mps.StrainStep(components=(.1, 0, 0, 0, 0, 0), frames=10)
+            mps.StrainStep(components=(.1, 0, 0, 0, 0, 0), increment=50.,
+                           frames=20)
+            assert len(mat.visco_model.g) == len(series)
+            assert 'SDV_H{0}_XZ'.format(len(series)) in mps.records.keys()
+            stress.append(np.array(mps.get('S.XX')))
+        # the stress relaxes while the strain is held
+        assert stress[0][-1] < stress[0][10]
+        assert allclose(stress[0], stress[1])
@@ -90,8 +90,12 @@ def read_file(filename, columns=None, disp=1, sheetname=None):
         # Try text reader and cross fingers
         head, data = read_text(filename, columns=columns)
 
-    data = np.array([[float(_) if _ is not None else 0.0 for _ in row]
-                                                     for row in data])
+    if isinstance(data, np.ndarray) and data.dtype.kind in 'biuf':
+        # already numeric, convert without visiting each cell
+        data = np.asarray(data, dtype=np.float64)
+    else:
+        data = np.array([[float(_) if _ is not None else 0.0 for _ in row]
+                                                         for row in data])
     if not disp:
         return data
     return head, data
@@ -11,6 +11,26 @@ def _split(string, comments, i=0):
                                                          if x.split()]
 
 
+def _read_floats(lines, comments):
+    """Convert the lines to a 2D float array in a single pass, return None if
+    the lines are not a rectangular table of floats"""
+    body = []
+    for line in lines:
+        line = line.split(comments, 1)[0].replace(',', ' ').strip()
+        if line:
+            body.append(line)
+    if not body:
+        return None
+    ncol = set(len(line.split()) for line in body)
+    if len(ncol) != 1:
+        return None
+    ncol = ncol.pop()
+    data = np.fromstring(' '.join(body), sep=' ')
+    if data.size != len(body) * ncol:
+        return None
+    return data.reshape(len(body), ncol)
+
+
 def read_text(filename, skiprows=0, comments='#', columns=None, disp=1):
 
     # Check to see if we are looking at a gzipped text file
@@ -47,24 +67,27 @@ def read_text(filename, skiprows=0, comments='#', columns=None, disp=1):
         head = None
         line_idx = skiprows
 
-    data = []
-    try:
-        for i in range(line_idx, len(lines)):
-            line = _split(lines[i], comments)
-
-            if not line:
-                continue
-
-            try:
-                line = [float(x) for x in line]
-            except ValueError:
-                raise Exception('expected floats in line {0} '
-                                'got {1}'.format(i+1, line))
-            data.append(line)
-    except:
-        pass
-
-    data = np.array(data)
+    data = _read_floats(lines[line_idx:], comments)
+    if data is None:
+        # not a rectangular table of floats, read line by line
+        data = []
+        try:
+            for i in range(line_idx, len(lines)):
+                line = _split(lines[i], comments)
+
+                if not line:
+                    continue
+
+                try:
+                    line = [float(x) for x in line]
+                except ValueError:
+                    raise Exception('expected floats in line {0} '
+                                    'got {1}'.format(i+1, line))
+                data.append(line)
+        except:
+            pass
+
+        data = np.array(data)
 
     # If specific columns are requested, filter the data
     if columns is not None:
@@ -1,6 +1,7 @@
 import numpy
-import scipy.linalg
 from ..constants import VOIGT
+from .lazy import lazy_import
+linalg = lazy_import('scipy.linalg')
 
 def epsilon(a):
     """Find the machine precision for a float of type 'a'"""
@@ -72,7 +73,7 @@ def asmat(a):
 
 def expm(a):
     """Compute the matrix exponential of a 3x3 matrix"""
-    return scipy.linalg.expm(a)
+    return linalg.expm(a)
 
 
 def powm(a, m):
@@ -82,12 +83,12 @@ def powm(a, m):
 
 def sqrtm(a):
     """Compute the square root of a 3x3 matrix"""
-    return scipy.linalg.sqrtm(a)
+    return linalg.sqrtm(a)
 
 
 def logm(a):
     """Compute the matrix logarithm of a 3x3 matrix"""
-    return scipy.linalg.logm(a)
+    return linalg.logm(a)
 
 
 def diag(a):
@@ -146,25 +147,9 @@ def deps2d(dt, k, e, de):
     !              w = skew(L)
     """
 
-    D = numpy.zeros((3,3))
-    eps = as3x3(e / VOIGT)
-    depsdt = as3x3(de / VOIGT)
-    epsf = eps + depsdt * dt
-
-    # stretch and its rate
-    if k == 0:
-        u = expm(epsf)
-    else:
-        u = powm(k * epsf + numpy.eye(3, 3), 1.0 / k)
-
-    x = 1.0 / 2.0 * (numpy.linalg.inv(k * epsf + numpy.eye(3, 3)) +
-                     numpy.linalg.inv(k * eps + numpy.eye(3, 3)))
-    du = numpy.dot(numpy.dot(u, x), depsdt)
-
-    L = numpy.dot(du, numpy.linalg.inv(u))
-    D = (L + L.T) / 2.0
-
-    return symarray(D) * VOIGT
+    e = numpy.reshape(e, (1, 6))
+    de = numpy.reshape(de, (1, 6))
+    return deps2d_batch(dt, k, e, de)[0]
 
 
 def update_deformation(dt, k, farg, darg):
@@ -199,22 +184,9 @@ def update_deformation(dt, k, farg, darg):
     !
     ! where k is the Seth-Hill strain parameter.
     """
-    f0 = farg.reshape((3, 3))
-    d = as3x3(darg / VOIGT)
-    ff = numpy.dot(expm(d * dt), f0)
-    u = sqrtm(numpy.dot(ff.T, ff))
-    if k == 0:
-        eps = logm(u)
-    else:
-        eps = 1.0 / k * (powm(u, k) - numpy.eye(3, 3))
-
-    if numpy.linalg.det(ff) <= 0.0:
-        raise Exception("negative jacobian encountered")
-
-    f = asarray(ff, 9)
-    e = symarray(eps) * VOIGT
-
-    return f, e
+    f, e = update_deformation_batch(dt, k, numpy.reshape(farg, (1, 9)),
+                                    numpy.reshape(darg, (1, 6)))
+    return f[0], e[0]
 
 def e_from_f(k, farg):
     """
@@ -224,19 +196,7 @@ def e_from_f(k, farg):
 
     where k is the Seth-Hill strain parameter.
     """
-    f = farg.reshape((3, 3))
-    u = sqrtm(numpy.dot(f.T, f))
-    if k == 0:
-        eps = logm(u)
-    else:
-        eps = 1.0 / k * (powm(u, k) - numpy.eye(3, 3))
-
-    if numpy.linalg.det(f) <= 0.0:
-        raise Exception("negative jacobian encountered")
-
-    e = symarray(eps) * VOIGT
-
-    return e
+    return e_from_f_batch(k, numpy.reshape(farg, (1, 9)))[0]
 
 def f_from_e(kappa, E):
     R = numpy.eye(3)
@@ -293,11 +253,108 @@ def get_invariants(a, n):
 
 def polar_decomp(F):
     F = F.reshape(3,3)
-    I = np.eye(3)
+    I = numpy.eye(3)
     R = F.copy()
     for j in range(20):
-        R = .5 * np.dot(R, 3. * I - np.dot(R.T, R))
-        if (np.amax(np.abs(np.dot(R.T, R) - I)) < 1.e-6):
-            U = np.dot(R.T, F)
+        R = .5 * numpy.dot(R, 3. * I - numpy.dot(R.T, R))
+        if (numpy.amax(numpy.abs(numpy.dot(R.T, R) - I)) < 1.e-6):
+            U = numpy.dot(R.T, F)
             return R, U
     raise RuntimeError('Fast polar decompositon failed to converge')
+
+# --------------------------------------------------------------------------- #
+# Stacked versions of the kinematic routines.  Arguments are stacks of N
+# arrays: (N, 6) symmetric tensors, (N, 9) deformation gradients, and (N, 3, 3)
+# matrices.  Each matrix function is evaluated on symmetric tensors through
+# their spectral decomposition, computed for all N at once with eigh.
+# --------------------------------------------------------------------------- #
+def as3x3_batch(a):
+    """Convert (N, 6) arrays to (N, 3, 3) symmetric matrices"""
+    a = numpy.asarray(a)
+    return a[:, [[0, 3, 5], [3, 1, 4], [5, 4, 2]]]
+
+
+def symarray_batch(a):
+    """Convert (N, 3, 3) matrices to (N, 6) arrays of their symmetric part"""
+    a = (a + numpy.swapaxes(a, 1, 2)) / 2.0
+    return a[:, [0, 1, 2, 0, 1, 0], [0, 1, 2, 1, 2, 2]]
+
+
+def funcm_batch(a, f):
+    """Apply f to the eigenvalues of each symmetric 3x3 matrix in a, then
+    reconstruct the matrices from the eigenprojections"""
+    vals, vecs = numpy.linalg.eigh(a)
+    return numpy.einsum('nij,nj,nkj->nik', vecs, f(vals), vecs)
+
+
+def stretch_to_strain_batch(k, c):
+    """Seth-Hill strain 1/k (U**k - I), U = sqrt(C), of each right
+    Cauchy-Green tensor C in c, returned as (N, 6) arrays"""
+    if k == 0:
+        eps = funcm_batch(c, lambda x: .5 * numpy.log(x))
+    else:
+        eps = 1.0 / k * (funcm_batch(c, lambda x: x ** (k / 2.)) -
+                         numpy.eye(3, 3))
+    return symarray_batch(eps) * VOIGT
+
+
+def update_deformation_batch(dt, k, farg, darg):
+    """Stacked update_deformation: update the (N, 9) deformation gradients
+    farg by the (N, 6) rates of deformation darg, returning the updated
+    deformation gradients and (N, 6) strains"""
+    farg = numpy.asarray(farg)
+    f0 = farg.reshape((-1, 3, 3))
+    d = as3x3_batch(numpy.asarray(darg) / VOIGT)
+    ff = numpy.einsum('nij,njk->nik', funcm_batch(d * dt, numpy.exp), f0)
+    if numpy.any(numpy.linalg.det(ff) <= 0.0):
+        raise Exception("negative jacobian encountered")
+    c = numpy.einsum('nji,njk->nik', ff, ff)
+    return ff.reshape((-1, 9)), stretch_to_strain_batch(k, c)
+
+
+def e_from_f_batch(k, farg):
+    """Stacked e_from_f: the (N, 6) strains of the (N, 9) deformation
+    gradients farg"""
+    f = numpy.asarray(farg).reshape((-1, 3, 3))
+    if numpy.any(numpy.linalg.det(f) <= 0.0):
+        raise Exception("negative jacobian encountered")
+    c = numpy.einsum('nji,njk->nik', f, f)
+    return stretch_to_strain_batch(k, c)
+
+
+def deps2d_batch(dt, k, e, de):
+    """Stacked deps2d: symmetric part of the velocity gradient, (N, 6), of
+    each of the (N, 6) strains e and strain rates de"""
+    I = numpy.eye(3, 3)
+    eps = as3x3_batch(numpy.asarray(e) / VOIGT)
+    depsdt = as3x3_batch(numpy.asarray(de) / VOIGT)
+    epsf = eps + depsdt * dt
+
+    # stretch, its inverse, and its rate
+    if k == 0:
+        u = funcm_batch(epsf, numpy.exp)
+        uinv = funcm_batch(epsf, lambda x: numpy.exp(-x))
+    else:
+        u = funcm_batch(k * epsf + I, lambda x: x ** (1.0 / k))
+        uinv = funcm_batch(k * epsf + I, lambda x: x ** (-1.0 / k))
+
+    x = 1.0 / 2.0 * (funcm_batch(k * epsf + I, lambda x: 1. / x) +
+                     funcm_batch(k * eps + I, lambda x: 1. / x))
+    du = numpy.einsum('nij,njk,nkl->nil', u, x, depsdt)
+
+    L = numpy.einsum('nij,njk->nik', du, uinv)
+    return symarray_batch(L) * VOIGT
+
+
+def polar_decomp_batch(farg):
+    """Stacked polar decomposition F = R U of the (N, 9) (or (N, 3, 3))
+    deformation gradients farg, returns the (N, 3, 3) R and U"""
+    f = numpy.asarray(farg).reshape((-1, 3, 3))
+    c = numpy.einsum('nji,njk->nik', f, f)
+    vals, vecs = numpy.linalg.eigh(c)
+    if numpy.any(vals <= 0.0):
+        raise RuntimeError('singular deformation gradient')
+    u = numpy.einsum('nij,nj,nkj->nik', vecs, numpy.sqrt(vals), vecs)
+    uinv = numpy.einsum('nij,nj,nkj->nik', vecs, 1. / numpy.sqrt(vals), vecs)
+    r = numpy.einsum('nij,njk->nik', f, uinv)
+    return r, u
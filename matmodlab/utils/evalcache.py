@@ -0,0 +1,113 @@
+import os
+import numpy as np
+from collections import OrderedDict
+
+class EvalCache(object):
+    """Bounded (least recently used) cache of objective function evaluations
+
+    Evaluations are keyed on the parameter vector rounded to a number of
+    significant digits, so that vectors differing only by round off share an
+    entry.  If filename is given, evaluations are appended to it as they are
+    cached and read back on construction, so that a restarted calibration
+    does not repeat completed evaluations.  The file is ignored (and
+    overwritten) if it was written for different names.  Once it holds twice
+    maxsize evaluations it is rewritten with only the cached ones, so that
+    neither the file nor the time to read it grows without bound.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of cached evaluations
+    digits : int
+        Significant digits of the parameters used to form keys
+    filename : str
+        Path to the file in which evaluations are persisted
+    names : list of str
+        Names of the parameters, stored in the file
+
+    """
+    def __init__(self, maxsize=1024, digits=12, filename=None, names=None):
+        self.maxsize = maxsize
+        self.digits = digits
+        self.filename = filename
+        self.names = [str(name) for name in names or []]
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.num_lines = 0
+        if filename is not None:
+            self.load()
+
+    def __len__(self):
+        return len(self.data)
+
+    def key(self, x):
+        fmt = '{0:.%de}' % (self.digits - 1)
+        return tuple(float(fmt.format(v)) for v in np.ravel(x))
+
+    def get(self, x):
+        """Return the cached evaluation at x, or None"""
+        key = self.key(x)
+        value = self.data.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        self.data[key] = value
+        self.hits += 1
+        return value
+
+    def set(self, x, value):
+        """Cache the evaluation at x"""
+        key = self.key(x)
+        self.data.pop(key, None)
+        self.data[key] = value
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+        if self.filename is not None:
+            with open(self.filename, 'a') as fh:
+                fh.write(self.format(key, value))
+            self.num_lines += 1
+            if self.num_lines >= 2 * self.maxsize:
+                self.compact()
+
+    @staticmethod
+    def format(key, value):
+        return ' '.join(repr(v) for v in key + (value,)) + '\n'
+
+    def compact(self):
+        """Rewrite filename with only the cached evaluations"""
+        tmp = '{0}.{1}'.format(self.filename, os.getpid())
+        with open(tmp, 'w') as fh:
+            fh.write('# ' + ' '.join(self.names) + '\n')
+            for (key, value) in self.data.items():
+                fh.write(self.format(key, value))
+        os.rename(tmp, self.filename)
+        self.num_lines = len(self.data)
+
+    def load(self):
+        """Read the evaluations persisted in filename"""
+        header = '# ' + ' '.join(self.names)
+        if os.path.isfile(self.filename):
+            lines = open(self.filename).readlines()
+            if lines and lines[0].rstrip('\n') == header:
+                for line in lines[1:]:
+                    values = [float(v) for v in line.split()]
+                    if not values:
+                        continue
+                    key, value = tuple(values[:-1]), values[-1]
+                    self.data.pop(key, None)
+                    self.data[key] = value
+                while len(self.data) > self.maxsize:
+                    self.data.popitem(last=False)
+                self.num_lines = len(lines) - 1
+                if self.num_lines >= 2 * self.maxsize:
+                    self.compact()
+                return
+        with open(self.filename, 'w') as fh:
+            fh.write(header + '\n')
+
+    def summary(self):
+        n = self.hits + self.misses
+        rate = 0. if not n else 100. * self.hits / n
+        return '{0} hits, {1} misses ({2:.1f}% hit rate)'.format(
+            self.hits, self.misses, rate)
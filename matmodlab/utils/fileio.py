@@ -37,9 +37,12 @@ def loadfile(filename, disp=1, skiprows=0, sheetname="MML", columns=None,
                                             elem_num=1, at_step=at_step,
                                             upcase=upcase)
 
-    elif filename.endswith(('.rpk', '.base_rpk')):
-        # Matmodlab record array pickle
-        names, data = loadrec(filename, upcase=upcase, disp=1, at_step=at_step)
+    elif filename.endswith(('.rpk', '.base_rpk', '.npy', '.base_npy')):
+        # Matmodlab record array pickle or stream, only the requested columns
+        # are read
+        names, data = loadrec(filename, upcase=upcase, disp=1, at_step=at_step,
+                              columns=columns)
+        columns = None
 
     elif filename.endswith(('.xls', '.xlsx', '.XLS', '.XLSX')):
         try:
@@ -74,35 +77,26 @@ def loadfile(filename, disp=1, skiprows=0, sheetname="MML", columns=None,
         return names, data
     return data
 
-def loadrec(filename, upcase=0, disp=1, at_step=0):
-    """Load a numpy record array stored as a pickle"""
+def loadrec(filename, upcase=0, disp=1, at_step=0, columns=None):
+    """Load a numpy record array stored as a pickle or written by a
+    RecordStream
 
-    # load the data
-    data = np.load(filename)
+    Only the requested columns (names or indices, default all) are
+    converted.
 
-    # get the names -> specific to how Matmodlab stores the data
-    names = []
-    for item in data.dtype.descr:
-        # Get the names of each field, expanded to include component
-        try:
-            key, dtype, shape = item
-            keys = ['%s.%s' % (key, ext) for ext in COMPONENT_LABELS(shape[0])]
-        except ValueError:
-            key, dtype = item
-            if key.startswith('SDV_'):
-                key = key.replace('SDV_', 'SDV.')
-            keys = [key]
-        names.extend(keys)
-
-    data = rec2arr(data)
-
-    if at_step:
-        # Get only the data at the end of the step
-        d = {}
-        for (i, x) in enumerate(data['Step']):
-            d.setdefault(int(x), []).append(i)
-        rows = [x[-1] for x in sorted(d.values())]
-        data = data[rows]
+    """
+    rf = RecordFile(filename)
+    rows = rf.step_rows() if at_step else None
+    if columns is None:
+        columns = range(len(rf.names))
+    else:
+        columns = [rf.index(x) if is_string_like(x) else x
+                   for x in tolist(columns)]
+        for (i, j) in enumerate(columns):
+            if j is None:
+                raise ValueError('%r not in file' % tolist(columns)[i])
+    names = [rf.names[j] for j in columns]
+    data = rf.get(columns, rows=rows)
 
     if disp:
         if upcase:
@@ -111,6 +105,126 @@ def loadrec(filename, upcase=0, disp=1, at_step=0):
 
     return data
 
+class RecordFile(object):
+    """Column access to the records in a .rpk or .npy results file
+
+    .npy files are memory mapped, columns (S.XX, SDV.EQPS, ...) are returned
+    as views of the mapped records and only the rows of the columns that are
+    used are ever read from disk.
+
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        if filename.endswith('npy'):
+            self.data = np.load(filename, mmap_mode='r')
+        else:
+            self.data = np.load(filename)
+        # names of each column and the (field, component) it is stored in
+        self.names, self.fields = [], []
+        for item in self.data.dtype.descr:
+            try:
+                key, dtype, shape = item
+                for (j, ext) in enumerate(COMPONENT_LABELS(shape[0])):
+                    self.names.append('%s.%s' % (key, ext))
+                    self.fields.append((key, j))
+            except ValueError:
+                key, dtype = item
+                self.fields.append((key, None))
+                if key.startswith('SDV_'):
+                    key = key.replace('SDV_', 'SDV.')
+                self.names.append(key)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def index(self, name):
+        """Column index of name (case insensitive, SDV_X and SDV.X are
+        equivalent)"""
+        if name.upper().startswith('SDV_'):
+            name = 'SDV.' + name[4:]
+        return index(self.names, name)
+
+    def column(self, i):
+        """View of column i (index or name)"""
+        if is_string_like(i):
+            j = self.index(i)
+            if j is None:
+                raise KeyError(i)
+            i = j
+        key, j = self.fields[i]
+        if j is None:
+            return self.data[key]
+        return self.data[key][:, j]
+
+    def get(self, columns=None, rows=None):
+        """2D float array of the columns (default all)"""
+        if columns is None:
+            columns = range(len(self.names))
+        data = np.empty((len(self), len(columns)))
+        for (k, i) in enumerate(columns):
+            data[:, k] = self.column(i)
+        if rows is not None:
+            data = data[rows]
+        return data
+
+    def step_rows(self):
+        """Rows at the end of each step"""
+        return unique_step_index(self.data['Step'])
+
+class RecordStream(object):
+    """Append-only stream of records to a .npy file
+
+    The file is a standard .npy file (a self describing header followed by
+    the raw rows) whose header leaves room for the number of rows to grow.
+    Rows are appended in chunks and the row count in the header is updated
+    after each chunk is written, so that the file can be read (and memory
+    mapped) with numpy.load at any time, including while it is written.
+
+    """
+    magic = b'\x93NUMPY\x01\x00'
+    def __init__(self, filename, dtype):
+        self.filename = filename
+        self.dtype = np.dtype(dtype)
+        self.num_rows = 0
+        self._view = None
+        self.fh = open(filename, 'w+b')
+        self.write_header()
+
+    def write_header(self):
+        descr = np.lib.format.dtype_to_descr(self.dtype)
+        # the row count is padded so that the header length never changes
+        header = "{{'descr': {0!r}, 'fortran_order': False, 'shape': " \
+                 "({1:20d},), }}".format(descr, self.num_rows)
+        n = len(self.magic) + 2 + len(header) + 1
+        header += ' ' * ((64 - n % 64) % 64) + '\n'
+        self.fh.seek(0)
+        self.fh.write(self.magic)
+        self.fh.write(np.array(len(header), dtype='<u2').tostring())
+        self.fh.write(asbytes(header))
+
+    def append(self, rows):
+        """Append the rows (a record array of dtype) and flush them"""
+        if not len(rows):
+            return
+        self.fh.seek(0, 2)
+        self.fh.write(np.ascontiguousarray(rows, dtype=self.dtype).tostring())
+        self.num_rows += len(rows)
+        self.write_header()
+        self.fh.flush()
+
+    def read(self):
+        """Memory mapped (read only) view of the rows written"""
+        if self._view is None or self._view.shape[0] != self.num_rows:
+            self._view = np.load(self.filename, mmap_mode='r')
+        return self._view
+
+    def close(self):
+        if not self.fh.closed:
+            self.fh.close()
+
 def loadtxt(filename, comments='#', skiprows=0, upcase=False,
             delimiter=' ', disp=1):
 
@@ -138,11 +252,23 @@ def flatten(a):
         except TypeError: flat.append(x)
     return flat
 
-def rec2arr(recarr):
-    arr = []
-    for row in recarr:
-        arr.append(flatten(row.tolist()))
-    return np.array(arr)
+def unique_step_index(a):
+    """Index of the last row of each step in the array of step numbers a"""
+    a = np.asarray(a).astype(int)
+    steps, idx = np.unique(a[::-1], return_index=True)
+    return np.sort(len(a) - 1 - idx)
+
+def rec2arr(recarr, rows=None):
+    """Convert the record array to a 2D float array, with one column for each
+    component of each field"""
+    if rows is not None:
+        recarr = recarr[rows]
+    n = recarr.shape[0]
+    columns = [np.asarray(recarr[name], dtype=np.float64).reshape(n, -1)
+               for name in recarr.dtype.names]
+    if not columns:
+        return np.empty((n, 0))
+    return np.column_stack(columns)
 
 def filediff_entry(argv=None):
     if argv is None:
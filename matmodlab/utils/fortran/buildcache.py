@@ -0,0 +1,165 @@
+import os
+import re
+import sys
+import glob
+import shutil
+import hashlib
+import logging
+import tempfile
+from os.path import join, isfile, isdir, basename, realpath, samefile
+
+import numpy as np
+
+from .product import IO_F90, FORT_INC
+from ..misc import remove, rand_id, locked
+from ...mml_siteenv import environ
+from ...product import PKG_D
+
+CACHE_D = join(PKG_D, 'cache')
+
+# digests of source files, keyed on (filename, mtime, size)
+_digests = {}
+
+def file_digest(filename):
+    '''Return the sha1 digest of the contents of filename'''
+    st = os.stat(filename)
+    key = (realpath(filename), st.st_mtime, st.st_size)
+    if key not in _digests:
+        with open(filename, 'rb') as fh:
+            _digests[key] = hashlib.sha1(fh.read()).hexdigest()
+    return _digests[key]
+
+def rename_signature(signature, old, new):
+    '''Return the contents of the f2py signature file with the python module
+    old renamed to new'''
+    lines = open(signature, 'r').read()
+    pat = r'(?is)python\s+module\s+{0}'.format(old)
+    repl = r'python module {0}'.format(new)
+    return re.sub(pat, repl, lines)
+
+def build_key(libname, source_files, signature=None, lapack=False):
+    '''Hash of everything that determines the built extension module
+
+    The key covers the contents of the source and include files, the
+    (possibly renamed) signature, the compiler and its flags, and the python
+    and numpy versions f2py builds against.
+
+    '''
+    fc = realpath(environ.fc or '')
+    h = hashlib.sha1()
+    h.update(libname)
+    for f in source_files:
+        h.update(file_digest(f))
+    for f in sorted(glob.glob(join(FORT_INC, '*.inc'))):
+        h.update(file_digest(f))
+    if signature is not None:
+        h.update(signature)
+    if isfile(fc):
+        st = os.stat(fc)
+        h.update('{0} {1} {2}'.format(fc, st.st_mtime, st.st_size))
+    h.update(' '.join(environ.fflags))
+    h.update(repr(lapack))
+    h.update(sys.version)
+    h.update(np.__version__)
+    return h.hexdigest()
+
+def stage(src, dst):
+    '''Atomically link (or copy) src to dst'''
+    if isfile(dst) and samefile(src, dst):
+        return
+    tmp = join(os.path.dirname(dst), '.{0}.{1}'.format(basename(dst),
+                                                       rand_id(6)))
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.rename(tmp, dst)
+
+def build_material_library(libname, source_files, lapack=False,
+                           signature_name=None, rebuild=False, verbosity=0):
+    '''Build the extension module libname, or fetch it from the build cache,
+    and stage it in PKG_D
+
+    Built libraries are stored in per key directories of CACHE_D, where the
+    key is the hash returned by build_key.  Builds of the same key are
+    serialized by a lock file and are done in a private directory that is
+    renamed in to place when complete, so that concurrent processes never
+    see (or write) a partially built library.  The f2py signature of a
+    library built under a new name is renamed in the private directory,
+    never in PKG_D.
+
+    Parameters
+    ----------
+    libname : str
+        Name of the extension module
+    source_files : list of str
+        Source files of the extension module
+    lapack : bool or str
+        Passed to the builder
+    signature_name : str
+        Name of the python module in the .pyf signature in source_files, if
+        different from libname
+    rebuild : bool
+        Discard the cached library and rebuild it
+
+    Returns
+    -------
+    so_lib : str or None
+        Path to the staged library in PKG_D, None if the build failed
+
+    '''
+    source_files = list(source_files)
+    if IO_F90 not in source_files:
+        source_files.append(IO_F90)
+
+    signature = None
+    if signature_name is not None and signature_name != libname:
+        for (i, f) in enumerate(source_files):
+            if f.endswith('.pyf'):
+                break
+        else:
+            raise ValueError('signature file not found')
+        signature = rename_signature(f, signature_name, libname)
+        sig_index = i
+
+    key = build_key(libname, source_files, signature=signature, lapack=lapack)
+    d = join(CACHE_D, key)
+    cached = join(d, libname + '.so')
+    so_lib = join(PKG_D, libname + '.so')
+    if not rebuild and isfile(cached):
+        stage(cached, so_lib)
+        return so_lib
+
+    if not isdir(CACHE_D):
+        try:
+            os.makedirs(CACHE_D)
+        except OSError:
+            if not isdir(CACHE_D):
+                raise
+
+    with locked(d + '.lock'):
+        if rebuild:
+            remove(d)
+        if not isfile(cached):
+            logging.getLogger('matmodlab.mmd.builder').info(
+                '{0}: building material library'.format(libname))
+            tmp = tempfile.mkdtemp(dir=CACHE_D, prefix=key + '.')
+            try:
+                if signature is not None:
+                    f = join(tmp, libname + '.pyf')
+                    with open(f, 'w') as fh:
+                        fh.write(signature)
+                    source_files[sig_index] = f
+                from ...mmd.builder import Builder
+                Builder.build_material(libname, source_files, lapack=lapack,
+                                       verbosity=verbosity, build_dir=tmp)
+                if isfile(join(tmp, libname + '.so')):
+                    remove(join(tmp, 'build'))
+                    os.rename(tmp, d)
+            finally:
+                remove(tmp)
+        if not isfile(cached):
+            return None
+        stage(cached, so_lib)
+
+    return so_lib
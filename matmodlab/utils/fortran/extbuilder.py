@@ -4,9 +4,12 @@ import re
 import sys
 import glob
 import shutil
+import time
 import logging
+import tempfile
 import warnings
 import subprocess
+import multiprocessing
 
 from os.path import isfile, realpath, dirname, join, splitext, basename, isdir
 
@@ -17,7 +20,7 @@ from numpy.distutils.system_info import get_info
 from numpy.distutils.core import setup
 
 from .product import LAPACK, LAPACK_OBJ, MMLABPACK, ABA_UTL, FORT_INC
-from ..misc import remove, stdout_redirected, merged_stderr_stdout
+from ..misc import remove, locked, stdout_redirected, merged_stderr_stdout
 from ...mml_siteenv import environ
 from ...product import PKG_D, PYEXE
 
@@ -27,10 +30,10 @@ class ExtModuleNotBuilt(Exception): pass
 class FortranNotFoundError(Exception): pass
 class FortranExtBuilder(object):
     """Interface with numpy distutils to build fortran extension modules in
-    place
+    place in build_dir (PKG_D by default)
 
     """
-    def __init__(self, name, fc=None, verbosity=1):
+    def __init__(self, name, fc=None, verbosity=1, build_dir=None):
         # find fortran compiler
         global FORT_COMPILER
         if fc is None:
@@ -45,6 +48,7 @@ class FortranExtBuilder(object):
         self.fc = fc
         FORT_COMPILER = fc
         self.name = name
+        self.build_dir = build_dir or PKG_D
         self.chatty = verbosity >= 2
         self.exts_built = []
         self.exts_failed = []
@@ -101,8 +105,8 @@ class FortranExtBuilder(object):
         self.exts_to_build.append((name, sources, options))
         return
 
-    def build_extension_modules(self, verbosity=None):
-        """Build all extension modules in config"""
+    def build_extension_modules(self, verbosity=None, nprocs=1):
+        """Build all extension modules in config, nprocs at a time"""
         if not self.exts_to_build:
             return
 
@@ -126,16 +130,10 @@ class FortranExtBuilder(object):
                         'failed to build blas_lapack, dependent '
                         'libraries will not be importable')
 
-        config = Configuration(self.name, parent_package="", top_path="",
-                               package_path=PKG_D)
         for (name, sources, options) in self.exts_to_build:
             if any(' ' in x for x in sources):
                 logging.getLogger('matmodlab.mmd.builder').warn(
                     'File paths with spaces are known to fail to build')
-            config.add_extension(name, sources=sources, **options)
-
-        cwd = os.getcwd()
-        os.chdir(PKG_D)
 
         fexec = "--f77exec={0} --f90exec={0}".format(self.fc)
         argv = "./setup.py config_fc {0}".format(fexec).split()
@@ -147,51 +145,56 @@ class FortranExtBuilder(object):
         argv.extend(fflags)
         argv.extend("build_ext -i".split())
 
-        # build the extension modules with distutils setup
+        # build the extension modules with distutils setup.  Each extension
+        # is built in its own directory (so that independent extensions can
+        # be built simultaneously) and moved to build_dir when done
+        bld_d = join(self.build_dir, "build")
+        if not isdir(bld_d):
+            os.makedirs(bld_d)
+        nprocs = max(1, min(nprocs, len(self.exts_to_build)))
         logging.getLogger('matmodlab.mmd.builder').info(
             'building extension module[s]... ', extra={'continued':1})
-        failed = 0
-
-        # change sys.argv for distutils
-        hold = [x for x in sys.argv]
-        sys.argv = [x for x in argv]
-        try:
-            if environ.notebook:
-                from IPython.utils import io
-                with io.capture_output() as captured:
-                    setup(**config.todict())
-                logging.getLogger('matmodlab.mmd.builder').info('done')
-            else:
-                f = join(PKG_D, "build.log") if not chatty else sys.stdout
-                with stdout_redirected(to=f), merged_stderr_stdout():
-                    setup(**config.todict())
-                logging.getLogger('matmodlab.mmd.builder').info('done')
-        except:
-            logging.getLogger('matmodlab.mmd.builder').error('failed')
-            failed = 1
-        finally:
-            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
-            sys.argv = [x for x in hold]
-
-        os.chdir(cwd)
-        # move files
-        d = config.package_dir[config.name]
-        for mod in glob.glob(d + "/*.so"):
-            self.exts_built.append(module_name(mod))
+        jobs = [(name, sources, options, argv, bld_d, chatty)
+                for (name, sources, options) in self.exts_to_build]
+        if nprocs == 1:
+            results = [build_extension(job) for job in jobs]
+        else:
+            pool = multiprocessing.Pool(nprocs)
+            try:
+                results = pool.map(build_extension, jobs, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        logging.getLogger('matmodlab.mmd.builder').info('done')
 
+        # move files, collect the build logs
         logging.getLogger('matmodlab.mmd.builder').info(
             'staging extension module[s]... ', extra={'continued':1})
+        with open(join(self.build_dir, "build.log"), "w") as fh:
+            for (name, d, dt) in results:
+                if d is None:
+                    continue
+                log = join(d, "build.log")
+                if isfile(log):
+                    fh.write(open(log).read())
+                so = join(d, name + ".so")
+                if isfile(so):
+                    os.rename(so, join(self.build_dir, name + ".so"))
+                    self.exts_built.append(name)
+                remove(d)
 
         self.exts_failed = [n[0] for n in self.exts_to_build
                             if n[0] not in self.exts_built]
         self.ext_modules_built = True
         self.exts_to_build = []
+        logging.getLogger('matmodlab.mmd.builder').info(
+            'failed' if self.exts_failed else 'done')
+        for (name, d, dt) in results:
+            logging.getLogger('matmodlab.mmd.builder').info(
+                '    {0}: {1:.1f}s'.format(name, dt))
         if self.exts_failed:
-            logging.getLogger('matmodlab.mmd.builder').info('failed')
             raise ExtModuleNotBuilt("{0}: failed to build".format(
                     ", ".join(self.exts_failed)))
-        else:
-            logging.getLogger('matmodlab.mmd.builder').info('done')
 
         return
 
@@ -207,6 +210,51 @@ class FortranExtBuilder(object):
                 return lapack
 
 
+def build_extension(args):
+    """Build a single extension module in a private directory
+
+    Returns the name of the module, the directory it was built in (None if
+    the directory could not be created), and the time taken to build it
+
+    """
+    name, sources, options, argv, bld_d, chatty = args
+    ti = time.time()
+    try:
+        d = tempfile.mkdtemp(dir=bld_d, prefix=name + ".")
+    except OSError:
+        return name, None, 0.
+
+    # numpy distutils maps extensions in to the package directory only if
+    # it is a package
+    open(join(d, "__init__.py"), "w").close()
+    config = Configuration(name, parent_package="", top_path="",
+                           package_path=d)
+    config.add_extension(name, sources=sources, **options)
+
+    cwd = os.getcwd()
+    os.chdir(d)
+
+    # change sys.argv for distutils
+    hold = [x for x in sys.argv]
+    sys.argv = [x for x in argv]
+    try:
+        if environ.notebook:
+            from IPython.utils import io
+            with io.capture_output() as captured:
+                setup(**config.todict())
+        else:
+            f = join(d, "build.log") if not chatty else sys.stdout
+            with stdout_redirected(to=f), merged_stderr_stdout():
+                setup(**config.todict())
+    except:
+        pass
+    finally:
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        sys.argv = [x for x in hold]
+        os.chdir(cwd)
+
+    return name, d, time.time() - ti
+
 def module_name(filepath):
     return splitext(basename(filepath))[0]
 
@@ -217,12 +265,21 @@ def build_blas_lapack():
     """
     logging.getLogger('matmodlab.mmd.builder').info(
         'building blas_lapack-lite... ', extra={'continued':1})
-    cmd = [FORT_COMPILER, "-fPIC", "-shared", "-O3", LAPACK, "-o" + LAPACK_OBJ]
-    build = subprocess.Popen(cmd, stdout=open(os.devnull, "a"),
-                             stderr=subprocess.STDOUT)
-    build.wait()
-    if build.returncode == 0:
-        logging.getLogger('matmodlab.mmd.builder').info('done')
-    else:
-        logging.getLogger('matmodlab.mmd.builder').info('no')
+    # build (once) to a private file and rename it in to place so that
+    # concurrent builds never link against a partially written object
+    with locked(LAPACK_OBJ + ".lock"):
+        if isfile(LAPACK_OBJ):
+            logging.getLogger('matmodlab.mmd.builder').info('done')
+            return 0
+        tmp = "{0}.{1}".format(LAPACK_OBJ, os.getpid())
+        cmd = [FORT_COMPILER, "-fPIC", "-shared", "-O3", LAPACK, "-o" + tmp]
+        build = subprocess.Popen(cmd, stdout=open(os.devnull, "a"),
+                                 stderr=subprocess.STDOUT)
+        build.wait()
+        if build.returncode == 0:
+            os.rename(tmp, LAPACK_OBJ)
+            logging.getLogger('matmodlab.mmd.builder').info('done')
+        else:
+            remove(tmp)
+            logging.getLogger('matmodlab.mmd.builder').info('no')
     return build.returncode
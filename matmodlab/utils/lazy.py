@@ -0,0 +1,148 @@
+"""Deferred import of heavy optional dependencies
+
+Plotting, data frame, symbolic and GUI packages are only needed by a few
+entry points but are expensive to import.  Modules that use them hold a
+LazyModule in their place, which imports the real module on first attribute
+access.  A LazyModule is false if the module it stands for is not importable,
+so that the ``if pandas is None`` checks used with the old ``try: import``
+idiom become ``if not pandas``.
+
+This module does not import from matmodlab so that it can be run as a script
+to profile the import of the package::
+
+    python lazy.py [module ...]
+
+"""
+import sys
+import time
+import types
+import importlib
+
+__all__ = ['LazyModule', 'lazy_import', 'importable', 'HEAVY_MODULES',
+           'import_profile']
+
+# Modules that must not be loaded by import matmodlab
+HEAVY_MODULES = ('matplotlib', 'bokeh', 'pandas', 'sympy', 'traits',
+                 'scipy.optimize')
+
+class LazyModule(types.ModuleType):
+    """Stand in for the module name, imported on first use"""
+    def __init__(self, name):
+        super(LazyModule, self).__init__(name)
+        self.__dict__['_module'] = None
+        self.__dict__['_error'] = None
+
+    def _load(self):
+        if self._module is None and self._error is None:
+            try:
+                module = importlib.import_module(self.__name__)
+            except ImportError as e:
+                self.__dict__['_error'] = e
+            else:
+                self.__dict__['_module'] = module
+        if self._error is not None:
+            raise ImportError(str(self._error))
+        return self._module
+
+    def __getattr__(self, name):
+        value = getattr(self._load(), name)
+        self.__dict__[name] = value
+        return value
+
+    def __nonzero__(self):
+        try:
+            self._load()
+        except ImportError:
+            return False
+        return True
+    __bool__ = __nonzero__
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return '<lazy module {0!r} ({1})>'.format(self.__name__, state)
+
+def lazy_import(name):
+    """Return the module name if it is already imported, else a LazyModule"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+def importable(name):
+    """Can the top level module name be imported?  The module is found, but
+    not imported"""
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        from pkgutil import find_loader as find_spec
+    return find_spec(name) is not None
+
+def import_profile(modules, top=25, stream=None):
+    """Import modules and report the time spent importing each module
+
+    Time is reported exclusive of the time spent in nested imports, so that
+    the cost of a module is charged to the module that imported it only if
+    it was loaded there for the first time.  Heavy optional modules that were
+    loaded are listed at the end of the report.
+
+    """
+    try:
+        import __builtin__ as builtins
+    except ImportError:
+        import builtins
+    stream = stream or sys.stdout
+    real_import = builtins.__import__
+    timings = {}
+    stack = []
+
+    def timed_import(name, *args, **kwargs):
+        before = set(sys.modules)
+        stack.append(0.)
+        ti = time.time()
+        try:
+            return real_import(name, *args, **kwargs)
+        finally:
+            dt = time.time() - ti
+            child = stack.pop()
+            if stack:
+                stack[-1] += dt
+            loaded = [m for m in set(sys.modules) - before
+                      if sys.modules[m] is not None]
+            if loaded:
+                # charge the module that was asked for, falling back to the
+                # outermost package loaded by from ... import submodule
+                named = [m for m in loaded
+                         if m == name or m.endswith('.' + name)]
+                key = min(named or loaded, key=len)
+                own, cum = timings.get(key, (0., 0.))
+                timings[key] = (own + dt - child, cum + dt)
+
+    nmod = len([m for m in sys.modules.values() if m is not None])
+    builtins.__import__ = timed_import
+    ti = time.time()
+    try:
+        for module in modules:
+            importlib.import_module(module)
+    finally:
+        builtins.__import__ = real_import
+    total = time.time() - ti
+    nmod = len([m for m in sys.modules.values() if m is not None]) - nmod
+
+    items = sorted(timings.items(), key=lambda x: x[1][0], reverse=True)
+    stream.write('import {0}: {1:.3f} s, {2} modules loaded\n'.format(
+        ', '.join(modules), total, nmod))
+    stream.write('{0:>10s} {1:>10s}  {2}\n'.format('self (ms)', 'cum (ms)',
+                                                  'module'))
+    for (name, (own, cum)) in items[:top]:
+        stream.write('{0:10.1f} {1:10.1f}  {2}\n'.format(1000. * own,
+                                                        1000. * cum, name))
+    heavy = [m for m in HEAVY_MODULES if m in sys.modules]
+    if heavy:
+        stream.write('heavy optional modules loaded: '
+                     '{0}\n'.format(', '.join(heavy)))
+    return heavy
+
+if __name__ == '__main__':
+    sys.path.pop(0)
+    heavy = import_profile(sys.argv[1:] or ['matmodlab'])
+    sys.exit(1 if heavy else 0)
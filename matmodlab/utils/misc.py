@@ -190,6 +190,30 @@ def remove(path):
     return
 
 
+@contextmanager
+def locked(filename):
+    """Hold an exclusive lock on filename (on Windows, on its first byte)"""
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+        import msvcrt
+    with open(filename, 'a') as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
 def fillwithdots(a, b, width):
     dots = "." * (width - len(a) - len(b))
     return "{0}{1}{2}".format(a, dots, b)
@@ -50,3 +50,7 @@ def isotropic_part(A):
     Aiso[:, 3:] /= np.sqrt(2.)
     Aiso[3:, :] /= np.sqrt(2.)
     return Aiso
+
+# Stacked (N, ...) kinematics, shared by the fortran and python versions
+from ._mmlabpack import update_deformation_batch, deps2d_batch, \
+    e_from_f_batch, polar_decomp_batch
@@ -1,6 +1,7 @@
 import os
 import sys
 import time
+import sqlite3
 import argparse
 import numpy as np
 import xml.dom.minidom as xdom
@@ -19,67 +20,86 @@ U_PARAMS = u"Parameters"
 U_RESP = u"Responses"
 IND = "  "
 
+# The evaluation database is an SQLite file, files written by older versions
+# of matmodlab are XML and are still read (see read_evaluations)
+EDB_VERSION = 1
+SQLITE_MAGIC = 'SQLite format 3\x00'
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS columns (kind TEXT PRIMARY KEY, names TEXT);
+CREATE TABLE IF NOT EXISTS evaluations (n INTEGER PRIMARY KEY,
+    status INTEGER, d TEXT, parameters BLOB, responses BLOB);
+"""
+
+def connect(filename, timeout=60.):
+    """Connect to the evaluation database filename
+
+    Writers in other processes are waited on for at most timeout seconds.
+
+    """
+    return sqlite3.connect(filename, timeout=timeout)
+
+def pack(values):
+    return sqlite3.Binary(np.array(values, dtype=np.float64).tostring())
+
+def unpack(blob):
+    return np.frombuffer(bytes(blob), dtype=np.float64)
+
 class MMLTabularWriter(object):
 
-    def __init__(self, filename, job):
-        """Set up a logger object, which takes evaluation events and outputs
-        an XML log file
+    def __init__(self, filename, job, append=False, buffer_size=256,
+                 flush_interval=1.):
+        """Set up the evaluation database of job
 
-        """
-        self.stack = []
+        The evaluations of a permutation or optimization job are appended to
+        an SQLite database, with the parameter and response values of each
+        evaluation packed in to float64 blobs (their names are stored once).
+        Evaluations are buffered and committed in a single transaction once
+        buffer_size of them are waiting or flush_interval seconds have passed
+        since the last commit, and when the writer is closed.  The database
+        is in WAL mode, so that several processes (eg, the workers of a pool)
+        may open writers with append=True and write to it concurrently.
 
+        """
         self.filename = realpath(filename)
         if not self.filename.endswith('.edb'):
             self.filename += '.edb'
         self.evald = dirname(self.filename)
         if not isdir(self.evald):
             raise OSError('no such directory {0!r}'.format(self.evald))
-        self.start_document(job)
-        pass
-
-    def create_element(self, name, attrs):
-        sp = IND * len(self.stack)
-        a = " ".join('{0}="{1}"'.format(k, v) for (k, v) in attrs)
-        with open(self.filename, "a") as stream:
-            stream.write("{0}<{1} {2}/>\n".format(sp, name, a))
-            stream.flush()
-        return
-
-    def start_element(self, name, attrs, end=False):
-        sp = IND * len(self.stack)
-        a = " ".join('{0}="{1}"'.format(k, v) for (k, v) in attrs)
-        with open(self.filename, "a") as stream:
-            stream.write("{0}<{1} {2}>\n".format(sp, name, a))
-            stream.flush()
-        self.stack.append(name)
-        return
-
-    def end_element(self, name):
-        _name = self.stack.pop(-1)
-        assert _name == name
-        sp = IND * len(self.stack)
-        with open(self.filename, "a") as stream:
-            stream.write("{0}</{1}>\n".format(sp, name))
-            stream.flush()
-        return
-
-    def start_document(self, job):
-        with open(self.filename, "w") as stream:
-            stream.write("""<?xml version="1.0"?>\n""")
-            stream.flush()
-        now = time.asctime(time.localtime())
-        self.start_element(U_ROOT, ((U_JOB, job),
-                                    (U_DATE, now)))
-        return
-
-    def end_document(self):
-        _name = self.stack.pop(-1)
-        assert _name == U_ROOT
-        with open(self.filename, "a") as stream:
-            stream.write("</{0}>\n".format(U_ROOT))
-            stream.flush()
-            stream.close()
-        return
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.columns = {}
+        self.last_flush = time.time()
+        if not append:
+            for ext in ('', '-wal', '-shm'):
+                if isfile(self.filename + ext):
+                    os.remove(self.filename + ext)
+        self.db = connect(self.filename)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        with self.db:
+            self.db.executescript(SCHEMA)
+            now = time.asctime(time.localtime())
+            self.db.executemany('INSERT OR IGNORE INTO info VALUES (?, ?)',
+                                ((U_JOB, job), (U_DATE, now),
+                                 ('version', str(EDB_VERSION))))
+
+    def set_columns(self, kind, names):
+        """Store the names of the parameters or responses, all evaluations
+        must have the same names"""
+        if self.columns.get(kind) == names:
+            return
+        with self.db:
+            self.db.execute('INSERT OR IGNORE INTO columns VALUES (?, ?)',
+                            (kind, '\n'.join(names)))
+            row = self.db.execute('SELECT names FROM columns WHERE kind=?',
+                                  (kind,)).fetchone()
+        if tuple(row[0].split('\n')) != names:
+            raise ValueError('{0} {1} do not match the {0} of previous '
+                             'evaluations'.format(kind, ', '.join(names)))
+        self.columns[kind] = names
 
     def write_eval_info(self, n, s, d, parameters, responses=None):
         """Write information for this evaluation
@@ -99,23 +119,73 @@ class MMLTabularWriter(object):
 
         """
         d = d.replace(self.evald, ".")
-        self.start_element(U_EVAL, ((U_EVAL_N, n), (U_EVAL_S, s), (U_EVAL_D, d)))
-        self.create_element(U_PARAMS, parameters)
+        self.set_columns(U_PARAMS, tuple(x[0] for x in parameters))
+        p, r = pack([x[1] for x in parameters]), None
         if responses:
-            self.create_element(U_RESP, responses)
-        self.end_element(U_EVAL)
+            self.set_columns(U_RESP, tuple(x[0] for x in responses))
+            r = pack([x[1] for x in responses])
+        self.buffer.append((n, s, d, p, r))
+        if len(self.buffer) >= self.buffer_size or \
+           time.time() - self.last_flush > self.flush_interval:
+            self.flush()
         return
 
+    def flush(self):
+        """Commit the buffered evaluations"""
+        if self.buffer:
+            with self.db:
+                self.db.executemany('INSERT OR REPLACE INTO evaluations '
+                                    'VALUES (?, ?, ?, ?, ?)', self.buffer)
+            self.buffer = []
+        self.last_flush = time.time()
+
     def close(self):
         """
         Clean up the logger object
         """
-        self.end_document()
+        if self.db is not None:
+            self.flush()
+            self.db.close()
+            self.db = None
         return
 
+def is_sqlite(filename):
+    with open(filename, 'rb') as fh:
+        return fh.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
 
-def read_mml_evaldb(filepath):
-    """Read the Material Model Laboratory tabular file
+def iter_evaluations(filepath):
+    """Iterate over the evaluations in the evaluation database, without
+    reading them all in to memory
+
+    Yields
+    ------
+    evaluation : tuple
+        (n, status, d, parameters, responses) for each evaluation, sorted by
+        evaluation number, see read_evaluations
+
+    """
+    D = realpath(dirname(filepath))
+    db = connect(filepath)
+    try:
+        columns = dict(db.execute('SELECT kind, names FROM columns'))
+        pnames = columns.get(U_PARAMS, '').split('\n')
+        rnames = columns.get(U_RESP, '').split('\n')
+        cursor = db.execute('SELECT n, status, d, parameters, responses '
+                            'FROM evaluations ORDER BY n')
+        paths = {}
+        for (n, status, d, p, r) in cursor:
+            if d not in paths:
+                paths[d] = realpath(join(D, d))
+            parameters = zip(pnames, unpack(p).tolist())
+            responses = None
+            if r is not None:
+                responses = zip(rnames, unpack(r).tolist())
+            yield n, status, paths[d], parameters, responses
+    finally:
+        db.close()
+
+def read_evaluations(filepath):
+    """Read the evaluations in the Material Model Laboratory tabular file
 
     Parameters
     ----------
@@ -124,30 +194,38 @@ def read_mml_evaldb(filepath):
 
     Returns
     -------
-    sources : list of str
-        Individual filepaths for each evaluation
-    parameters : tuple of tuple
-        (name, value) pairs for parameters for each evaluation
+    job : str
+        The job name
+    evaluations : list of tuple
+        (n, d, parameters, responses) for each evaluation, where n is the
+        evaluation number, d its directory, and parameters and responses are
+        lists of (name, value) pairs (responses is None if not written),
+        sorted by evaluation number
 
     """
+    if not is_sqlite(filepath):
+        return read_xml_evaluations(filepath)
+    db = connect(filepath)
+    try:
+        job = db.execute('SELECT value FROM info WHERE key=?',
+                         (U_JOB,)).fetchone()[0]
+    finally:
+        db.close()
+    evaluations = [(n, d, p, r) for (n, s, d, p, r)
+                   in iter_evaluations(filepath)]
+    return job, evaluations
+
+def read_xml_evaluations(filepath):
+    """Read the evaluations in an XML tabular file, see read_evaluations"""
     D = realpath(dirname(filepath))
     doc = xdom.parse(filepath)
     root = doc.getElementsByTagName(U_ROOT)[0]
     job = root.getAttribute(U_JOB)
 
-    sources = []
-    parameters = {}
-    responses = {}
+    evaluations = []
     for evaluation in root.getElementsByTagName(U_EVAL):
-        n = evaluation.getAttribute(U_EVAL_N)
+        n = int(evaluation.getAttribute(U_EVAL_N))
         d = realpath(join(D, evaluation.getAttribute(U_EVAL_D)))
-        for fmt in DB_FMTS:
-            f = join(d, "{0}.{1}".format(job, fmt))
-            if isfile(f):
-                break
-        else:
-            continue
-        sources.append(f)
 
         # get parameters
         nparams = evaluation.getElementsByTagName(U_PARAMS)[0]
@@ -155,31 +233,139 @@ def read_mml_evaldb(filepath):
         for (name, value) in nparams.attributes.items():
             enames.append(name)
             evars.append(float(value))
-        parameters[f] = zip(enames, evars)
+        parameters = zip(enames, evars)
 
         # get responses
+        responses = None
         nresponses = evaluation.getElementsByTagName(U_RESP)
         if nresponses:
             rvars, rnames = [], []
             for (name, value) in nresponses[0].attributes.items():
                 rnames.append(name)
                 rvars.append(float(value))
-            responses[f] = zip(rnames, rvars)
+            responses = zip(rnames, rvars)
+
+        evaluations.append((n, d, parameters, responses))
+
+    # evaluations are written as they complete, not necessarily in order
+    evaluations.sort(key=lambda x: x[0])
+
+    return job, evaluations
+
+def export_xml(filepath, xmlfile=None):
+    """Write the evaluation database filepath in the XML format of older
+    versions of matmodlab
+
+    Returns
+    -------
+    xmlfile : str
+        Name of the XML file, filepath with extension .xml by default
+
+    """
+    if xmlfile is None:
+        xmlfile = splitext(filepath)[0] + '.xml'
+    db = connect(filepath)
+    try:
+        info = dict(db.execute('SELECT key, value FROM info'))
+    finally:
+        db.close()
+    D = realpath(dirname(filepath))
+    def attrs(items):
+        return " ".join('{0}="{1!r}"'.format(k, v) for (k, v) in items)
+    with open(xmlfile, 'w') as stream:
+        stream.write('<?xml version="1.0"?>\n')
+        stream.write('<{0} {1}="{2}" {3}="{4}">\n'.format(
+            U_ROOT, U_JOB, info[U_JOB], U_DATE, info[U_DATE]))
+        for (n, s, d, p, r) in iter_evaluations(filepath):
+            d = os.path.relpath(d, D)
+            d = '.' if d == '.' else join('.', d)
+            stream.write('{0}<{1} {2}="{3}" {4}="{5}" {6}="{7}">\n'.format(
+                IND, U_EVAL, U_EVAL_N, n, U_EVAL_S, s, U_EVAL_D, d))
+            stream.write('{0}<{1} {2}/>\n'.format(IND * 2, U_PARAMS,
+                                                  attrs(p)))
+            if r is not None:
+                stream.write('{0}<{1} {2}/>\n'.format(IND * 2, U_RESP,
+                                                      attrs(r)))
+            stream.write('{0}</{1}>\n'.format(IND, U_EVAL))
+        stream.write('</{0}>\n'.format(U_ROOT))
+    return xmlfile
+
+def read_mml_evaldb(filepath):
+    """Read the Material Model Laboratory tabular file
+
+    Parameters
+    ----------
+    filepath : str
+        Path to index file to read
+
+    Returns
+    -------
+    sources : list of str
+        Individual filepaths for each evaluation
+    parameters : tuple of tuple
+        (name, value) pairs for parameters for each evaluation
+
+    Notes
+    -----
+    Only evaluations that wrote an output file are returned, see
+    read_evaluations for all evaluations
+
+    """
+    job, evaluations = read_evaluations(filepath)
+    sources = []
+    parameters = {}
+    responses = {}
+    # directories are listed once, rather than probing for each format
+    listings = {}
+    for (n, d, p, r) in evaluations:
+        if d not in listings:
+            listings[d] = set(os.listdir(d)) if isdir(d) else set()
+        for fmt in DB_FMTS:
+            f = "{0}.{1}".format(job, fmt)
+            if f in listings[d]:
+                break
+        else:
+            continue
+        f = join(d, f)
+        sources.append(f)
+        parameters[f] = p
+        if r is not None:
+            responses[f] = r
 
     return sources, parameters, responses
 
 def read_mml_evaldb_nd(filepath, nonan=1):
-    sources, parameters, responses = read_mml_evaldb(filepath)
-    head = [x[0] for x in parameters[sources[0]]]
-    resp = responses.get(sources[0])
-    if resp:
-        head.extend([x[0] for x in resp])
+    if not is_sqlite(filepath):
+        return read_xml_evaldb_nd(filepath, nonan=nonan)
+    db = connect(filepath)
+    try:
+        columns = dict(db.execute('SELECT kind, names FROM columns'))
+        rows = db.execute('SELECT parameters, responses FROM evaluations '
+                          'WHERE responses IS NOT NULL ORDER BY n').fetchall()
+    finally:
+        db.close()
+    head = columns[U_PARAMS].split('\n')
+    nresp = 0
+    if U_RESP in columns:
+        nresp = len(columns[U_RESP].split('\n'))
+        head.extend(columns[U_RESP].split('\n'))
+    data = np.zeros((len(rows), len(head)))
+    if rows:
+        data = np.frombuffer(''.join(bytes(p) + bytes(r) for (p, r) in rows),
+                             dtype=np.float64).reshape(len(rows), len(head))
+    if nonan:
+        # remove nan's
+        data = data[~np.any(np.isnan(data), axis=1)]
+    return head, data, nresp
+
+def read_xml_evaldb_nd(filepath, nonan=1):
+    job, evaluations = read_xml_evaluations(filepath)
+    evaluations = [e for e in evaluations if e[3] is not None]
+    head = [x[0] for x in evaluations[0][2]]
+    nresp = len(evaluations[0][3])
+    head.extend([x[0] for x in evaluations[0][3]])
     data = []
-    for source in sources:
-        r = responses.get(source)
-        if r is None:
-            continue
-        p = parameters[source]
+    for (n, d, p, r) in evaluations:
         line = [x[1] for x in p]
         line.extend([x[1] for x in r])
         data.append(line)
@@ -188,7 +374,7 @@ def read_mml_evaldb_nd(filepath, nonan=1):
         # remove nan's
         rows = np.where(np.isnan(data))[0]
         data = np.delete(data, rows, 0)
-    return head, data, len(responses[sources[0]])
+    return head, data, nresp
 
 def correlations(filepath, nonan=1):
     title = "CORRELATIONS AMONG INPUT AND OUTPUT VARIABLES CREATED BY MATMODLAB"
@@ -282,6 +468,8 @@ def plot_bokeh_correlations(filepath, nonan=1):
 def is_evaldb(filename):
     if not isfile(filename) or not filename.endswith('.edb'):
         return False
+    if is_sqlite(filename):
+        return True
     with open(filename, 'r') as fh:
         for i in range(4):
             if U_ROOT in fh.readline():
@@ -290,9 +478,12 @@ def is_evaldb(filename):
 
 def main(argv):
     parser = argparse.ArgumentParser()
-    parser.add_argument("action", choices=("plot", "table"))
+    parser.add_argument("action", choices=("plot", "table", "xml"))
     parser.add_argument("filepath")
     args = parser.parse_args(argv)
+    if args.action == "xml":
+        export_xml(args.filepath)
+        sys.exit(0)
     if args.action == "plot":
         sys.exit(plot_correlations(args.filepath))
     sys.exit(correlations(args.filepath))